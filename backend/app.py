@@ -1,11 +1,13 @@
 """
 Filename: run.py
 Purpose: Flask entry point that creates the app and runs the development server.
+In production the app is served by gunicorn instead (wsgi.py, gunicorn.conf.py).
 """
 
+import os
 from app import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=app.config["DEBUG"])
@@ -5,25 +5,22 @@ Purpose: Flask app factory; loads configuration, initializes extensions, and reg
 
 import os
 from flask import Flask
-from .config import DevelopmentConfig
+from .config import get_config
 from .extensions import cors
 from werkzeug.exceptions import RequestEntityTooLarge
 from .utils.responses import error as json_error
-from .services import storage
-from .services.expiry import is_expired
+from .utils.log import init_logging
+from .services import compression, events, hotcache, metrics, profiler, ratelimit, reconcile, upload_jobs, warmup
 
 
-def create_app() -> Flask:
+def create_app(config_object=None) -> Flask:
     app = Flask(__name__)
 
-    # Load configuration
-    app.config.from_object(DevelopmentConfig)
+    # Load configuration (the APP_ENV config class unless a config class/object is given)
+    app.config.from_object(config_object or get_config())
 
-    # Initialize Cloudinary configuration (loads env vars and configures SDK)
-    try:
-        from .. import cloudinary_config  # noqa: F401
-    except Exception:
-        pass
+    # Structured logging: request threads only enqueue, a listener thread writes
+    init_logging(app)
 
     # Ensure upload directory exists
     upload_folder = app.config.get("UPLOAD_FOLDER")
@@ -33,10 +30,29 @@ def create_app() -> Flask:
     # Initialize extensions
     cors.init_app(app)
 
-    # Ensure expired items are cleaned up on every request (hard-enforced)
-    @app.before_request
-    def _run_expiry_cleanup():
-        storage.delete_expired_files(is_expired)
+    # Per-route latency histograms (registered first so the timer wraps other hooks)
+    metrics.init_app(app)
+
+    # Opt-in request profiling (PROFILE_ENABLED or /__debug__/profiling); near-free when off
+    profiler.init_app(app)
+
+    # Admission control: per-IP/per-code token buckets and in-flight caps
+    ratelimit.init_app(app)
+
+    # Front cache for hot access/download links (negative results + redirect targets)
+    hotcache.init_app(app)
+
+    # Background transfer pool for async uploads (?async=1)
+    upload_jobs.init_app(app)
+
+    # Pub/sub behind the owner dashboard event stream
+    events.init_app(app)
+
+    # gzip/brotli for the file listing endpoints (COMPRESS_ENDPOINTS)
+    compression.init_app(app)
+
+    # Background deletion of stored assets no session references (ORPHAN_RECONCILE_ENABLED)
+    reconcile.init_app(app)
 
     # Register blueprints
     from .routes.upload import upload_bp
@@ -47,6 +63,8 @@ def create_app() -> Flask:
     from .routes.owner import owner_bp
     from .routes.debug import debug_bp
     from .routes.health import health_bp
+    from .routes.metrics import metrics_bp
+    from .routes.files import files_bp
 
     app.register_blueprint(upload_bp)
     app.register_blueprint(access_bp)
@@ -56,10 +74,16 @@ def create_app() -> Flask:
     app.register_blueprint(owner_bp)
     app.register_blueprint(debug_bp)
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(files_bp)
 
     # Return JSON for oversized payloads
     @app.errorhandler(RequestEntityTooLarge)
     def handle_413(_e):
         return json_error("Upload exceeds server limit (2GB)", status=413)
 
+    # Metadata store and cloud SDK are otherwise loaded by the first request that needs them
+    if app.config.get("WARMUP_ON_START"):
+        warmup.warm_up(app)
+
     return app
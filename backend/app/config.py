@@ -1,6 +1,7 @@
 """
 Filename: config.py
-Purpose: Application configuration for development, including upload folder and file size limits.
+Purpose: Application configuration: DevelopmentConfig (defaults, debug server) and ProductionConfig
+(gunicorn, see gunicorn.conf.py), selected by APP_ENV through get_config().
 """
 import os
 
@@ -14,3 +15,253 @@ class DevelopmentConfig:
 
     # Max 2 GB uploads to support large videos and directories
     MAX_CONTENT_LENGTH = 2 * 1024 * 1024 * 1024
+
+    # Streaming ZIP for /download/batch (mode=stream): peak buffered bytes are
+    # roughly PREFETCH * QUEUE_CHUNKS * CHUNK_SIZE regardless of selection size
+    BATCH_STREAM_PREFETCH = 4
+    BATCH_STREAM_CHUNK_SIZE = 256 * 1024
+    BATCH_STREAM_QUEUE_CHUNKS = 8
+    BATCH_STREAM_TIMEOUT = 30
+
+    # Optional read-through disk cache for hot downloads/previews (UPLOAD_FOLDER/cache)
+    LOCAL_CACHE_ENABLED = False
+    LOCAL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+    LOCAL_CACHE_MAX_ENTRY_BYTES = 200 * 1024 * 1024
+    LOCAL_CACHE_ADMIT_AFTER = 2
+    LOCAL_CACHE_FILL_TIMEOUT = 60
+
+    # Storage backend: "cloudinary" (default) or "local" (files under
+    # LOCAL_STORAGE_ROOT/files, defaulting to UPLOAD_FOLDER, served by /files)
+    STORAGE_BACKEND = "cloudinary"
+    STORAGE_FOLDER = "temp-share"
+    LOCAL_STORAGE_ROOT = None
+
+    # Inline preview streaming (?inline=1): browser cache lifetime is capped by
+    # the session's remaining lifetime
+    PREVIEW_MAX_AGE = 60 * 60
+    PREVIEW_STREAM_CHUNK_SIZE = 256 * 1024
+
+    # Preview derivatives (GET /preview/...?size=thumb|medium), requested from Cloudinary as
+    # eager transformations at upload time: resource type -> size -> (transformation, format,
+    # None = the original's). Images get downscaled copies; videos a poster frame (thumb) and
+    # a low-bitrate rendition (medium). With PREVIEW_EAGER_ASYNC the upload doesn't wait for
+    # them to render
+    PREVIEW_DERIVATIVES = {
+        "image": {
+            "thumb": ("c_limit,w_320,h_320,q_auto", None),
+            "medium": ("c_limit,w_1280,h_1280,q_auto", None),
+        },
+        "video": {
+            "thumb": ("so_0,c_limit,w_640,h_640,q_auto", "jpg"),
+            "medium": ("c_limit,w_854,h_854,br_600k,q_auto:low", "mp4"),
+        },
+    }
+    PREVIEW_EAGER_ASYNC = True
+
+    # Open the metadata store and load the cloud SDK in create_app, before the worker takes
+    # traffic, instead of on the first request that needs them (see services/warmup.py)
+    WARMUP_ON_START = True
+
+    # Structured logging (JSON lines on stdout via a background queue listener).
+    # LOG_SAMPLE_RATES keeps only a fraction of high-frequency events.
+    LOG_LEVEL = "INFO"
+    LOG_JSON = True
+    LOG_QUEUE_SIZE = 10000
+    LOG_SAMPLE_RATES = {
+        "expiry.scan": 0.01,
+        "owner.lookup.hit": 0.1,
+        "cloudinary.delete": 0.1,
+    }
+
+    # Request profiling. "sampler" writes collapsed stacks (<endpoint>.folded, for
+    # flamegraph.pl/speedscope); "cprofile" writes <endpoint>.pstats. Requests are
+    # picked at PROFILE_SAMPLE_RATE or when PROFILE_HEADER is sent (matching
+    # PROFILE_HEADER_TOKEN if set). Toggle at runtime via /__debug__/profiling.
+    PROFILE_ENABLED = False
+    PROFILE_MODE = "sampler"
+    PROFILE_SAMPLE_RATE = 0.01
+    PROFILE_INTERVAL = 0.005
+    PROFILE_HEADER = "X-Profile"
+    PROFILE_HEADER_TOKEN = None
+    PROFILE_OUTPUT_DIR = None
+
+    # Admission control. RATE_LIMITS maps endpoint -> [(key, limit, period_seconds)],
+    # key "ip" (client address) or "code" (access code); limit is also the burst.
+    # CONCURRENCY_LIMITS caps in-flight requests per endpoint (per worker process).
+    # RATE_LIMIT_STORAGE "sqlite" shares buckets across workers via a file in
+    # UPLOAD_FOLDER (or RATE_LIMIT_SQLITE_PATH); "memory" keeps them per process.
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_STORAGE = "memory"
+    RATE_LIMIT_SQLITE_PATH = None
+    RATE_LIMIT_MAX_KEYS = 100_000
+    # Behind RATE_LIMIT_PROXY_HOPS proxies, the client is the X-Forwarded-For entry that many
+    # places from the right; anything further left is client-supplied and ignored
+    RATE_LIMIT_TRUST_PROXY = False
+    RATE_LIMIT_PROXY_HOPS = 1
+    RATE_LIMITS = {
+        "upload.upload": [("ip", 20, 60 * 60), ("ip", 5, 60)],
+        "upload.upload_sign": [("ip", 20, 60 * 60), ("ip", 5, 60)],
+        "upload.upload_commit": [("ip", 30, 60)],
+        "download.download_batch": [("ip", 10, 60), ("code", 5, 60)],
+        "download.download_file": [("ip", 300, 60), ("code", 600, 60)],
+        "preview.preview": [("ip", 600, 60)],
+        "access.access": [("ip", 120, 60)],
+        "access.access_tree": [("ip", 120, 60)],
+        "owner.owner_get": [("ip", 120, 60)],
+    }
+    CONCURRENCY_LIMITS = {
+        "upload.upload": 8,
+        "download.download_batch": 4,
+        # Each open event stream holds a worker thread
+        "owner.owner_events": 64,
+    }
+    CONCURRENCY_RETRY_AFTER = 5
+
+    # Guessed codes: a counting Bloom filter of live access/owner codes answers most
+    # misses without a store lookup, and each miss drains a per-IP budget
+    # (SCAN_GUARD_MISS_LIMIT per SCAN_GUARD_PERIOD seconds); an IP that runs out gets
+    # 429 on the lookup endpoints until it refills
+    CODE_FILTER_ENABLED = True
+    CODE_FILTER_CAPACITY = 100_000
+    CODE_FILTER_FP_RATE = 0.01
+    SCAN_GUARD_ENABLED = True
+    SCAN_GUARD_MISS_LIMIT = 30
+    SCAN_GUARD_PERIOD = 10 * 60
+    SCAN_GUARD_ENDPOINTS = (
+        "access.access",
+        "access.access_tree",
+        "download.download_file",
+        "download.download_legacy",
+        "preview.preview",
+        "owner.owner_get",
+        "owner.owner_events",
+    )
+
+    # Front cache for hot share links: 404/410 answers and download redirect targets,
+    # TTLs capped by the session's expires_at, TinyLFU admission (scan resistant)
+    HOT_CACHE_ENABLED = True
+    HOT_CACHE_MAX_ENTRIES = 4096
+    HOT_CACHE_NEGATIVE_TTL = 10
+    HOT_CACHE_REDIRECT_TTL = 60
+
+    # Async uploads (POST /upload?async=1): files are spooled under UPLOAD_FOLDER/spool
+    # and transferred by UPLOAD_JOB_WORKERS threads; job status is kept in memory (per
+    # worker process) for UPLOAD_JOB_RETENTION seconds after it finishes
+    UPLOAD_JOB_WORKERS = 4
+    UPLOAD_JOB_MAX_PENDING = 64
+    UPLOAD_JOB_RETENTION = 60 * 60
+
+    # Direct uploads (POST /upload/sign, then /upload/commit): clients send file bytes
+    # straight to the storage provider with per-file signed parameters. The token tying
+    # sign to commit is signed with SECRET_KEY and valid for DIRECT_UPLOAD_TTL seconds.
+    # DIRECT_UPLOAD_VERIFY_BYTES re-reads each asset's size from the provider at commit
+    # (one Admin API call per file): the size in the client's report isn't covered by the
+    # provider's signature, so with it off the size limits rest on the client's word
+    SECRET_KEY = os.getenv("SECRET_KEY", "dev-insecure-secret-key")
+    DIRECT_UPLOAD_TTL = 15 * 60
+    DIRECT_UPLOAD_MAX_FILES = 100
+    DIRECT_UPLOAD_VERIFY_BYTES = True
+
+    # File listings (/access/<code>, /owner/<owner_code>): ?limit=&cursor=&fields= page
+    # through a session's files (/access/<code>/tree pages one directory's entries).
+    # FILES_PAGE_SIZE is the page size when no limit is given (None = the whole list);
+    # explicit limits are capped at FILES_PAGE_MAX
+    FILES_PAGE_SIZE = None
+    FILES_PAGE_MAX = 1000
+
+    # Response compression negotiated through Accept-Encoding for these endpoints;
+    # brotli when the optional "brotli" package is installed, gzip otherwise
+    COMPRESS_ENDPOINTS = ("access.access", "access.access_tree", "owner.owner_get")
+    COMPRESS_MIN_BYTES = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+
+    # Owner dashboard event stream (GET /owner/<owner_code>/events): per-connection
+    # queue bound, keep-alive interval and the "expiring_soon" lead time (seconds)
+    EVENTS_QUEUE_SIZE = 256
+    EVENTS_HEARTBEAT = 15
+    EVENTS_EXPIRING_SOON = 5 * 60
+
+    # Session metadata lives under UPLOAD_FOLDER/meta, sharded by the first
+    # METADATA_SHARD_PREFIX_LEN characters of each code; shards are parsed on first use.
+    # Applies when the store is created (or migrated from metadata.json); an existing
+    # store keeps the layout recorded in its manifest
+    METADATA_SHARD_PREFIX_LEN = 2
+    # Download counters and the shard manifest are written at most once per this many
+    # seconds (0 = on every change)
+    METADATA_PERSIST_DELAY = 1.0
+
+    # Orphan reconciliation (services/reconcile.py): a background thread lists the storage
+    # folder, ORPHAN_RECONCILE_PAGE_SIZE assets every ORPHAN_RECONCILE_INTERVAL seconds, and
+    # deletes assets no live session references once they are ORPHAN_MIN_AGE old (the expiry
+    # window; uploads still in flight are younger). A new pass starts at most every
+    # ORPHAN_PASS_INTERVAL seconds. Enable it only where the folder belongs to this
+    # deployment alone: another deployment's assets in it look like orphans. With
+    # WEB_CONCURRENCY > 1 it only reports, as in a dry run.
+    ORPHAN_RECONCILE_ENABLED = False
+    ORPHAN_RECONCILE_DRY_RUN = False
+    ORPHAN_RECONCILE_INTERVAL = 60
+    ORPHAN_RECONCILE_PAGE_SIZE = 100
+    ORPHAN_PASS_INTERVAL = 6 * 60 * 60
+    ORPHAN_MIN_AGE = 60 * 60
+
+    # /__debug__/* routes are open when DEBUG is on; otherwise they need this value in the
+    # X-Debug-Token header, and answer 404 while it is unset
+    DEBUG_ROUTES_TOKEN = None
+
+    # Graceful stop (services/shutdown.py): seconds a stopping worker waits for async
+    # uploads still transferring before it writes metadata and exits
+    SHUTDOWN_DRAIN_TIMEOUT = 10
+
+
+class ProductionConfig(DevelopmentConfig):
+    """Served by gunicorn (gunicorn.conf.py): one preloaded worker with a thread pool."""
+
+    DEBUG = False
+
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", DevelopmentConfig.UPLOAD_FOLDER)
+    # No default: direct uploads refuse to sign without it
+    SECRET_KEY = os.getenv("SECRET_KEY")
+
+    # Behind the platform's load balancer the client IP is in X-Forwarded-For
+    RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "1") == "1"
+    RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+    # Buckets survive worker restarts
+    RATE_LIMIT_STORAGE = "sqlite"
+    # In-flight caps per worker; event streams hold a server thread each, so together
+    # with uploads they stay below gunicorn's thread count
+    CONCURRENCY_LIMITS = {
+        "upload.upload": 8,
+        "download.download_batch": 4,
+        "owner.owner_events": 16,
+    }
+
+    HOT_CACHE_MAX_ENTRIES = 16384
+    UPLOAD_JOB_WORKERS = 8
+    UPLOAD_JOB_MAX_PENDING = 128
+    LOCAL_CACHE_ENABLED = os.getenv("LOCAL_CACHE_ENABLED", "0") == "1"
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    DEBUG_ROUTES_TOKEN = os.getenv("DEBUG_ROUTES_TOKEN") or None
+
+    # Off unless asked for, and then only reporting until ORPHAN_RECONCILE_DRY_RUN=0
+    ORPHAN_RECONCILE_ENABLED = os.getenv("ORPHAN_RECONCILE_ENABLED", "0") == "1"
+    ORPHAN_RECONCILE_DRY_RUN = os.getenv("ORPHAN_RECONCILE_DRY_RUN", "1") == "1"
+
+    # The server's graceful timeout (GRACEFUL_TIMEOUT, 30s) covers open requests plus this
+    SHUTDOWN_DRAIN_TIMEOUT = 20
+
+
+CONFIGS = {
+    "development": DevelopmentConfig,
+    "production": ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Config class for name, or for the APP_ENV environment variable (default development)."""
+    name = (name or os.getenv("APP_ENV") or "development").lower()
+    try:
+        return CONFIGS[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown APP_ENV: {name}")
@@ -1,12 +1,15 @@
 """
 Filename: access.py
 Purpose: GET /access/<code> returns upload session metadata and file list for the given access code.
+The file list pages with ?limit=&cursor=&fields= (see utils/pagination.py).
+GET /access/<code>/tree?path= lists one directory level of a directory upload.
 """
 
-from flask import Blueprint
+from flask import Blueprint, current_app, request
+from ..utils.pagination import Page, PageError, encode_cursor
 from ..utils.validators import validate_string
 from ..utils.responses import error, success
-from ..services import storage
+from ..services import hotcache, pathindex, ratelimit, storage
 from ..services.expiry import is_expired
 
 
@@ -15,19 +18,42 @@ access_bp = Blueprint("access", __name__)
 
 @access_bp.route("/access/<code>", methods=["GET"])
 def access(code: str):
-    # Lazy cleanup on access
-    storage.delete_expired_files(is_expired)
-
     if not validate_string(code, min_len=6, max_len=8):
         return error("Invalid access code", status=400)
+    try:
+        page = Page.from_args(
+            request.args,
+            default_limit=current_app.config.get("FILES_PAGE_SIZE"),
+            max_limit=int(current_app.config.get("FILES_PAGE_MAX", 1000)),
+        )
+    except PageError as e:
+        return error(str(e), status=400)
+
+    # Guessed codes stop here: the filter never says no to a live code
+    if not storage.access_code_may_exist(code):
+        return ratelimit.reject_unknown("access")
+
+    # Hot links: cached 404/410 answers skip the sweep and lookup
+    cache_key = ("access", code)
+    cached = hotcache.get(cache_key)
+    if cached is not None:
+        return hotcache.response_for(cached)
+
+    # Lazy cleanup on access
+    storage.delete_expired_files(is_expired)
 
     session = storage.get_session(code)
     if not session:
+        ratelimit.record_miss()
+        hotcache.put_negative(cache_key, 404, "Not found")
         return error("Not found", status=404)
 
     if is_expired(session.get("expires_at")):
+        hotcache.put_negative(cache_key, 410, "Expired")
         return error("Expired", status=410)
 
+    files, next_cursor = page.apply(session.get("files") or [])
+    file_count, total_bytes = storage.session_totals(session)
     data = {
         "upload_id": session.get("upload_id"),
         "access_code": session.get("access_code"),
@@ -36,15 +62,79 @@ def access(code: str):
         "expires_at": session.get("expires_at"),
         "download_count": session.get("download_count", 0),
         "preview_file_id": session.get("preview_file_id"),
-        "files": [
-            {
+        "file_count": file_count,
+        "total_bytes": total_bytes,
+        "files": files,
+        "next_cursor": next_cursor,
+    }
+    return success(data)
+
+
+@access_bp.route("/access/<code>/tree", methods=["GET"])
+def access_tree(code: str):
+    """Children of one directory (?path=, default the root), directories first.
+
+    Each directory carries its subtree's file_count/total_bytes; entries page with
+    ?limit=&cursor= like the flat listing.
+    """
+    if not validate_string(code, min_len=6, max_len=8):
+        return error("Invalid access code", status=400)
+    try:
+        page = Page.from_args(
+            request.args,
+            default_limit=current_app.config.get("FILES_PAGE_SIZE"),
+            max_limit=int(current_app.config.get("FILES_PAGE_MAX", 1000)),
+        )
+    except PageError as e:
+        return error(str(e), status=400)
+
+    if not storage.access_code_may_exist(code):
+        return ratelimit.reject_unknown("access")
+
+    storage.delete_expired_files(is_expired)
+
+    session = storage.get_session(code)
+    if not session:
+        ratelimit.record_miss()
+        return error("Not found", status=404)
+    if is_expired(session.get("expires_at")):
+        return error("Expired", status=410)
+
+    path = pathindex.normalize_path(request.args.get("path"))
+    node, _file_index = pathindex.index_for(code, session).find(path)
+    if node is None:
+        return error("Directory not found", status=404)
+
+    files = session.get("files") or []
+    entries = node.entries()
+    end = len(entries) if page.limit is None else min(len(entries), page.offset + page.limit)
+    items = []
+    for kind, name, ref in entries[page.offset:end]:
+        child_path = f"{path}/{name}" if path else name
+        if kind == "dir":
+            items.append({
+                "type": "dir",
+                "name": name,
+                "path": child_path,
+                "file_count": ref.file_count,
+                "total_bytes": ref.total_bytes,
+            })
+        else:
+            f = files[ref]
+            items.append({
+                "type": "file",
+                "name": name,
+                "path": child_path,
                 "file_id": f.get("file_id"),
-                "filename": f.get("filename"),
                 "size": f.get("size"),
                 "mime_type": f.get("mime_type"),
-                "download_count": f.get("download_count", 0),
-            }
-            for f in (session.get("files") or [])
-        ],
+            })
+    data = {
+        "access_code": session.get("access_code"),
+        "path": path,
+        "file_count": node.file_count,
+        "total_bytes": node.total_bytes,
+        "entries": items,
+        "next_cursor": encode_cursor(end) if end < len(entries) else None,
     }
     return success(data)
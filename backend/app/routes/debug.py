@@ -1,18 +1,131 @@
 """
 Filename: debug.py
-Purpose: Debug-only routes. Provides a manual kill-switch to force expiry cleanup.
+Purpose: Debug-only routes. Provides a manual kill-switch to force expiry cleanup,
+cache/code/rate-limit/metadata stats, runtime control of the request profiler, and
+orphan reconciliation status and manual runs. Open when DEBUG is on; otherwise a request
+must send DEBUG_ROUTES_TOKEN in the X-Debug-Token header, and without a token configured
+the routes answer 404.
 """
 
-from flask import Blueprint
-from ..utils.responses import success
-from ..services import storage
+import hmac
+
+from flask import Blueprint, current_app, request
+from ..utils.responses import error, success
+from ..services import storage, disk_cache, hotcache, profiler, ratelimit, reconcile
+from ..services.codegen import MAX_ACCESS_LENGTH, MIN_ACCESS_LENGTH, choose_code_length, keyspace_occupancy
 from ..services.expiry import is_expired
 
 
 debug_bp = Blueprint("debug", __name__)
 
 
+@debug_bp.before_request
+def _require_debug_access():
+    if current_app.config.get("DEBUG"):
+        return None
+    token = current_app.config.get("DEBUG_ROUTES_TOKEN")
+    if not token:
+        return error("Not found", status=404)
+    sent = request.headers.get("X-Debug-Token", "")
+    if not hmac.compare_digest(sent.encode("utf-8"), str(token).encode("utf-8")):
+        return error("Forbidden", status=403)
+    return None
+
+
 @debug_bp.route("/__debug__/force-expiry", methods=["POST"])
 def force_expiry():
     deleted = storage.delete_expired_files(is_expired)
     return success({"deleted": int(deleted)})
+
+
+@debug_bp.route("/__debug__/cache", methods=["GET"])
+def cache_stats():
+    return success({**disk_cache.stats(), "hot": hotcache.stats()})
+
+
+@debug_bp.route("/__debug__/ratelimit", methods=["GET"])
+def ratelimit_stats():
+    return success(ratelimit.stats())
+
+
+@debug_bp.route("/__debug__/metadata", methods=["GET"])
+def metadata_stats():
+    """Shard layout: shards on disk, parsed so far, and waiting to be written."""
+    return success(storage.metadata_stats())
+
+
+@debug_bp.route("/__debug__/codes", methods=["GET"])
+def code_stats():
+    """Keyspace occupancy per access code length, to see when codes must grow."""
+    live = storage.session_count()
+    return success({
+        "live_sessions": live,
+        "current_length": choose_code_length(live),
+        "occupancy": {
+            str(length): keyspace_occupancy(live, length)
+            for length in range(MIN_ACCESS_LENGTH, MAX_ACCESS_LENGTH + 1)
+        },
+    })
+
+
+@debug_bp.route("/__debug__/profiling", methods=["GET", "POST"])
+def profiling():
+    """GET: profiler status. POST {enabled, mode, sample_rate, interval}: reconfigure."""
+    if request.method == "GET":
+        return success(profiler.status())
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        state = profiler.configure(
+            enabled=data.get("enabled"),
+            mode=data.get("mode"),
+            sample_rate=data.get("sample_rate"),
+            interval=data.get("interval"),
+        )
+    except (TypeError, ValueError) as e:
+        return error(str(e), status=400)
+    return success(state)
+
+
+@debug_bp.route("/__debug__/profiling/flush", methods=["POST"])
+def profiling_flush():
+    """Write collapsed stacks / pstats per endpoint; ?reset=1 clears them afterwards."""
+    written = profiler.flush()
+    if request.args.get("reset") in ("1", "true"):
+        profiler.reset()
+    return success({"files": written})
+
+
+@debug_bp.route("/__debug__/orphans", methods=["GET"])
+def orphans_status():
+    """Reconciliation cursor, the pass in progress, the last finished pass and running totals."""
+    return success(reconcile.status())
+
+
+@debug_bp.route("/__debug__/orphans/run", methods=["POST"])
+def orphans_run():
+    """POST {pages, dry_run}: reconcile up to pages pages now (default 1), stopping at the
+    end of a pass. The cursor is shared with the background thread. dry_run can only add to
+    ORPHAN_RECONCILE_DRY_RUN, not lift it."""
+    if not reconcile.status()["enabled"]:
+        return error("Orphan reconciliation is disabled", status=409)
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        pages = min(1000, max(1, int(data.get("pages") or 1)))
+    except (TypeError, ValueError):
+        return error("Invalid pages", status=400)
+    report = {"pages": 0, "scanned": 0, "orphans": 0, "deleted": 0, "bytes_reclaimed": 0, "orphan_ids": []}
+    for _ in range(pages):
+        try:
+            page = reconcile.step(dry_run=data.get("dry_run"))
+        except NotImplementedError:
+            return error("Storage backend cannot list its assets", status=400)
+        report["pages"] += 1
+        for key in ("scanned", "orphans", "deleted", "bytes_reclaimed"):
+            report[key] += page[key]
+        report["orphan_ids"].extend(page["orphan_ids"])
+        report["dry_run"] = page["dry_run"]
+        report["pass_complete"] = page["pass_complete"]
+        if page["pass_complete"]:
+            break
+    report["orphan_ids"] = report["orphan_ids"][:20]
+    return success(report)
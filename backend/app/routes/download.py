@@ -6,36 +6,57 @@ New: GET /download/<access_code>/<file_id> -> download a specific file within a
 Legacy: GET /download/<access_code> -> download the first file (for single-file sessions/back-compat).
 """
 
-from flask import Blueprint, request, redirect, jsonify
-from urllib.parse import quote as urlquote
-import os
+from flask import Blueprint, Response, current_app, request, redirect, jsonify, send_file
 from ..utils.validators import validate_string
 from ..utils.responses import error
-from ..services import storage
+from ..services import storage, disk_cache, hotcache, pathindex, ratelimit
+from ..services.backends import file_source, get_backend
 from ..services.expiry import is_expired
-import cloudinary.api  # type: ignore
+from ..services.zipstream import ZipEntry, stream_zip, unique_names
+from ..utils.log import get_logger
 
 
 download_bp = Blueprint("download", __name__)
+log = get_logger(__name__)
 
 
 @download_bp.route("/download/<access_code>/<file_id>", methods=["GET"])
 def download_file(access_code: str, file_id: str):
-    # Lazy cleanup on download
-    storage.delete_expired_files(is_expired)
-
     if not validate_string(access_code, min_len=6, max_len=8):
         return error("Invalid access code", status=400)
 
+    # Guessed codes stop here: the filter never says no to a live code
+    if not storage.access_code_may_exist(access_code):
+        return ratelimit.reject_unknown("access")
+
+    # Hot links: a cached redirect/404/410 skips the sweep and lookups;
+    # the download counter is still bumped (in memory, persisted debounced)
+    cache_key = ("download", access_code, file_id)
+    cached = hotcache.get(cache_key)
+    if cached is not None:
+        if cached[0] == "redirect" and request.method != "HEAD":
+            storage.increment_download_count(access_code, file_id)
+        elif cached[0] == "error" and cached[1] == 404:
+            ratelimit.record_miss()
+        return hotcache.response_for(cached)
+
+    # Lazy cleanup on download
+    storage.delete_expired_files(is_expired)
+
     session = storage.get_session(access_code)
     if not session:
+        ratelimit.record_miss()
+        hotcache.put_negative(cache_key, 404, "Not found")
         return error("Not found", status=404)
     if is_expired(session.get("expires_at")):
+        hotcache.put_negative(cache_key, 410, "Expired")
         return error("Expired", status=410)
 
     files = session.get("files") or []
     file_rec = next((f for f in files if f.get("file_id") == file_id), None)
     if not file_rec:
+        ratelimit.record_miss()
+        hotcache.put_negative(cache_key, 404, "File not found in session", session.get("expires_at"))
         return error("File not found in session", status=404)
 
     file_url = file_rec.get("file_url")
@@ -50,34 +71,44 @@ def download_file(access_code: str, file_id: str):
             except Exception:
                 pass
 
-        cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
-
-        # RAW (e.g., zips, pdfs uploaded as raw): use raw delivery with fl_attachment
-        if resource_type == "raw" and public_id:
-            if not cloud_name:
-                return error("Server misconfigured: CLOUDINARY_CLOUD_NAME missing", status=500)
-            raw_download_url = (
-                f"https://res.cloudinary.com/{cloud_name}/raw/upload/"
-                f"fl_attachment:{urlquote(original_name)}/{public_id}"
-            )
-            return redirect(raw_download_url)
-
-        # Images/Videos: use resource delivery with fl_attachment to force Content-Disposition
-        if public_id and resource_type in ("image", "video"):
-            if not cloud_name:
-                return error("Server misconfigured: CLOUDINARY_CLOUD_NAME missing", status=500)
-            attach_url = (
-                f"https://res.cloudinary.com/{cloud_name}/{resource_type}/upload/"
-                f"fl_attachment:{urlquote(original_name)}/{public_id}"
+        backend = get_backend()
+
+        # Same-host storage: serve directly (zero-copy, Range aware), no redirect hop
+        local_path = backend.local_path(public_id)
+        if local_path:
+            return send_file(
+                local_path,
+                mimetype=file_rec.get("mime_type") or None,
+                as_attachment=True,
+                download_name=original_name,
+                conditional=True,
             )
-            return redirect(attach_url)
 
-        # Fallback: if we don't have public_id (unexpected), attempt query param flags
-        if not file_url:
+        cached = disk_cache.serve(
+            access_code,
+            file_id,
+            source=file_source(file_rec),
+            size=file_rec.get("size"),
+            download_name=original_name,
+            mimetype=file_rec.get("mime_type"),
+            as_attachment=True,
+        )
+        if cached is not None:
+            return cached
+
+        # Delivery URL with an attachment flag so the browser downloads instead of displaying
+        try:
+            download_url = backend.delivery_url(
+                public_id, resource_type, file_url=file_url, attachment_name=original_name
+            )
+        except RuntimeError as e:
+            return error(str(e), status=500)
+        if not download_url:
             return error("File missing", status=404)
-        sep = "&" if "?" in file_url else "?"
-        filename_param = urlquote(original_name)
-        download_url = f"{file_url}{sep}dl=1&attachment=true&filename={filename_param}"
+        if not disk_cache.enabled():
+            # A cached redirect would answer every later request before the disk cache is
+            # asked, so a file it admits would never be served from it
+            hotcache.put_redirect(cache_key, download_url, session.get("expires_at"))
         return redirect(download_url)
     except FileNotFoundError:
         return error("File missing", status=404)
@@ -88,11 +119,14 @@ def download_file(access_code: str, file_id: str):
 @download_bp.route("/download/<access_code>", methods=["GET"])
 def download_legacy(access_code: str):
     """Back-compat: download the first (or only) file in a session."""
-    storage.delete_expired_files(is_expired)
     if not validate_string(access_code, min_len=6, max_len=8):
         return error("Invalid access code", status=400)
+    if not storage.access_code_may_exist(access_code):
+        return ratelimit.reject_unknown("access")
+    storage.delete_expired_files(is_expired)
     session = storage.get_session(access_code)
     if not session:
+        ratelimit.record_miss()
         return error("Not found", status=404)
     if is_expired(session.get("expires_at")):
         return error("Expired", status=410)
@@ -108,6 +142,10 @@ def download_batch():
     """Create a ZIP of selected files in a session and return an archive URL.
 
     Expected JSON payload: { "access_code": "ABC123", "file_ids": ["f1_XXXX", "f2_YYYY"] }
+    "paths": ["photos/2024", "notes.txt"] selects whole directories (or single files) of a
+    directory upload, in addition to or instead of file_ids.
+    Pass "mode": "stream" (or ?mode=stream) to receive the ZIP itself, built on the fly
+    by this server instead of Cloudinary's rate-limited archive API.
     """
     try:
         data = request.get_json(force=True, silent=True) or {}
@@ -115,12 +153,14 @@ def download_batch():
         data = {}
     access_code = (data.get("access_code") or "").strip().upper()
     file_ids = data.get("file_ids") or []
+    paths = data.get("paths") or []
 
     if not validate_string(access_code, min_len=6, max_len=8):
         return error("Invalid access code", status=400)
-    if not isinstance(file_ids, list) or not file_ids:
-        return error("file_ids must be a non-empty array", status=400)
+    if not isinstance(file_ids, list) or not isinstance(paths, list) or not (file_ids or paths):
+        return error("file_ids or paths must be a non-empty array", status=400)
 
+    storage.delete_expired_files(is_expired)
     session = storage.get_session(access_code)
     if not session:
         return error("Not found", status=404)
@@ -128,35 +168,35 @@ def download_batch():
         return error("Expired", status=410)
 
     files = session.get("files") or []
-    selected = [f for f in files if f.get("file_id") in set(file_ids)]
+    wanted = set(file_ids)
+    if paths:
+        index = pathindex.index_for(access_code, session)
+        for raw in paths:
+            node, file_index = index.find(pathindex.normalize_path(raw if isinstance(raw, str) else ""))
+            if node is not None:
+                wanted.update(files[i].get("file_id") for i in node.file_indexes())
+            elif file_index is not None:
+                wanted.add(files[file_index].get("file_id"))
+            else:
+                return error(f"Path not found: {raw}", status=400)
+    selected = [f for f in files if f.get("file_id") in wanted]
     if not selected:
         return error("No matching files in session", status=400)
 
-    # Build Cloudinary resources list
-    resources = []
-    for f in selected:
-        pid = f.get("cloudinary_public_id")
-        rtype = (f.get("resource_type") or "auto").lower()
-        if not pid:
-            continue
-        # Cloudinary expects resource_type in {image, video, raw}
-        if rtype not in ("image", "video", "raw"):
-            rtype = "raw"
-        resources.append({"public_id": pid, "resource_type": rtype})
-
-    if not resources:
+    mode = (data.get("mode") or request.args.get("mode") or "").strip().lower()
+    if mode == "stream":
+        return _stream_batch(access_code, session, selected)
+
+    stored = [f for f in selected if f.get("cloudinary_public_id")]
+    if not stored:
         return error("Selected files are not available for bundling", status=400)
+    # Same member names as the streamed zip
+    names = unique_names(pathindex.normalize_path(pathindex.file_path(f)) or f.get("file_id") for f in stored)
+    members = [((f["cloudinary_public_id"], f.get("resource_type")), name) for f, name in zip(stored, names)]
 
     try:
-        # Generate archive URL (non-blocking zip creation on Cloudinary side)
-        resp = cloudinary.api.generate_archive(
-            resources=resources,
-            flatten_folders=True,
-            allow_missing=True,
-            target_public_id=None,
-            mode="download",
-        )
-        archive_url = resp.get("url")
+        # Archive is built by the storage backend (Cloudinary generates it on its side)
+        archive_url = get_backend().archive(members)
         if not archive_url:
             return error("Failed to create archive", status=500)
         # Increment session-level count once
@@ -166,5 +206,44 @@ def download_batch():
             pass
         return jsonify({"success": True, "archive_url": archive_url})
     except Exception as e:
-        print(f"[BATCH][ERROR] {e}")
+        log.error("batch.archive.failed", access_code=access_code, error=str(e))
         return error("Failed to create batch archive", status=500)
+
+
+def _stream_batch(access_code: str, session: dict, selected: list):
+    """Stream a STORED zip of the selected files straight to the client."""
+    available = [f for f in selected if f.get("file_url") or f.get("cloudinary_public_id")]
+    if not available:
+        return error("Selected files are not available for bundling", status=400)
+
+    cfg = current_app.config
+    chunk_size = cfg.get("BATCH_STREAM_CHUNK_SIZE", 256 * 1024)
+    timeout = cfg.get("BATCH_STREAM_TIMEOUT", 30)
+    # Entries keep their directory structure
+    names = unique_names(pathindex.normalize_path(pathindex.file_path(f)) or f.get("file_id") for f in available)
+    entries = [
+        ZipEntry(
+            name=name,
+            source=file_source(f, chunk_size=chunk_size, timeout=timeout),
+            size=f.get("size"),
+            modified_at=session.get("uploaded_at"),
+        )
+        for name, f in zip(names, available)
+    ]
+
+    body = stream_zip(
+        entries,
+        prefetch=cfg.get("BATCH_STREAM_PREFETCH", 4),
+        queue_chunks=cfg.get("BATCH_STREAM_QUEUE_CHUNKS", 8),
+    )
+
+    # Increment session-level count once, same as the archive URL flow
+    try:
+        storage.increment_download_count(access_code)
+    except Exception:
+        pass
+
+    resp = Response(body, mimetype="application/zip", direct_passthrough=True)
+    resp.headers["Content-Disposition"] = f"attachment; filename={access_code}.zip"
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
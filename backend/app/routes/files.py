@@ -0,0 +1,32 @@
+"""
+Filename: files.py
+Purpose: GET /files/<public_id> serves assets stored by the local storage backend
+(send_file with Range/conditional support). Returns 404 for any other backend.
+"""
+
+from flask import Blueprint, request, send_file
+import os
+from ..utils.responses import error
+from ..services import storage
+from ..services.backends import get_backend
+from ..services.expiry import is_expired
+
+
+files_bp = Blueprint("files", __name__)
+
+
+@files_bp.route("/files/<path:public_id>", methods=["GET"])
+def serve_file(public_id: str):
+    # An expired session's files stop being served as soon as they are due
+    storage.delete_expired_files(is_expired)
+    path = get_backend().local_path(public_id)
+    if not path or not os.path.isfile(path):
+        return error("Not found", status=404)
+
+    attachment = request.args.get("attachment")
+    return send_file(
+        path,
+        as_attachment=bool(attachment),
+        download_name=attachment or os.path.basename(path),
+        conditional=True,
+    )
@@ -0,0 +1,15 @@
+"""
+Filename: metrics.py
+Purpose: GET /metrics exposes in-process metrics in the Prometheus text format.
+"""
+
+from flask import Blueprint, Response
+from ..services import metrics
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
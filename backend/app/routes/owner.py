@@ -1,36 +1,65 @@
 """
 Filename: owner.py
-Purpose: Defines endpoints for owner dashboard: retrieve upload session via owner_code and delete the session.
+Purpose: Defines endpoints for owner dashboard: retrieve upload session via owner_code (file list
+paged with ?limit=&cursor=&fields=), stream live changes as server-sent events, and delete the session.
 """
-from flask import Blueprint
+import json
+import time
+from typing import Optional
+from flask import Blueprint, Response, current_app, request
+from ..utils.pagination import Page, PageError
 from ..utils.responses import success, error
-from ..services import storage
+from ..services import events, ratelimit, storage
 from ..services.expiry import is_expired
+from ..utils.log import get_logger
 
 
 owner_bp = Blueprint("owner", __name__)
+log = get_logger(__name__)
 
 
 @owner_bp.route("/owner/<owner_code>", methods=["GET"])
 def owner_get(owner_code: str):
     # Sanitize incoming code to support hyphenated or formatted inputs
     cleaned = "".join(ch for ch in owner_code if ch.isalnum()).upper()
-    print(f"[OWNER] lookup start owner_code={owner_code} cleaned={cleaned}")
+    try:
+        page = _page_from(request.args)
+    except PageError as e:
+        return error(str(e), status=400)
+    # Guessed codes stop here (no store lookup, no log line per miss)
+    if not storage.owner_code_may_exist(cleaned):
+        return ratelimit.reject_unknown("owner")
+    storage.delete_expired_files(is_expired)
     found = storage.get_session_by_owner(cleaned)
     if not found:
-        print(f"[OWNER] lookup miss owner_code={owner_code} cleaned={cleaned}")
+        ratelimit.record_miss()
+        log.info("owner.lookup.miss", owner_code=cleaned)
         return error("Not found", status=404)
 
     access_code, sess = found
     if is_expired(sess.get("expires_at")):
-        print(f"[OWNER] lookup hit (expired) owner_code={owner_code} cleaned={cleaned} access_code={access_code}")
+        log.info("owner.lookup.expired", owner_code=cleaned, access_code=access_code)
         return error("Expired", status=410)
     status = "active"
-    print(f"[OWNER] lookup hit owner_code={owner_code} cleaned={cleaned} access_code={access_code} status={status}")
+    log.debug("owner.lookup.hit", owner_code=cleaned, access_code=access_code, status=status)
+    return success(_owner_payload(access_code, sess, status, page))
 
+
+def _page_from(args) -> Page:
+    cfg = current_app.config
+    return Page.from_args(
+        args,
+        default_limit=cfg.get("FILES_PAGE_SIZE"),
+        max_limit=int(cfg.get("FILES_PAGE_MAX", 1000)),
+    )
+
+
+def _owner_payload(access_code: str, sess: dict, status: str, page: Optional[Page] = None) -> dict:
     files = sess.get("files") or []
     first = files[0] if files else {}
-    data = {
+    items, next_cursor = (page or Page()).apply(files)
+    file_count, total_bytes = storage.session_totals(sess)
+    return {
         "upload_id": sess.get("upload_id"),
         "access_code": access_code,
         "owner_code": sess.get("owner_code"),
@@ -38,36 +67,114 @@ def owner_get(owner_code: str):
         "expires_at": sess.get("expires_at"),
         "download_count": sess.get("download_count", 0),
         "preview_file_id": sess.get("preview_file_id"),
-        "files": [
-            {
-                "file_id": f.get("file_id"),
-                "filename": f.get("filename"),
-                "size": f.get("size"),
-                "mime_type": f.get("mime_type"),
-                "download_count": f.get("download_count", 0),
-            }
-            for f in files
-        ],
+        "file_count": file_count,
+        "total_bytes": total_bytes,
+        "files": items,
+        "next_cursor": next_cursor,
         # Back-compat fields for UIs expecting single-file metadata
         "filename": first.get("filename"),
         "size": first.get("size"),
         "type": first.get("mime_type"),
         "status": status,
     }
-    return success(data)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _coalesce(batch):
+    """Collapse a burst of download_count events into the latest one per file."""
+    out, seen = [], {}
+    for event, data in batch:
+        if event == "download_count":
+            key = data.get("file_id")
+            if key in seen:
+                out[seen[key]] = (event, data)
+                continue
+            seen[key] = len(out)
+        out.append((event, data))
+    return out
+
+
+@owner_bp.route("/owner/<owner_code>/events", methods=["GET"])
+def owner_events(owner_code: str):
+    """Server-sent events for the owner dashboard: a snapshot first, then download_count,
+    file_added, expiring_soon, expired/deleted (which end the stream). "resync" means
+    events were dropped and the client should refetch GET /owner/<owner_code>; "reconnect"
+    (worker shutdown) ends the stream and the client reconnects after the retry delay."""
+    cleaned = "".join(ch for ch in owner_code if ch.isalnum()).upper()
+    if not storage.owner_code_may_exist(cleaned):
+        return ratelimit.reject_unknown("owner")
+    storage.delete_expired_files(is_expired)
+    found = storage.get_session_by_owner(cleaned)
+    if not found:
+        ratelimit.record_miss()
+        return error("Not found", status=404)
+    access_code, sess = found
+    expires_at = float(sess.get("expires_at") or 0)
+    if is_expired(expires_at):
+        return error("Expired", status=410)
+
+    cfg = current_app.config
+    heartbeat = float(cfg.get("EVENTS_HEARTBEAT", 15))
+    soon = float(cfg.get("EVENTS_EXPIRING_SOON", 300))
+    # Subscribe before taking the snapshot so nothing falls in between
+    sub = events.subscribe(access_code)
+    # First page only (FILES_PAGE_SIZE); the client pages the rest via GET /owner/<owner_code>
+    snapshot = _owner_payload(access_code, sess, "active", _page_from({}))
+    log.debug("owner.events.open", owner_code=cleaned, access_code=access_code)
+
+    def stream():
+        warned = False
+        try:
+            yield f"retry: 5000\n{_sse('snapshot', snapshot)}"
+            while True:
+                now = time.time()
+                if now >= expires_at:
+                    yield _sse("expired", {"access_code": access_code})
+                    return
+                if not warned and now >= expires_at - soon:
+                    warned = True
+                    yield _sse("expiring_soon", {"expires_at": expires_at, "seconds_left": int(expires_at - now)})
+                    continue
+                wait = min(heartbeat, expires_at - now)
+                if not warned:
+                    wait = min(wait, expires_at - soon - now)
+                batch = sub.get_batch(wait)
+                if sub.closed:
+                    yield _sse("reconnect", {})
+                    return
+                if sub.overflowed:
+                    sub.overflowed = False
+                    yield _sse("resync", {})
+                if not batch:
+                    yield ": keep-alive\n\n"
+                    continue
+                for event, data in _coalesce(batch):
+                    yield _sse(event, data)
+                    if event == "deleted":
+                        return
+        finally:
+            events.unsubscribe(sub)
+
+    resp = Response(stream(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 
 @owner_bp.route("/owner/<owner_code>/delete", methods=["DELETE"])
 def owner_delete(owner_code: str):
     cleaned = "".join(ch for ch in owner_code if ch.isalnum()).upper()
-    print(f"[OWNER] delete start owner_code={owner_code} cleaned={cleaned}")
+    storage.delete_expired_files(is_expired)
     found = storage.get_session_by_owner(cleaned)
     if not found:
-        print(f"[OWNER] delete miss owner_code={owner_code} cleaned={cleaned}")
+        log.info("owner.delete.miss", owner_code=cleaned)
         return error("Not found", status=404)
 
     access_code, _sess = found
     deleted = storage.delete_session(access_code)
     storage.remove_owner_mapping(cleaned)
-    print(f"[OWNER] delete done owner_code={owner_code} cleaned={cleaned} access_code={access_code} files_deleted={deleted}")
+    log.info("owner.delete", owner_code=cleaned, access_code=access_code, files_deleted=deleted)
     return success({"owner_code": cleaned, "access_code": access_code, "files_deleted": deleted}, message="Deleted")
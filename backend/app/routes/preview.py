@@ -6,30 +6,47 @@ Rules:
 - Validate access code and expiry
 - Do NOT increment download count
 - Images/videos/pdfs -> redirect to preview-safe URL (no dl=1)
+- ?size=thumb|medium -> redirect to the eagerly generated derivative (downscaled image,
+  video poster frame / low-bitrate rendition); files without one get the original
+- ?inline=1 -> stream through the storage backend with Range (206), ETag/Last-Modified
+  and a Cache-Control max-age bounded by the session's remaining lifetime
 - Others -> 415 Unsupported Media Type
 """
 
-from flask import Blueprint, redirect
-import os
+import itertools
+from flask import Blueprint, Response, current_app, redirect, request, send_file
 from ..utils.validators import validate_string
 from ..utils.responses import error
-from ..services import storage
-from ..services.expiry import is_expired
+from ..services import storage, disk_cache, ratelimit
+from ..services.backends import file_source, get_backend
+from ..services.expiry import is_expired, now_ts
+from ..utils.log import get_logger
 
 
 preview_bp = Blueprint("preview", __name__)
+log = get_logger(__name__)
+
+PREVIEW_SIZES = ("thumb", "medium", "original")
 
 
 @preview_bp.route("/preview/<access_code>/<file_id>", methods=["GET"])  # HEAD not strictly needed for embedding
 def preview(access_code: str, file_id: str):
-    # Lazy cleanup on request
-    storage.delete_expired_files(is_expired)
-
     if not validate_string(access_code, min_len=6, max_len=8):
         return error("Invalid access code", status=400)
+    size = (request.args.get("size") or "original").lower()
+    if size not in PREVIEW_SIZES:
+        return error("Invalid size", status=400)
+
+    # Guessed codes stop here: the filter never says no to a live code
+    if not storage.access_code_may_exist(access_code):
+        return ratelimit.reject_unknown("access")
+
+    # Lazy cleanup on request
+    storage.delete_expired_files(is_expired)
 
     session = storage.get_session(access_code)
     if not session:
+        ratelimit.record_miss()
         return error("Not found", status=404)
     if is_expired(session.get("expires_at")):
         return error("Expired", status=410)
@@ -54,28 +71,162 @@ def preview(access_code: str, file_id: str):
     is_video = resource_type == "video" or any(original_name.endswith(ext) for ext in [".mp4", ".webm", ".ogg", ".mov"]) 
     is_pdf = original_name.endswith(".pdf") or "pdf" in (file_rec.get("mime_type", "").lower())
 
-    # Cloudinary raw (pdf/zip) delivery: build raw base if needed
-    if resource_type == "raw" and public_id:
-      cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
-      if not cloud_name:
-          return error("Server misconfigured: CLOUDINARY_CLOUD_NAME missing", status=500)
-      base_raw_url = f"https://res.cloudinary.com/{cloud_name}/raw/upload/{public_id}"
-      if is_pdf:
-          return redirect(base_raw_url)
-      # Other raw types are not supported for inline preview
-      return error("Preview not supported", status=415)
-
-    # For image/video types (or when file_url already points to a Cloudinary delivery URL), return it directly without dl=1
-    if is_image or is_video:
-        # Remove any dl or attachment flags if present to avoid forced download
-        cleaned = file_url
-        # Strip common download params
-        for key in ["dl", "attachment", "filename"]:
-            if f"{key}=" in cleaned:
-                cleaned = cleaned.split("?")[0]
-        return redirect(cleaned)
-
-    if is_pdf:
-        return redirect(file_url.split("?")[0])
-
-    return error("Preview not supported", status=415)
+    # Raw resources (pdf/zip): only pdfs can be previewed inline
+    if resource_type == "raw" and not is_pdf:
+        return error("Preview not supported", status=415)
+    if not (is_image or is_video or is_pdf):
+        return error("Preview not supported", status=415)
+
+    # Derivatives are small and CDN cached; hand them out directly, even for ?inline=1
+    derivative_url = (file_rec.get("previews") or {}).get(size)
+    if derivative_url:
+        return redirect(derivative_url)
+
+    backend = get_backend()
+    if request.args.get("inline") in ("1", "true"):
+        return _stream_inline(backend, access_code, session, file_rec)
+
+    local_path = backend.local_path(public_id)
+    if local_path:
+        try:
+            return send_file(local_path, mimetype=file_rec.get("mime_type") or None, conditional=True)
+        except FileNotFoundError:
+            return error("File missing", status=404)
+
+    cached = disk_cache.serve(
+        access_code,
+        file_id,
+        source=file_source(file_rec),
+        size=file_rec.get("size"),
+        download_name=file_rec.get("filename") or file_id,
+        mimetype=file_rec.get("mime_type"),
+    )
+    if cached is not None:
+        return cached
+
+    # Delivery URL without dl/attachment flags, which is safe for embedding tags
+    try:
+        preview_url = backend.delivery_url(public_id, resource_type, file_url=file_url)
+    except RuntimeError as e:
+        return error(str(e), status=500)
+    if not preview_url:
+        return error("File missing", status=404)
+    return redirect(preview_url)
+
+
+def _cache_max_age(session: dict) -> int:
+    """Browser cache lifetime, never outliving the session itself."""
+    remaining = int(float(session.get("expires_at") or 0) - now_ts())
+    return max(0, min(int(current_app.config.get("PREVIEW_MAX_AGE", 3600)), remaining))
+
+
+def _with_cache_headers(resp, session: dict, etag: str, last_modified: float):
+    resp.cache_control.no_cache = None
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    resp.cache_control.private = True
+    resp.cache_control.max_age = _cache_max_age(session)
+    resp.accept_ranges = "bytes"
+    return resp
+
+
+def _single_range():
+    """The request's Range if it asks for one range. A multi-range request is served whole
+    (200), as RFC 9110 allows; its header is dropped so send_file doesn't answer 416 either."""
+    rng = request.range
+    if rng is not None and len(rng.ranges) > 1:
+        request.environ.pop("HTTP_RANGE", None)
+        return None
+    return rng
+
+
+def _stream_inline(backend, access_code: str, session: dict, file_rec: dict):
+    """Serve the asset body ourselves so browsers can seek (Range) and revalidate (ETag)."""
+    rng = _single_range()
+    file_id = file_rec.get("file_id")
+    public_id = file_rec.get("cloudinary_public_id")
+    mimetype = file_rec.get("mime_type") or "application/octet-stream"
+    # Assets are immutable once uploaded, so id + size is a stable validator
+    etag = f"{public_id or file_id}-{int(file_rec.get('size') or 0)}"
+    last_modified = float(session.get("uploaded_at") or 0)
+
+    local_path = backend.local_path(public_id)
+    if local_path:
+        try:
+            resp = send_file(
+                local_path,
+                mimetype=mimetype,
+                conditional=True,
+                etag=etag,
+                last_modified=last_modified,
+                max_age=_cache_max_age(session),
+            )
+        except FileNotFoundError:
+            return error("File missing", status=404)
+        resp.cache_control.public = False
+        resp.cache_control.private = True
+        return resp
+
+    # Conditional GET: If-None-Match wins over If-Modified-Since
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return _with_cache_headers(Response(status=304), session, etag, last_modified)
+    elif request.if_modified_since and request.if_modified_since.timestamp() >= int(last_modified):
+        return _with_cache_headers(Response(status=304), session, etag, last_modified)
+
+    cached = disk_cache.serve(
+        access_code,
+        file_id,
+        source=file_source(file_rec),
+        size=file_rec.get("size"),
+        download_name=file_rec.get("filename") or file_id,
+        mimetype=mimetype,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    if cached is not None:
+        return _with_cache_headers(cached, session, etag, last_modified)
+
+    size = int(file_rec.get("size") or 0)
+    start, end, status = 0, size - 1, 200
+    # If-Range: only honor the range when the client's copy is still current
+    if_range = request.if_range
+    if rng is not None and if_range.etag is not None and if_range.etag != etag:
+        rng = None
+    elif rng is not None and if_range.date is not None and if_range.date.timestamp() < int(last_modified):
+        rng = None
+    if rng is not None:
+        bounds = rng.range_for_length(size)
+        if bounds is None:
+            resp = Response(status=416)
+            resp.headers["Content-Range"] = f"bytes */{size}"
+            return _with_cache_headers(resp, session, etag, last_modified)
+        start, end, status = bounds[0], bounds[1] - 1, 206
+
+    length = max(0, end - start + 1)
+    body = iter(())
+    if request.method != "HEAD" and length:
+        chunks = backend.iter_bytes(
+            public_id,
+            file_rec.get("resource_type"),
+            file_url=file_rec.get("file_url"),
+            start=start,
+            end=end,
+            chunk_size=current_app.config.get("PREVIEW_STREAM_CHUNK_SIZE", 256 * 1024),
+            timeout=current_app.config.get("BATCH_STREAM_TIMEOUT", 30),
+        )
+        # Open the upstream before committing to a status code
+        try:
+            first = next(chunks, b"")
+        except FileNotFoundError:
+            return error("File missing", status=404)
+        except Exception as e:
+            log.warning("preview.stream.failed", access_code=access_code, file_id=file_id, error=str(e))
+            return error("Failed to fetch file", status=502)
+        body = itertools.chain([first], chunks)
+
+    resp = Response(body, status=status, mimetype=mimetype, direct_passthrough=True)
+    resp.content_length = length
+    if status == 206:
+        resp.content_range = f"bytes {start}-{end}/{size}"
+    return _with_cache_headers(resp, session, etag, last_modified)
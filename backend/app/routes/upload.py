@@ -2,29 +2,83 @@
 Filename: upload.py
 Purpose: POST /upload accepts one or more files and creates a single upload session
 with a single access_code/owner_code. All files in the request are grouped
-into that session.
+into that session. POST /upload/sign + /upload/commit do the same for files the
+client sends straight to the storage provider.
 """
 
+import json
 import time
-import random
-from flask import Blueprint, request
-from ..services import storage
-from ..services.codegen import generate_access_code, generate_access_url, generate_owner_code, ALPHABET
+from flask import Blueprint, Response, current_app, request
+from werkzeug.utils import secure_filename
+from ..services import direct_upload, metrics, storage, upload_jobs
+from ..services.codegen import (
+    choose_code_length,
+    generate_access_code,
+    generate_access_url,
+    generate_owner_code,
+    keyspace_occupancy,
+    random_token,
+)
 from ..services.expiry import compute_expiry, EXPIRY_HUMAN, is_expired
 from ..utils.responses import success, error
+from ..utils.log import get_logger
 
 
 upload_bp = Blueprint("upload", __name__)
+log = get_logger(__name__)
+
+# Size limits (bytes)
+GB = 1024 * 1024 * 1024
+MB = 1024 * 1024
+LIMIT_DIR = 2 * GB
+LIMIT_VIDEO = 2 * GB
+LIMIT_AUDIO = 50 * MB
+LIMIT_FILE = 100 * MB
+
+
+def _file_limit_error(file) -> str | None:
+    return _limit_error(getattr(file, "mimetype", "") or "", storage.file_size_bytes(file))
+
+
+def _limit_error(mimetype: str, size_b: int) -> str | None:
+    if mimetype.startswith("video/"):
+        if size_b > LIMIT_VIDEO:
+            return "Video exceeds 2GB limit"
+    elif mimetype.startswith("audio/"):
+        if size_b > LIMIT_AUDIO:
+            return "Audio exceeds 50MB limit"
+    else:
+        if size_b > LIMIT_FILE:
+            return "File exceeds 100MB limit"
+    return None
+
+
+def _access_code_taken(code: str) -> bool:
+    # Codes of async uploads still in flight are reserved too
+    return storage.access_code_exists(code) or upload_jobs.code_reserved(code)
+
+
+def _owner_code_taken(owner_code: str) -> bool:
+    return storage.owner_code_exists(owner_code) or upload_jobs.owner_code_reserved(owner_code)
+
+
+def _allocate_codes() -> tuple[str, str]:
+    # Collisions are checked against the store's indexes directly; the code length
+    # grows before the keyspace fills up enough to cause retries
+    live = storage.session_count()
+    length = choose_code_length(live)
+    if length > 6:
+        log.info("codegen.length_grown", length=length, occupancy_6=round(keyspace_occupancy(live, 6), 6))
+    code = generate_access_code(length=length, is_taken=_access_code_taken)
+    owner_code = generate_owner_code(is_taken=_owner_code_taken)
+    return code, owner_code
 
 
 @upload_bp.route("/upload", methods=["POST"])
 def upload():
     # Lazy cleanup of expired files/entries
     storage.delete_expired_files(is_expired)
-    try:
-        print(f"[DEBUG] Upload Content-Length: {request.content_length}")
-    except Exception:
-        pass
+    log.debug("upload.start", content_length=request.content_length)
 
     # Collect inputs: support single or multiple files
     files_multi = []
@@ -37,22 +91,25 @@ def upload():
     # Directory heuristic remains but we now always create one session
     is_directory = any(("/" in f.filename) or ("\\" in f.filename) for f in files_multi)
 
-    # Size limits (bytes)
-    GB = 1024 * 1024 * 1024
-    MB = 1024 * 1024
-    LIMIT_DIR = 2 * GB
-    LIMIT_VIDEO = 2 * GB
-    LIMIT_AUDIO = 50 * MB
-    LIMIT_FILE = 100 * MB
-
-    existing = storage.list_access_codes()
-    code = generate_access_code(existing_codes=existing)
-    owner_code = generate_owner_code(existing_codes=set())
+    code, owner_code = _allocate_codes()
     expires_at = compute_expiry()
     uploaded_at = time.time()
 
     # Simple upload_id generator (timestamp + random)
-    upload_id = f"upl_{int(uploaded_at)}_{''.join(random.choice(ALPHABET) for _ in range(6))}"
+    upload_id = f"upl_{int(uploaded_at)}_{random_token(6)}"
+
+    # ?async=1: spool, answer 202 now, transfer + commit in the job pool
+    if request.args.get("async") in ("1", "true"):
+        return _upload_async(
+            files_multi,
+            is_directory,
+            upload_id=upload_id,
+            access_code=code,
+            owner_code=owner_code,
+            expires_at=expires_at,
+            uploaded_at=uploaded_at,
+        )
+
     storage.create_session(
         access_code=code,
         owner_code=owner_code,
@@ -73,28 +130,20 @@ def upload():
     for idx, file in enumerate(files_multi):
         mimetype = getattr(file, "mimetype", "") or ""
         size_b = storage.file_size_bytes(file)
-        if mimetype.startswith("video/"):
-            if size_b > LIMIT_VIDEO:
-                return error("Video exceeds 2GB limit", status=400)
-        elif mimetype.startswith("audio/"):
-            if size_b > LIMIT_AUDIO:
-                return error("Audio exceeds 50MB limit", status=400)
-        else:
-            if size_b > LIMIT_FILE:
-                return error("File exceeds 100MB limit", status=400)
+        limit_error = _file_limit_error(file)
+        if limit_error:
+            return error(limit_error, status=400)
 
         try:
             saved = storage.save_file(file)
-            try:
-                print(f"[CLOUDINARY] file uploaded: {saved.get('public_id')} url={saved.get('url')}")
-            except Exception:
-                pass
+            metrics.UPLOAD_BYTES.inc(size_b)
+            log.debug("upload.file_saved", public_id=saved.get("public_id"), url=saved.get("url"))
         except ValueError as ve:
             return error(str(ve), status=400)
         except Exception:
             return error("Failed to save file", status=500)
 
-        file_id = f"f{idx+1}_{''.join(random.choice(ALPHABET) for _ in range(4))}"
+        file_id = f"f{idx+1}_{random_token(4)}"
         storage.add_file_to_session(
             access_code=code,
             file_id=file_id,
@@ -104,6 +153,9 @@ def upload():
             cloudinary_public_id=saved.get("public_id"),
             resource_type=saved.get("resource_type"),
             file_url=saved.get("url"),
+            # Relative path within a directory upload (browsers send it as the filename)
+            path=file.filename,
+            previews=saved.get("previews"),
         )
         uploaded_files.append({
             "file_id": file_id,
@@ -125,3 +177,184 @@ def upload():
         message="Uploaded",
         status=201,
     )
+
+
+def _upload_async(files_multi, is_directory: bool, **job_args):
+    """Validate limits up front (the worker can't answer 400 later), spool and queue."""
+    if is_directory and sum(storage.file_size_bytes(f) for f in files_multi) > LIMIT_DIR:
+        return error("Directory exceeds 2GB limit", status=400)
+    for file in files_multi:
+        limit_error = _file_limit_error(file)
+        if limit_error:
+            return error(limit_error, status=400)
+
+    try:
+        job = upload_jobs.submit(current_app._get_current_object(), files_multi, **job_args)
+    except upload_jobs.QueueFull:
+        resp, status = error("Upload queue is full, try again shortly", status=503)
+        resp.headers["Retry-After"] = str(current_app.config.get("CONCURRENCY_RETRY_AFTER", 5))
+        return resp, status
+    except Exception:
+        return error("Failed to save file", status=500)
+
+    upload_id = job_args["upload_id"]
+    return success(
+        {
+            "upload_id": upload_id,
+            "access_code": job_args["access_code"],
+            "owner_code": job_args["owner_code"],
+            "access_url": generate_access_url(job_args["access_code"]),
+            "expires_in": EXPIRY_HUMAN,
+            "status_url": f"/upload/{upload_id}/status",
+            "files": [
+                {"file_id": f["file_id"], "filename": f["filename"], "size": f["size"], "mime_type": f["mime_type"]}
+                for f in job.files
+            ],
+        },
+        message="Accepted",
+        status=202,
+    )
+
+
+@upload_bp.route("/upload/sign", methods=["POST"])
+def upload_sign():
+    """Body {"files": [{"filename", "size", "mime_type"}]}: signed per-file upload parameters
+    for the storage provider plus the token /upload/commit expects."""
+    body = request.get_json(silent=True) or {}
+    declared = body.get("files")
+    if not isinstance(declared, list) or not declared:
+        return error("No files provided", status=400)
+    if len(declared) > int(current_app.config.get("DIRECT_UPLOAD_MAX_FILES", 100)):
+        return error("Too many files", status=400)
+
+    files = []
+    for f in declared:
+        if not isinstance(f, dict):
+            return error("Invalid file entry", status=400)
+        raw_name = f.get("filename")
+        size_b = f.get("size")
+        mimetype = f.get("mime_type") or ""
+        filename = secure_filename(raw_name) if isinstance(raw_name, str) else ""
+        if not filename or not isinstance(size_b, int) or size_b < 0 or not isinstance(mimetype, str):
+            return error("Invalid file entry", status=400)
+        limit_error = _limit_error(mimetype, size_b)
+        if limit_error:
+            return error(limit_error, status=400)
+        files.append({"filename": filename, "size": size_b, "mime_type": mimetype, "raw_name": raw_name})
+
+    is_directory = any(("/" in f["raw_name"]) or ("\\" in f["raw_name"]) for f in files)
+    if is_directory and sum(f["size"] for f in files) > LIMIT_DIR:
+        return error("Directory exceeds 2GB limit", status=400)
+
+    try:
+        data = direct_upload.issue(files)
+    except NotImplementedError:
+        return error("Direct uploads are not supported by this storage backend", status=501)
+    except RuntimeError as e:
+        log.error("upload.direct.sign_failed", error=str(e))
+        return error("Direct uploads are not configured", status=503)
+    return success(data, message="Signed")
+
+
+@upload_bp.route("/upload/commit", methods=["POST"])
+def upload_commit():
+    """Body {"token", "files": [{"index", <provider upload response>}]}: verify what the
+    client uploaded with /upload/sign parameters and create the session."""
+    storage.delete_expired_files(is_expired)
+    body = request.get_json(silent=True) or {}
+    token = body.get("token")
+    results = body.get("files")
+    if not isinstance(token, str) or not isinstance(results, list) or not results:
+        return error("token and files are required", status=400)
+
+    try:
+        upload_id, records = direct_upload.verify(token, results)
+    except direct_upload.DirectUploadError as e:
+        return error(str(e), status=400)
+    except NotImplementedError:
+        return error("Direct uploads are not supported by this storage backend", status=501)
+    except Exception as e:
+        log.error("upload.direct.verify_failed", error=str(e))
+        return error("Failed to verify upload", status=502)
+    if not direct_upload.claim(upload_id):
+        return error("Upload already committed", status=409)
+
+    code, owner_code = _allocate_codes()
+    storage.create_session(
+        access_code=code,
+        owner_code=owner_code,
+        expires_at=compute_expiry(),
+        uploaded_at=time.time(),
+        upload_id=upload_id,
+    )
+    uploaded_files = []
+    for rec in records:
+        file_id = f"f{rec['index']+1}_{random_token(4)}"
+        storage.add_file_to_session(
+            access_code=code,
+            file_id=file_id,
+            original_name=rec["filename"],
+            size_bytes=rec["size"],
+            mime_type=rec["mime_type"],
+            cloudinary_public_id=rec["public_id"],
+            resource_type=rec["resource_type"],
+            file_url=rec["url"],
+            path=rec["path"],
+            previews=rec["previews"],
+        )
+        uploaded_files.append({
+            "file_id": file_id,
+            "filename": rec["filename"],
+            "size": rec["size"],
+            "mime_type": rec["mime_type"],
+        })
+    log.info("upload.direct.committed", upload_id=upload_id, access_code=code, files=len(uploaded_files))
+
+    return success(
+        {
+            "upload_id": upload_id,
+            "access_code": code,
+            "owner_code": owner_code,
+            "access_url": generate_access_url(code),
+            "expires_in": EXPIRY_HUMAN,
+            "files": uploaded_files,
+        },
+        message="Uploaded",
+        status=201,
+    )
+
+
+@upload_bp.route("/upload/<upload_id>/status", methods=["GET"])
+def upload_status(upload_id: str):
+    """Progress of an async upload. ?stream=1 (or Accept: text/event-stream) pushes
+    a server-sent event on every change until the job is done or failed."""
+    job = upload_jobs.get_job(upload_id)
+    if job is None:
+        return error("Not found", status=404)
+
+    wants_stream = request.args.get("stream") in ("1", "true") or (
+        "text/event-stream" in (request.headers.get("Accept") or "")
+    )
+    if not wants_stream:
+        return success(job.status())
+
+    def events():
+        version = -1
+        while True:
+            current = job.wait_for_change(version, timeout=15)
+            if current == version:
+                # Heartbeat keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            status = job.status()
+            yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+            if status["state"] in upload_jobs.TERMINAL_STATES:
+                return
+            # Coalesce bursts of tiny reads into at most ~4 events per second
+            time.sleep(0.25)
+
+    resp = Response(events(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
@@ -0,0 +1,53 @@
+"""
+Filename: __init__.py
+Purpose: Storage backend registry; resolves the configured backend (STORAGE_BACKEND) for the app.
+"""
+
+import functools
+from flask import current_app
+from .base import StorageBackend
+
+
+def get_backend() -> StorageBackend:
+    """Return the app's storage backend, creating it on first use."""
+    backend = current_app.extensions.get("storage_backend")
+    if backend is None:
+        backend = create_backend(current_app.config)
+        current_app.extensions["storage_backend"] = backend
+    return backend
+
+
+def create_backend(config) -> StorageBackend:
+    name = (config.get("STORAGE_BACKEND") or "cloudinary").lower()
+    if name == "local":
+        from .local import LocalBackend
+
+        return LocalBackend(
+            root=config.get("LOCAL_STORAGE_ROOT") or config["UPLOAD_FOLDER"],
+            folder=config.get("STORAGE_FOLDER", "temp-share"),
+        )
+    if name == "cloudinary":
+        from .cloudinary_backend import CloudinaryBackend
+
+        return CloudinaryBackend(
+            folder=config.get("STORAGE_FOLDER", "temp-share"),
+            derivatives=config.get("PREVIEW_DERIVATIVES"),
+            eager_async=bool(config.get("PREVIEW_EAGER_ASYNC", True)),
+        )
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {name}")
+
+
+def file_source(file_rec: dict, *, chunk_size: int = 256 * 1024, timeout: float = 30.0):
+    """Bind a file record to a zero-arg callable yielding its bytes.
+
+    The callable captures the backend, so it can run outside the app context
+    (background fills, zip prefetch threads).
+    """
+    return functools.partial(
+        get_backend().iter_bytes,
+        file_rec.get("cloudinary_public_id"),
+        file_rec.get("resource_type"),
+        file_url=file_rec.get("file_url"),
+        chunk_size=chunk_size,
+        timeout=timeout,
+    )
@@ -0,0 +1,136 @@
+"""
+Filename: base.py
+Purpose: Interface every storage backend implements (put stream, delete many, delivery URL, archive,
+and optionally signed direct uploads, preview derivatives and a paged listing of stored assets).
+"""
+
+import mimetypes
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from ...utils.log import get_logger
+
+log = get_logger(__name__)
+
+# (public_id, resource_type) pairs, as stored on file records
+Asset = Tuple[str, Optional[str]]
+
+RESOURCE_TYPES = ("image", "video", "raw")
+
+
+def normalize_resource_type(resource_type: Optional[str]) -> str:
+    """Map stored resource types onto image/video/raw (anything else is raw)."""
+    rt = (resource_type or "raw").lower()
+    return rt if rt in RESOURCE_TYPES else "raw"
+
+
+def guess_resource_type(filename: str) -> str:
+    mime = mimetypes.guess_type(filename)[0] or ""
+    if mime.startswith("image/"):
+        return "image"
+    if mime.startswith("video/") or mime.startswith("audio/"):
+        return "video"
+    return "raw"
+
+
+class StorageBackend:
+    """Base class; subclasses implement the storage-specific operations."""
+
+    name = "base"
+
+    def put_stream(
+        self,
+        source: Union[BinaryIO, str],
+        filename: str,
+        *,
+        resource_type: str = "auto",
+        public_id: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """Store a stream (or local path) and return {"url", "public_id", "resource_type"},
+        plus "previews" ({size name: URL}) when the backend makes preview derivatives."""
+        raise NotImplementedError
+
+    def delete(self, public_id: str, resource_type: Optional[str] = None) -> None:
+        """Delete one asset; raises on failure, treats "not found" as success."""
+        raise NotImplementedError
+
+    def delete_many(self, assets: Iterable[Asset]) -> int:
+        """Delete many assets, returning how many were handled. Default: one by one."""
+        count = 0
+        for public_id, resource_type in assets:
+            if not public_id:
+                continue
+            try:
+                self.delete(public_id, resource_type)
+                count += 1
+            except Exception as e:
+                log.warning("storage.delete.failed", public_id=public_id, error=str(e))
+        return count
+
+    def delivery_url(
+        self,
+        public_id: Optional[str],
+        resource_type: Optional[str],
+        *,
+        file_url: Optional[str] = None,
+        attachment_name: Optional[str] = None,
+    ) -> Optional[str]:
+        """URL the client should be sent to; attachment_name forces a download."""
+        raise NotImplementedError
+
+    def archive(self, members: Iterable[Tuple[Asset, str]]) -> Optional[str]:
+        """Bundle (asset, member name) pairs into a zip and return a URL to it. Names are
+        unique already; backends that can't name members may ignore them."""
+        raise NotImplementedError
+
+    def iter_bytes(
+        self,
+        public_id: Optional[str],
+        resource_type: Optional[str],
+        *,
+        file_url: Optional[str] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+        chunk_size: int = 256 * 1024,
+        timeout: float = 30.0,
+    ) -> Iterator[bytes]:
+        """Yield the asset's bytes in [start, end] (end inclusive, None = to EOF)."""
+        raise NotImplementedError
+
+    def sign_upload(self, name: str, filename: Optional[str] = None) -> Dict[str, object]:
+        """Signed parameters letting a client upload one file straight to the provider.
+
+        Returns {"url", "fields", "public_id"}: POST the file as "file" plus fields to url;
+        the asset lands at public_id. filename (as declared by the client) picks the preview
+        derivatives to request. Backends without direct uploads raise NotImplementedError.
+        """
+        raise NotImplementedError
+
+    def verify_upload(self, result: dict) -> Dict[str, object]:
+        """Check a provider upload response relayed by a client.
+
+        Returns {"url", "public_id", "resource_type", "bytes", "previews"} built only from
+        verified fields; raises ValueError if the response was not signed by the provider.
+        """
+        raise NotImplementedError
+
+    def asset_bytes(self, public_id: str, resource_type: Optional[str] = None) -> int:
+        """Stored size of an asset as reported by the provider."""
+        raise NotImplementedError
+
+    def preview_urls(
+        self, public_id: Optional[str], resource_type: Optional[str], *, version=None
+    ) -> Dict[str, str]:
+        """Delivery URLs of an asset's preview derivatives by size name ({} = none)."""
+        return {}
+
+    def list_assets(self, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        """One page of the assets stored under the backend's folder, for orphan reconciliation.
+
+        Returns ([{"public_id", "resource_type", "bytes", "created_at"}], cursor of the next
+        page or None at the end of the listing); created_at is a Unix timestamp. Backends
+        that can't list their assets raise NotImplementedError.
+        """
+        raise NotImplementedError
+
+    def local_path(self, public_id: Optional[str]) -> Optional[str]:
+        """Filesystem path when the asset lives on this host, else None."""
+        return None
@@ -0,0 +1,288 @@
+"""
+Filename: cloudinary_backend.py
+Purpose: Cloudinary implementation of the storage backend (uploads, deletes, delivery URLs, archives,
+signed direct uploads, folder listing). Uploads request the preview derivatives as eager transformations.
+The SDK is imported and configured when the backend is first created, not at app startup.
+"""
+
+import calendar
+import mimetypes
+import os
+import time
+import urllib.request
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote as urlquote
+import cloudinary  # type: ignore
+import cloudinary.uploader  # type: ignore
+import cloudinary.utils  # type: ignore
+from .. import metrics
+from ..cloudinary_storage import force_delete_cloud_asset, force_delete_cloud_assets
+from .base import RESOURCE_TYPES, Asset, StorageBackend, guess_resource_type, normalize_resource_type
+
+# resource type -> {size name: (transformation, format or None to keep the original's)}
+Derivatives = Dict[str, Dict[str, Tuple[str, Optional[str]]]]
+
+
+_SDK_ENV = {
+    "cloud_name": "CLOUDINARY_CLOUD_NAME",
+    "api_key": "CLOUDINARY_API_KEY",
+    "api_secret": "CLOUDINARY_API_SECRET",
+}
+
+
+def configure_sdk() -> None:
+    """Fill in SDK settings from the CLOUDINARY_* env vars (the SDK reads CLOUDINARY_URL
+    itself); anything already configured is kept."""
+    cfg = cloudinary.config()
+    updates = {key: os.getenv(var) for key, var in _SDK_ENV.items() if os.getenv(var) and not getattr(cfg, key, None)}
+    if getattr(cfg, "secure", None) is None:
+        updates["secure"] = True
+    if updates:
+        cloudinary.config(**updates)
+
+
+class CloudinaryBackend(StorageBackend):
+    name = "cloudinary"
+
+    def __init__(self, folder: str = "temp-share", derivatives: Optional[Derivatives] = None, eager_async: bool = True):
+        self.folder = folder
+        self.derivatives = derivatives or {}
+        self.eager_async = eager_async
+        configure_sdk()
+
+    def _cloud_name(self) -> str:
+        cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME") or cloudinary.config().cloud_name
+        if not cloud_name:
+            raise RuntimeError("Server misconfigured: CLOUDINARY_CLOUD_NAME missing")
+        return cloud_name
+
+    def put_stream(
+        self,
+        source: Union[BinaryIO, str],
+        filename: str,
+        *,
+        resource_type: str = "auto",
+        public_id: Optional[str] = None,
+    ) -> Dict[str, str]:
+        options = {"resource_type": resource_type, "folder": self.folder, "chunk_size": 6000000}
+        if public_id:
+            options.update(public_id=public_id, use_filename=True, unique_filename=False)
+        options.update(self._eager_options(filename, resource_type))
+        # Chunked upload, supports large videos
+        with metrics.CLOUD_CALL_SECONDS.time(operation="upload"):
+            result = cloudinary.uploader.upload(source, **options)
+        return {
+            "url": result.get("secure_url"),
+            "public_id": result.get("public_id"),
+            "resource_type": result.get("resource_type"),
+            "previews": self._previews_for(result),
+        }
+
+    def _eager(self, filename: Optional[str], resource_type: str = "auto") -> List[dict]:
+        """Eager transformations for a file about to be uploaded (guessed from its name)."""
+        rt = resource_type if resource_type != "auto" else guess_resource_type(filename or "")
+        if (mimetypes.guess_type(filename or "")[0] or "").startswith("audio/"):
+            # Audio uploads are "video" assets without frames to render
+            return []
+        eager = []
+        for transformation, fmt in (self.derivatives.get(rt) or {}).values():
+            item = {"raw_transformation": transformation}
+            if fmt:
+                item["format"] = fmt
+            eager.append(item)
+        return eager
+
+    def _eager_options(self, filename: Optional[str], resource_type: str = "auto") -> dict:
+        eager = self._eager(filename, resource_type)
+        if not eager:
+            return {}
+        # Async: the upload returns before derivatives are rendered; one requested
+        # before then is rendered on the fly at delivery
+        return {"eager": eager, "eager_async": self.eager_async}
+
+    def _previews_for(self, result: dict) -> Dict[str, str]:
+        if result.get("is_audio"):
+            return {}
+        return self.preview_urls(result.get("public_id"), result.get("resource_type"), version=result.get("version"))
+
+    def preview_urls(
+        self, public_id: Optional[str], resource_type: Optional[str], *, version=None
+    ) -> Dict[str, str]:
+        rt = normalize_resource_type(resource_type)
+        if not public_id or rt not in self.derivatives:
+            return {}
+        urls = {}
+        for size, (transformation, fmt) in self.derivatives[rt].items():
+            options = {"resource_type": rt, "raw_transformation": transformation}
+            if fmt:
+                options["format"] = fmt
+            if version:
+                options["version"] = version
+            urls[size], _options = cloudinary.utils.cloudinary_url(public_id, **options)
+        return urls
+
+    def sign_upload(self, name: str, filename: Optional[str] = None) -> Dict[str, object]:
+        cfg = cloudinary.config()
+        if not (cfg.api_key and cfg.api_secret):
+            raise RuntimeError("Server misconfigured: Cloudinary API credentials missing")
+        fields = {"folder": self.folder, "public_id": name, "timestamp": int(time.time())}
+        eager = self._eager_options(filename)
+        if eager:
+            # Signed like every other field, so clients can't swap in their own transformations
+            fields["eager"] = cloudinary.utils.build_eager(eager["eager"])
+            fields["eager_async"] = "true" if eager["eager_async"] else "false"
+        fields["signature"] = cloudinary.utils.api_sign_request(fields, cfg.api_secret)
+        fields["api_key"] = cfg.api_key
+        return {
+            "url": cloudinary.utils.cloudinary_api_url("upload", resource_type="auto"),
+            "fields": fields,
+            "public_id": f"{self.folder}/{name}",
+        }
+
+    def verify_upload(self, result: dict) -> Dict[str, object]:
+        public_id = result.get("public_id")
+        version = result.get("version")
+        signature = result.get("signature")
+        if not (isinstance(public_id, str) and version and isinstance(signature, str)):
+            raise ValueError("Incomplete upload result")
+        # Cloudinary signs public_id + version with the API secret
+        if not cloudinary.utils.verify_api_response_signature(public_id, version, signature):
+            raise ValueError("Invalid upload signature")
+        rt = normalize_resource_type(result.get("resource_type"))
+        # secure_url is not covered by the signature; build the delivery URL ourselves
+        url, _options = cloudinary.utils.cloudinary_url(public_id, resource_type=rt, version=version)
+        return {
+            "url": url,
+            "public_id": public_id,
+            "resource_type": rt,
+            "bytes": int(result.get("bytes") or 0),
+            "previews": {} if result.get("is_audio") else self.preview_urls(public_id, rt, version=version),
+        }
+
+    def asset_bytes(self, public_id: str, resource_type: Optional[str] = None) -> int:
+        import cloudinary.api  # type: ignore
+
+        with metrics.CLOUD_CALL_SECONDS.time(operation="resource"):
+            info = cloudinary.api.resource(public_id, resource_type=normalize_resource_type(resource_type))
+        return int(info.get("bytes") or 0)
+
+    def list_assets(self, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        """Admin API resources listing under the folder, one resource type after the other;
+        the cursor is "<resource_type>:<Cloudinary next_cursor>"."""
+        import cloudinary.api  # type: ignore
+
+        rt, _, page_cursor = (cursor or f"{RESOURCE_TYPES[0]}:").partition(":")
+        if rt not in RESOURCE_TYPES:
+            raise ValueError(f"Invalid listing cursor: {cursor}")
+        options = {"resource_type": rt, "type": "upload", "prefix": f"{self.folder}/", "max_results": min(int(limit), 500)}
+        if page_cursor:
+            options["next_cursor"] = page_cursor
+        with metrics.CLOUD_CALL_SECONDS.time(operation="resources"):
+            result = cloudinary.api.resources(**options)
+        assets = []
+        for r in result.get("resources") or []:
+            try:
+                created_at = calendar.timegm(time.strptime(r.get("created_at") or "", "%Y-%m-%dT%H:%M:%SZ"))
+            except ValueError:
+                # Unknown age: never old enough to be deleted as an orphan
+                created_at = time.time()
+            assets.append({
+                "public_id": r["public_id"],
+                "resource_type": rt,
+                "bytes": int(r.get("bytes") or 0),
+                "created_at": float(created_at),
+            })
+        if result.get("next_cursor"):
+            return assets, f"{rt}:{result['next_cursor']}"
+        following = RESOURCE_TYPES.index(rt) + 1
+        return assets, f"{RESOURCE_TYPES[following]}:" if following < len(RESOURCE_TYPES) else None
+
+    def delete(self, public_id: str, resource_type: Optional[str] = None) -> None:
+        force_delete_cloud_asset(public_id, resource_type)
+
+    def delete_many(self, assets: Iterable[Asset]) -> int:
+        return force_delete_cloud_assets(assets)
+
+    def delivery_url(
+        self,
+        public_id: Optional[str],
+        resource_type: Optional[str],
+        *,
+        file_url: Optional[str] = None,
+        attachment_name: Optional[str] = None,
+    ) -> Optional[str]:
+        rt = (resource_type or "").lower()
+        if not attachment_name:
+            # Inline delivery: the stored URL without any download flags
+            if file_url:
+                return file_url.split("?")[0]
+            if public_id and rt in ("image", "video", "raw"):
+                return f"https://res.cloudinary.com/{self._cloud_name()}/{rt}/upload/{public_id}"
+            return None
+        if public_id and rt in ("image", "video", "raw"):
+            # fl_attachment forces Content-Disposition on Cloudinary's side
+            return (
+                f"https://res.cloudinary.com/{self._cloud_name()}/{rt}/upload/"
+                f"fl_attachment:{urlquote(attachment_name)}/{public_id}"
+            )
+        # Fallback: without a public_id, attempt query param flags on the stored URL
+        if not file_url:
+            return None
+        sep = "&" if "?" in file_url else "?"
+        return f"{file_url}{sep}dl=1&attachment=true&filename={urlquote(attachment_name)}"
+
+    def archive(self, members: Iterable[Tuple[Asset, str]]) -> Optional[str]:
+        # Mixed resource types are addressed as "<type>/upload/<public_id>" with resource_type=auto;
+        # generate_archive names members after their public_ids, so the names are unused
+        qualified = [f"{normalize_resource_type(rt)}/upload/{pid}" for (pid, rt), _name in members if pid]
+        if not qualified:
+            return None
+        # Download mode: a signed generate_archive URL; Cloudinary builds the zip when it is fetched
+        with metrics.CLOUD_CALL_SECONDS.time(operation="generate_archive"):
+            return cloudinary.utils.download_zip_url(
+                fully_qualified_public_ids=qualified,
+                resource_type="auto",
+                flatten_folders=True,
+                allow_missing=True,
+            )
+
+    def iter_bytes(
+        self,
+        public_id: Optional[str],
+        resource_type: Optional[str],
+        *,
+        file_url: Optional[str] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+        chunk_size: int = 256 * 1024,
+        timeout: float = 30.0,
+    ) -> Iterator[bytes]:
+        url = file_url or self.delivery_url(public_id, resource_type)
+        if not url:
+            raise FileNotFoundError(public_id or "asset")
+        req = urllib.request.Request(url)
+        if start or end is not None:
+            req.add_header("Range", f"bytes={int(start)}-{'' if end is None else int(end)}")
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            # A CDN that ignores Range answers 200 with the full body; skip to start
+            skip = int(start) if (start and resp.status == 200) else 0
+            remaining = None if end is None else int(end) - int(start) + 1
+            expected = resp.headers.get("Content-Length")
+            received = 0
+            while remaining is None or remaining > 0:
+                chunk = resp.read(chunk_size)
+                if not chunk:
+                    # read(n) returns short instead of raising when the host drops the connection
+                    if expected is not None and received < int(expected):
+                        raise IOError(f"Asset body ended after {received} of {expected} bytes")
+                    break
+                received += len(chunk)
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk[skip:], 0
+                if remaining is not None:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                yield chunk
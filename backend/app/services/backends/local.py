@@ -0,0 +1,164 @@
+"""
+Filename: local.py
+Purpose: Local-filesystem storage backend for self-hosting, tests and benchmarks.
+Assets live under <root>/files/<public_id> and are served by the /files route with send_file.
+"""
+
+import os
+import secrets
+import shutil
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote as urlquote
+from werkzeug.utils import secure_filename
+from .base import Asset, StorageBackend, guess_resource_type
+
+# Generated archives older than this are pruned when a new one is built
+_ARCHIVE_TTL_SECONDS = 60 * 60
+
+
+class LocalBackend(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: str, folder: str = "temp-share"):
+        self.files_root = os.path.join(root, "files")
+        self.folder = folder
+        os.makedirs(os.path.join(self.files_root, folder), exist_ok=True)
+
+    def local_path(self, public_id: Optional[str]) -> Optional[str]:
+        if not public_id:
+            return None
+        path = os.path.realpath(os.path.join(self.files_root, public_id))
+        root = os.path.realpath(self.files_root)
+        # Reject anything escaping the files root (e.g. "../metadata.json")
+        if not path.startswith(root + os.sep):
+            return None
+        return path
+
+    def put_stream(
+        self,
+        source: Union[BinaryIO, str],
+        filename: str,
+        *,
+        resource_type: str = "auto",
+        public_id: Optional[str] = None,
+    ) -> Dict[str, str]:
+        name = secure_filename(filename) or "file"
+        _stem, ext = os.path.splitext(name)
+        token = secure_filename(public_id) if public_id else secrets.token_hex(10)
+        pid = f"{self.folder}/{token}{ext.lower()}"
+        dest = os.path.join(self.files_root, pid)
+        tmp = f"{dest}.part"
+        if isinstance(source, str):
+            shutil.copyfile(source, tmp)
+        else:
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(source, out, 1024 * 1024)
+        os.replace(tmp, dest)
+        rt = guess_resource_type(name) if resource_type == "auto" else resource_type
+        return {"url": f"/files/{pid}", "public_id": pid, "resource_type": rt}
+
+    def delete(self, public_id: str, resource_type: Optional[str] = None) -> None:
+        path = self.local_path(public_id)
+        if path is None:
+            raise RuntimeError(f"Invalid public_id: {public_id}")
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def list_assets(self, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[dict], Optional[str]]:
+        """Files under the folder in name order; the cursor is the last public_id returned."""
+        folder = os.path.join(self.files_root, self.folder)
+        names = sorted(n for n in os.listdir(folder) if not n.endswith(".part"))
+        page = []
+        for name in names:
+            pid = f"{self.folder}/{name}"
+            if cursor and pid <= cursor:
+                continue
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except OSError:
+                continue
+            page.append({
+                "public_id": pid,
+                "resource_type": guess_resource_type(name),
+                "bytes": st.st_size,
+                "created_at": st.st_mtime,
+            })
+            if len(page) >= limit:
+                break
+        more = bool(page) and page[-1]["public_id"] != f"{self.folder}/{names[-1]}"
+        return page, page[-1]["public_id"] if more else None
+
+    def delivery_url(
+        self,
+        public_id: Optional[str],
+        resource_type: Optional[str],
+        *,
+        file_url: Optional[str] = None,
+        attachment_name: Optional[str] = None,
+    ) -> Optional[str]:
+        if not public_id:
+            return file_url
+        url = f"/files/{public_id}"
+        if attachment_name:
+            url = f"{url}?attachment={urlquote(attachment_name)}"
+        return url
+
+    def archive(self, members: Iterable[Tuple[Asset, str]]) -> Optional[str]:
+        archive_dir = os.path.join(self.files_root, "archives")
+        os.makedirs(archive_dir, exist_ok=True)
+        self._prune_archives(archive_dir)
+
+        found = []
+        for (pid, _rt), name in members:
+            path = self.local_path(pid)
+            if path and os.path.exists(path):
+                found.append((path, name))
+        if not found:
+            return None
+        pid = f"archives/{secrets.token_hex(10)}.zip"
+        dest = os.path.join(self.files_root, pid)
+        with zipfile.ZipFile(f"{dest}.part", mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for path, name in found:
+                # Stored under the uploaded name, not the storage token
+                zf.write(path, arcname=name)
+        os.replace(f"{dest}.part", dest)
+        return f"/files/{pid}"
+
+    def _prune_archives(self, archive_dir: str) -> None:
+        cutoff = time.time() - _ARCHIVE_TTL_SECONDS
+        for name in os.listdir(archive_dir):
+            path = os.path.join(archive_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def iter_bytes(
+        self,
+        public_id: Optional[str],
+        resource_type: Optional[str],
+        *,
+        file_url: Optional[str] = None,
+        start: int = 0,
+        end: Optional[int] = None,
+        chunk_size: int = 256 * 1024,
+        timeout: float = 30.0,
+    ) -> Iterator[bytes]:
+        path = self.local_path(public_id)
+        if path is None:
+            raise FileNotFoundError(public_id or "asset")
+        with open(path, "rb") as f:
+            f.seek(int(start))
+            remaining = None if end is None else int(end) - int(start) + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
@@ -1,9 +1,18 @@
 """
-Authoritative Cloudinary delete handler.
-This MUST be called for every delete (expiry or owner).
+Authoritative Cloudinary delete handler, used for every delete (expiry, owner, orphans).
+Session deletes go through force_delete_cloud_assets: Admin API delete_resources, up to 100
+ids per call, whose hourly quota is shared with orphan reconciliation's listing calls. When
+that quota is exhausted, the remaining assets fall back to per-asset destroy (Upload API,
+not rate-limited the same way) instead of being left behind as orphans.
 """
 
+import cloudinary.api  # type: ignore
+import cloudinary.exceptions  # type: ignore
 import cloudinary.uploader  # type: ignore
+from ..utils.log import get_logger
+from . import metrics
+
+log = get_logger(__name__)
 
 
 def force_delete_cloud_asset(public_id: str, resource_type: str | None = None) -> None:
@@ -16,11 +25,12 @@ def force_delete_cloud_asset(public_id: str, resource_type: str | None = None) -
     if rt not in allowed:
         rt = "raw"
 
-    result = cloudinary.uploader.destroy(
-        public_id,
-        resource_type=rt,
-        invalidate=True,
-    )
+    with metrics.CLOUD_CALL_SECONDS.time(operation="destroy"):
+        result = cloudinary.uploader.destroy(
+            public_id,
+            resource_type=rt,
+            invalidate=True,
+        )
 
     # Treat 'ok' and 'not found' as successful/idempotent outcomes
     if not isinstance(result, dict):
@@ -29,4 +39,58 @@ def force_delete_cloud_asset(public_id: str, resource_type: str | None = None) -
     if outcome not in {"ok", "not found"}:
         raise RuntimeError(f"Cloudinary deletion failed: {result}")
 
-    print("[CLOUDINARY][FORCED DELETE]", "OK" if outcome == "ok" else "NOT FOUND (treated ok)", public_id)
+    log.debug("cloudinary.delete", public_id=public_id, outcome=outcome)
+
+
+def force_delete_cloud_assets(assets) -> int:
+    """Bulk variant: delete (public_id, resource_type) pairs via delete_resources.
+
+    Groups by resource type and sends up to 100 ids per Admin API call instead of one
+    destroy per asset; once the Admin API is rate-limited the rest go through destroy.
+    Returns the number of ids Cloudinary reported deleted or missing.
+    """
+    by_type: dict[str, list[str]] = {}
+    for public_id, resource_type in assets:
+        if not public_id:
+            continue
+        rt = (resource_type or "raw").lower()
+        if rt not in {"image", "video", "raw"}:
+            rt = "raw"
+        by_type.setdefault(rt, []).append(public_id)
+
+    handled = 0
+    rate_limited = False
+    for rt, ids in by_type.items():
+        for i in range(0, len(ids), 100):
+            batch = ids[i:i + 100]
+            if not rate_limited:
+                try:
+                    with metrics.CLOUD_CALL_SECONDS.time(operation="delete_resources"):
+                        result = cloudinary.api.delete_resources(batch, resource_type=rt, invalidate=True)
+                except cloudinary.exceptions.RateLimited as e:
+                    log.warning("cloudinary.delete.rate_limited", error=str(e))
+                    rate_limited = True
+            if rate_limited:
+                handled += _destroy_each(batch, rt)
+                continue
+            deleted = (result or {}).get("deleted") or {}
+            for public_id in batch:
+                outcome = (deleted.get(public_id) or "").lower()
+                if outcome in {"deleted", "not_found"}:
+                    handled += 1
+                else:
+                    log.warning("cloudinary.delete.failed", public_id=public_id, outcome=outcome or None)
+            log.debug("cloudinary.delete.bulk", resource_type=rt, count=len(batch))
+    return handled
+
+
+def _destroy_each(ids: list[str], resource_type: str) -> int:
+    """One destroy per id (the bulk call is rate-limited); returns how many succeeded."""
+    handled = 0
+    for public_id in ids:
+        try:
+            force_delete_cloud_asset(public_id, resource_type)
+            handled += 1
+        except Exception as e:
+            log.warning("cloudinary.delete.failed", public_id=public_id, error=str(e))
+    return handled
@@ -0,0 +1,81 @@
+"""
+Filename: codefilter.py
+Purpose: Counting Bloom filter over live access/owner codes. A "no" is definite, so guessed
+codes are rejected without touching the store; a "maybe" falls through to the real lookup.
+Counters (instead of bits) allow removal when sessions are deleted. Hashing is blake2b, so
+the filter's contents are stable across processes and can be snapshotted to disk.
+"""
+
+import hashlib
+import math
+import struct
+from typing import Iterable
+
+_COUNTER_MAX = 255
+# magic, capacity, fp_rate, hashes, size, count
+_HEADER = struct.Struct("<4sQdIQQ")
+_MAGIC = b"CBF1"
+
+
+class CountingBloomFilter:
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        self.capacity = max(1, int(capacity))
+        self.fp_rate = min(0.5, max(1e-6, float(fp_rate)))
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(self.fp_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.count = 0
+        self._counters = bytearray(self.size)
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for idx in self._indexes(key):
+            if self._counters[idx] < _COUNTER_MAX:
+                self._counters[idx] += 1
+        self.count += 1
+
+    def remove(self, key: str) -> None:
+        """Remove a key that was added; saturated counters are left alone (they may be shared)."""
+        indexes = self._indexes(key)
+        if not all(self._counters[idx] for idx in indexes):
+            return
+        for idx in indexes:
+            if self._counters[idx] < _COUNTER_MAX:
+                self._counters[idx] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._counters[idx] for idx in self._indexes(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(_MAGIC, self.capacity, self.fp_rate, self.hashes, self.size, self.count)
+        return header + bytes(self._counters)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CountingBloomFilter":
+        """Inverse of to_bytes; raises ValueError on a truncated or foreign snapshot."""
+        if len(data) < _HEADER.size:
+            raise ValueError("Truncated filter snapshot")
+        magic, capacity, fp_rate, hashes, size, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC or len(data) != _HEADER.size + size:
+            raise ValueError("Invalid filter snapshot")
+        bf = cls.__new__(cls)
+        bf.capacity, bf.fp_rate, bf.hashes, bf.size, bf.count = capacity, fp_rate, hashes, size, count
+        bf._counters = bytearray(data[_HEADER.size:])
+        return bf
+
+    @classmethod
+    def build(cls, keys: Iterable[str], capacity: int, fp_rate: float = 0.01) -> "CountingBloomFilter":
+        keys = list(keys)
+        bf = cls(max(capacity, len(keys) * 2), fp_rate)
+        for key in keys:
+            bf.add(key)
+        return bf
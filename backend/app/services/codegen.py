@@ -1,31 +1,73 @@
 """
 Filename: codegen.py
-Purpose: Generate short access codes using simple random characters (no hashing or heavy logic).
+Purpose: Generate short access codes and owner codes with a CSPRNG (secrets), checking
+collisions against the live store and reporting keyspace occupancy.
 """
 
-import random
+import secrets
 import string
+from typing import Callable, Container, Optional
 
 ALPHABET = string.ascii_uppercase + string.digits
 
+# Access codes are 6-8 characters (validators accept that range)
+MIN_ACCESS_LENGTH = 6
+MAX_ACCESS_LENGTH = 8
+OWNER_CODE_LENGTH = 12
 
-def generate_access_code(existing_codes: set[str] | None = None, length: int = 6) -> str:
+# Grow access codes once this fraction of the keyspace is live; at 1% a fresh
+# code needs ~1.01 attempts on average, so collisions never turn into retry storms
+MAX_OCCUPANCY = 0.01
+
+
+def random_token(length: int) -> str:
+    return "".join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+def keyspace_size(length: int) -> int:
+    return len(ALPHABET) ** length
+
+
+def keyspace_occupancy(used: int, length: int) -> float:
+    """Fraction of the code space of the given length that is taken."""
+    return used / keyspace_size(length)
+
+
+def choose_code_length(used: int, max_occupancy: float = MAX_OCCUPANCY) -> int:
+    """Shortest access code length that keeps occupancy under max_occupancy."""
+    for length in range(MIN_ACCESS_LENGTH, MAX_ACCESS_LENGTH + 1):
+        if keyspace_occupancy(used + 1, length) <= max_occupancy:
+            return length
+    return MAX_ACCESS_LENGTH
+
+
+def _allocate(length: int, is_taken: Callable[[str], bool], attempts: int) -> str:
+    for _ in range(attempts):
+        code = random_token(length)
+        if not is_taken(code):
+            return code
+    raise RuntimeError(f"Could not allocate a free {length}-character code after {attempts} attempts")
+
+
+def generate_access_code(
+    existing_codes: Optional[Container[str]] = None,
+    length: int = 6,
+    is_taken: Optional[Callable[[str], bool]] = None,
+    attempts: int = 100,
+) -> str:
     """Generate a short, URL-safe access code avoiding collisions.
 
-    - Uses uppercase letters and digits
+    - Uses uppercase letters and digits, drawn from `secrets`
     - Length is 6 by default (allowed 6-8)
-    - Retries on collision within a reasonable number of attempts
+    - Collisions are checked with `is_taken` (e.g. a store index lookup) or,
+      for callers that already hold one, membership in `existing_codes`
     """
-    if length < 6 or length > 8:
-        length = 6
-    existing_codes = existing_codes or set()
-
-    for _ in range(100):
-        code = "".join(random.choice(ALPHABET) for _ in range(length))
-        if code not in existing_codes:
-            return code
-    # Fallback (very unlikely to happen)
-    return "".join(random.choice(ALPHABET) for _ in range(length))
+    if length < MIN_ACCESS_LENGTH or length > MAX_ACCESS_LENGTH:
+        length = MIN_ACCESS_LENGTH
+    if is_taken is None:
+        existing = existing_codes if existing_codes is not None else ()
+        is_taken = existing.__contains__
+    return _allocate(length, is_taken, attempts)
 
 
 def generate_access_url(code: str, base_url: str | None = None) -> str:
@@ -39,6 +81,14 @@ def generate_access_url(code: str, base_url: str | None = None) -> str:
     return f"{base_url.rstrip('/')}{path}"
 
 
-def generate_owner_code(existing_codes: set[str] | None = None, length: int = 12) -> str:
+def generate_owner_code(
+    existing_codes: Optional[Container[str]] = None,
+    length: int = OWNER_CODE_LENGTH,
+    is_taken: Optional[Callable[[str], bool]] = None,
+    attempts: int = 100,
+) -> str:
     """Generate an owner (management) code, longer by default, avoiding collisions."""
-    return generate_access_code(existing_codes=existing_codes, length=length)
+    if is_taken is None:
+        existing = existing_codes if existing_codes is not None else ()
+        is_taken = existing.__contains__
+    return _allocate(max(MIN_ACCESS_LENGTH, int(length)), is_taken, attempts)
@@ -0,0 +1,68 @@
+"""
+Filename: compression.py
+Purpose: Response compression for JSON listing endpoints (COMPRESS_ENDPOINTS), negotiated
+through Accept-Encoding. Brotli is preferred when the optional "brotli" package is installed,
+gzip otherwise; small, streamed or already-encoded responses pass through untouched.
+"""
+
+import gzip
+from flask import request
+from . import metrics
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class _State:
+    endpoints: frozenset = frozenset()
+    min_bytes = 1024
+    gzip_level = 6
+    brotli_quality = 5
+
+
+_state = _State()
+
+
+def available_encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(response):
+    """Encode response's body in place for the client's best accepted encoding."""
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < _state.min_bytes:
+        return response
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding == "br":
+        body = brotli.compress(data, quality=_state.brotli_quality)
+    elif encoding == "gzip":
+        body = gzip.compress(data, compresslevel=_state.gzip_level)
+    else:
+        return response
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    metrics.RESPONSE_COMPRESSED_BYTES.inc(len(data), encoding=encoding, stage="in")
+    metrics.RESPONSE_COMPRESSED_BYTES.inc(len(body), encoding=encoding, stage="out")
+    return response
+
+
+def _after_request(response):
+    if request.endpoint in _state.endpoints:
+        return compress(response)
+    return response
+
+
+def init_app(app) -> None:
+    cfg = app.config
+    _state.endpoints = frozenset(cfg.get("COMPRESS_ENDPOINTS", ()))
+    _state.min_bytes = int(cfg.get("COMPRESS_MIN_BYTES", 1024))
+    _state.gzip_level = int(cfg.get("COMPRESS_GZIP_LEVEL", 6))
+    _state.brotli_quality = int(cfg.get("COMPRESS_BROTLI_QUALITY", 5))
+    app.after_request(_after_request)
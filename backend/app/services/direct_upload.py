@@ -0,0 +1,135 @@
+"""
+Filename: direct_upload.py
+Purpose: Signed direct-to-storage uploads. POST /upload/sign hands out, per file, upload
+parameters signed for a public_id chosen here, plus one token (itsdangerous, SECRET_KEY) that
+lists them. The client sends the bytes straight to the storage provider and posts the
+provider's responses to POST /upload/commit; each response must be signed by the provider and
+name the public_id from the token before the session is created. Workers only see metadata.
+"""
+
+import os
+import secrets
+import time
+from typing import List, Tuple
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from .backends import get_backend
+from .codegen import random_token
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+_SALT = "direct-upload"
+_last_prune = 0.0
+
+
+class DirectUploadError(ValueError):
+    """A sign/commit request was rejected; the message is safe to return to the client."""
+
+
+def _ttl() -> int:
+    return int(current_app.config.get("DIRECT_UPLOAD_TTL", 15 * 60))
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    key = current_app.config.get("SECRET_KEY")
+    if not key:
+        raise RuntimeError("Server misconfigured: SECRET_KEY missing")
+    return URLSafeTimedSerializer(key, salt=_SALT)
+
+
+def issue(files: List[dict]) -> dict:
+    """Sign an upload of files ([{"filename", "size", "mime_type", "raw_name"}], already
+    policy-checked; raw_name is the name as sent, keeping a directory upload's relative path).
+
+    Raises NotImplementedError when the storage backend has no direct uploads.
+    """
+    backend = get_backend()
+    upload_id = f"upl_{int(time.time())}_{random_token(6)}"
+    entries = []
+    out = []
+    for idx, f in enumerate(files):
+        signed = backend.sign_upload(secrets.token_hex(10), f["filename"])
+        entries.append([signed["public_id"], f["filename"], f["size"], f["mime_type"], f["raw_name"]])
+        out.append({
+            "index": idx,
+            "filename": f["filename"],
+            "upload_url": signed["url"],
+            "fields": signed["fields"],
+        })
+    token = _serializer().dumps({"u": upload_id, "f": entries})
+    log.info("upload.direct.signed", upload_id=upload_id, files=len(out))
+    return {"upload_id": upload_id, "token": token, "expires_in": _ttl(), "files": out}
+
+
+def verify(token: str, results: List[dict]) -> Tuple[str, List[dict]]:
+    """Check a commit against its token; returns (upload_id, file records in index order)."""
+    try:
+        payload = _serializer().loads(token, max_age=_ttl())
+    except SignatureExpired:
+        raise DirectUploadError("Upload token expired")
+    except BadSignature:
+        raise DirectUploadError("Invalid upload token")
+
+    entries = payload["f"]
+    backend = get_backend()
+    check_bytes = bool(current_app.config.get("DIRECT_UPLOAD_VERIFY_BYTES", True))
+    records = {}
+    for result in results:
+        idx = result.get("index") if isinstance(result, dict) else None
+        if not isinstance(idx, int) or not 0 <= idx < len(entries) or idx in records:
+            raise DirectUploadError("Invalid file index")
+        public_id, filename, size, mime_type, path = entries[idx]
+        if result.get("public_id") != public_id:
+            raise DirectUploadError(f"File {idx}: unexpected public_id")
+        try:
+            asset = backend.verify_upload(result)
+        except ValueError as e:
+            raise DirectUploadError(f"File {idx}: {e}")
+        stored = int(asset["bytes"])
+        if check_bytes:
+            stored = backend.asset_bytes(public_id, asset["resource_type"])
+            if stored != int(asset["bytes"]):
+                raise DirectUploadError(f"File {idx}: size does not match the stored asset")
+        # The size policy was applied to the declared size at sign time
+        if stored > int(size):
+            raise DirectUploadError(f"File {idx}: larger than declared")
+        records[idx] = {
+            "index": idx,
+            "filename": filename,
+            "path": path,
+            "size": stored,
+            "mime_type": mime_type,
+            "public_id": public_id,
+            "resource_type": asset["resource_type"],
+            "url": asset["url"],
+            "previews": asset.get("previews") or {},
+        }
+    return payload["u"], [records[i] for i in sorted(records)]
+
+
+def claim(upload_id: str) -> bool:
+    """True for the first commit of upload_id; a replayed token gets False.
+
+    The marker is an O_EXCL file under UPLOAD_FOLDER/direct, so every worker on the host
+    agrees. Markers outlive the token's TTL, after which the token itself is refused.
+    """
+    global _last_prune
+    folder = os.path.join(current_app.config["UPLOAD_FOLDER"], "direct")
+    os.makedirs(folder, exist_ok=True)
+    now = time.time()
+    if now - _last_prune > _ttl():
+        _last_prune = now
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            try:
+                if now - os.path.getmtime(path) > 2 * _ttl():
+                    os.remove(path)
+            except OSError:
+                pass
+    try:
+        fd = os.open(os.path.join(folder, upload_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
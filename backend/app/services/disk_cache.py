@@ -0,0 +1,236 @@
+"""
+Filename: disk_cache.py
+Purpose: Optional read-through disk cache for hot assets under UPLOAD_FOLDER/cache.
+Cached files are served with send_file (zero-copy via wsgi.file_wrapper, Range aware);
+misses are filled in the background and evicted LRU once the byte budget is exceeded.
+"""
+
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional
+from flask import current_app, send_file
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+_lock = threading.Lock()
+_index_loaded = False
+# "<access_code>/<file_id>" -> size in bytes, least recently used first
+_index: "OrderedDict[str, int]" = OrderedDict()
+_bytes_used = 0
+# Misses seen per key before a fill is admitted (bounded, oldest dropped first)
+_miss_counts: "OrderedDict[str, int]" = OrderedDict()
+_MISS_TRACK_LIMIT = 4096
+_inflight: set = set()
+# In-flight fills whose session was purged meanwhile; their result is discarded
+_cancelled: set = set()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "bytes_served": 0, "fills": 0, "evictions": 0}
+
+
+def enabled() -> bool:
+    return bool(current_app.config.get("LOCAL_CACHE_ENABLED"))
+
+
+def _cache_dir() -> str:
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], "cache")
+
+
+def _key(access_code: str, file_id: str) -> str:
+    return f"{access_code}/{file_id}"
+
+
+def _ensure_index(cache_dir: str) -> None:
+    """Rebuild the LRU index from whatever survived on disk from a previous run."""
+    global _index_loaded, _bytes_used
+    if _index_loaded:
+        return
+    found = []
+    if os.path.isdir(cache_dir):
+        for code in os.listdir(cache_dir):
+            sess_dir = os.path.join(cache_dir, code)
+            if not os.path.isdir(sess_dir):
+                continue
+            for name in os.listdir(sess_dir):
+                path = os.path.join(sess_dir, name)
+                if name.endswith(".part"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_atime, f"{code}/{name}", st.st_size))
+    for _atime, key, size in sorted(found):
+        _index[key] = size
+        _bytes_used += size
+    _index_loaded = True
+
+
+def _evict_to_budget(cache_dir: str, max_bytes: int, keep: Optional[str] = None) -> None:
+    global _bytes_used
+    while _bytes_used > max_bytes and _index:
+        key = next(iter(_index))
+        if key == keep and len(_index) == 1:
+            break
+        size = _index.pop(key)
+        _bytes_used -= size
+        _stats["evictions"] += 1
+        try:
+            os.remove(os.path.join(cache_dir, key))
+        except OSError:
+            pass
+
+
+def _fill(cache_dir: str, key: str, source: Callable[[], Iterator[bytes]], max_bytes: int) -> None:
+    global _bytes_used
+    path = os.path.join(cache_dir, key)
+    tmp = f"{path}.part"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as out:
+            for chunk in source():
+                out.write(chunk)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with _lock:
+            if key in _cancelled:
+                # The session expired or was deleted while this fill ran
+                _discard(path)
+                return
+            old = _index.pop(key, None)
+            if old is not None:
+                _bytes_used -= old
+            _index[key] = size
+            _bytes_used += size
+            _stats["fills"] += 1
+            _evict_to_budget(cache_dir, max_bytes, keep=key)
+    except Exception as e:
+        log.warning("cache.fill.failed", key=key, error=str(e))
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    finally:
+        with _lock:
+            _inflight.discard(key)
+            _cancelled.discard(key)
+
+
+def _discard(path: str) -> None:
+    """Remove a cancelled fill's file and, if now empty, the session directory it recreated."""
+    try:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def _note_miss(cache_dir: str, key: str, source: Optional[Callable[[], Iterator[bytes]]], size: Optional[int]) -> None:
+    """Count a miss and start a background fill once the key proves hot."""
+    cfg = current_app.config
+    if source is None:
+        return
+    if size is not None and int(size) > int(cfg.get("LOCAL_CACHE_MAX_ENTRY_BYTES", 0) or 0):
+        return
+    with _lock:
+        seen = _miss_counts.pop(key, 0) + 1
+        if seen < int(cfg.get("LOCAL_CACHE_ADMIT_AFTER", 1) or 1):
+            _miss_counts[key] = seen
+            while len(_miss_counts) > _MISS_TRACK_LIMIT:
+                _miss_counts.popitem(last=False)
+            return
+        if key in _inflight:
+            return
+        _inflight.add(key)
+    threading.Thread(
+        target=_fill,
+        args=(cache_dir, key, source, int(cfg.get("LOCAL_CACHE_MAX_BYTES", 0))),
+        name="disk-cache-fill",
+        daemon=True,
+    ).start()
+
+
+def serve(
+    access_code: str,
+    file_id: str,
+    *,
+    source: Optional[Callable[[], Iterator[bytes]]],
+    size: Optional[int],
+    download_name: str,
+    mimetype: Optional[str] = None,
+    as_attachment: bool = False,
+    etag: Optional[str] = None,
+    last_modified: Optional[float] = None,
+):
+    """Return a send_file response for a cached asset, or None on a miss.
+
+    A miss schedules a background fill so the caller can keep redirecting to the CDN.
+    Pass etag/last_modified to have If-Range and conditional checks use the caller's
+    validators instead of ones derived from the cache file.
+    """
+    if not enabled():
+        return None
+    cache_dir = _cache_dir()
+    key = _key(access_code, file_id)
+    with _lock:
+        _ensure_index(cache_dir)
+        hit = key in _index
+        if hit:
+            _index.move_to_end(key)
+            _stats["hits"] += 1
+        else:
+            _stats["misses"] += 1
+
+    if not hit:
+        _note_miss(cache_dir, key, source, size)
+        return None
+
+    try:
+        resp = send_file(
+            os.path.join(cache_dir, key),
+            mimetype=mimetype or None,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag if etag is not None else True,
+            last_modified=last_modified,
+        )
+    except FileNotFoundError:
+        # Evicted between lookup and open; fall back to the CDN
+        return None
+    with _lock:
+        _stats["bytes_served"] += int(resp.content_length or 0)
+    return resp
+
+
+def purge_session(access_code: str) -> None:
+    """Drop every cached file of a session (called when it expires or is deleted)."""
+    global _bytes_used
+    cache_dir = _cache_dir()
+    sess_dir = os.path.join(cache_dir, access_code)
+    prefix = f"{access_code}/"
+    with _lock:
+        for key in [k for k in _index if k.startswith(prefix)]:
+            _bytes_used -= _index.pop(key)
+        for key in [k for k in _miss_counts if k.startswith(prefix)]:
+            del _miss_counts[key]
+        # A fill still running would otherwise re-create the directory and re-index its key
+        _cancelled.update(k for k in _inflight if k.startswith(prefix))
+    if os.path.isdir(sess_dir):
+        shutil.rmtree(sess_dir, ignore_errors=True)
+
+
+def stats() -> Dict[str, float]:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": (_stats["hits"] / lookups) if lookups else 0.0,
+            "entries": len(_index),
+            "bytes_used": _bytes_used,
+        }
@@ -0,0 +1,96 @@
+"""
+Filename: events.py
+Purpose: In-process pub/sub for session changes, feeding the owner dashboard event stream.
+Storage mutations publish per access code; each subscriber (one SSE connection) has a bounded
+queue. A subscriber that falls behind is flagged for a resync instead of blocking publishers,
+and publishing to a session nobody watches costs one dict lookup.
+"""
+
+import queue
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from . import metrics
+
+Event = Tuple[str, dict]
+
+_lock = threading.Lock()
+_subscribers: Dict[str, Set["Subscriber"]] = {}
+_queue_size = 256
+
+
+class Subscriber:
+    def __init__(self, access_code: str, maxsize: int):
+        self.access_code = access_code
+        self.queue: "queue.Queue[Event]" = queue.Queue(maxsize=maxsize)
+        # Set when events were dropped; the stream tells the client to refetch
+        self.overflowed = False
+        # Set at shutdown; the stream ends and the client reconnects elsewhere
+        self.closed = False
+
+    def offer(self, event: Event) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get_batch(self, timeout: float, limit: int = 256) -> List[Event]:
+        """Block up to timeout for one event, then drain whatever else is already queued."""
+        try:
+            batch = [self.queue.get(timeout=max(0.0, timeout))]
+        except queue.Empty:
+            return []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+
+def subscribe(access_code: str) -> Subscriber:
+    sub = Subscriber(access_code, _queue_size)
+    with _lock:
+        _subscribers.setdefault(access_code, set()).add(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscriber) -> None:
+    with _lock:
+        subs = _subscribers.get(sub.access_code)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del _subscribers[sub.access_code]
+
+
+def publish(access_code: str, event: str, data: Optional[dict] = None) -> None:
+    if access_code not in _subscribers:
+        return
+    with _lock:
+        subs = list(_subscribers.get(access_code, ()))
+    for sub in subs:
+        sub.offer((event, data or {}))
+
+
+def close_all() -> int:
+    """End every open stream (worker shutdown) so none holds the drain; returns how many."""
+    with _lock:
+        subs = [sub for group in _subscribers.values() for sub in group]
+    for sub in subs:
+        sub.closed = True
+        # Wakes a stream blocked in get_batch
+        sub.offer(("reconnect", {}))
+    return len(subs)
+
+
+def subscriber_count() -> int:
+    with _lock:
+        return sum(len(s) for s in _subscribers.values())
+
+
+def init_app(app) -> None:
+    global _queue_size
+    _queue_size = max(1, int(app.config.get("EVENTS_QUEUE_SIZE", 256)))
+
+
+metrics.EVENT_SUBSCRIBERS.set_function(subscriber_count)
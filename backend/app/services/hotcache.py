@@ -0,0 +1,171 @@
+"""
+Filename: hotcache.py
+Purpose: Tiny in-process front cache for hot share links. Holds negative results (404/410)
+and positive redirect targets with short TTLs never outliving the session, so viral codes
+skip validation, store lookups and expiry checks. Admission is TinyLFU: a newcomer only
+evicts the LRU victim if a count-min sketch says it is requested more often, so scans over
+cold or random codes cannot flush the hot set.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+from flask import redirect
+from . import metrics
+from ..utils.responses import error
+
+_DEPTH = 4
+_COUNTER_MAX = 15
+
+
+class FrequencySketch:
+    """Count-min sketch with small saturating counters, halved periodically so popularity ages out."""
+
+    def __init__(self, capacity: int):
+        width = 1
+        while width < max(16, capacity * 4):
+            width <<= 1
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(_DEPTH)]
+        self._sample_size = max(64, capacity * 10)
+        self._additions = 0
+
+    def _indexes(self, key: Hashable):
+        return [hash((i, key)) & self._mask for i in range(_DEPTH)]
+
+    def increment(self, key: Hashable) -> None:
+        for row, idx in zip(self._rows, self._indexes(key)):
+            if row[idx] < _COUNTER_MAX:
+                row[idx] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[idx] for row, idx in zip(self._rows, self._indexes(key)))
+
+    def _age(self) -> None:
+        self._rows = [bytearray(c >> 1 for c in row) for row in self._rows]
+        self._additions //= 2
+
+
+class _State:
+    enabled = False
+    capacity = 4096
+    negative_ttl = 10.0
+    redirect_ttl = 60.0
+
+
+_state = _State()
+_lock = threading.Lock()
+# key -> (valid_until, value); key[1] is always the access code
+_entries: "OrderedDict[Tuple, Tuple[float, object]]" = OrderedDict()
+# access code -> keys cached for it, so a session change drops them all
+_by_code: Dict[str, Set[Tuple]] = {}
+_sketch = FrequencySketch(_state.capacity)
+_stats = {"hits": 0, "misses": 0, "admitted": 0, "rejected": 0, "invalidated": 0}
+
+
+def enabled() -> bool:
+    return _state.enabled
+
+
+def get(key: Tuple) -> Optional[object]:
+    """Cached value for key, or None. Every lookup feeds the frequency sketch."""
+    if not _state.enabled:
+        return None
+    now = time.time()
+    value = None
+    with _lock:
+        _sketch.increment(key)
+        entry = _entries.get(key)
+        if entry is not None and entry[0] > now:
+            _entries.move_to_end(key)
+            value = entry[1]
+        elif entry is not None:
+            _drop(key)
+        _stats["hits" if value is not None else "misses"] += 1
+    metrics.HOT_CACHE_LOOKUPS.inc(result="hit" if value is not None else "miss")
+    return value
+
+
+def put(key: Tuple, value: object, ttl: float, expires_at: Optional[float] = None) -> None:
+    """Cache value for ttl seconds, never past the session's expires_at."""
+    if not _state.enabled:
+        return
+    now = time.time()
+    valid_until = now + ttl
+    if expires_at is not None:
+        valid_until = min(valid_until, float(expires_at))
+    if valid_until <= now:
+        return
+    with _lock:
+        if key not in _entries and len(_entries) >= _state.capacity:
+            victim = next(iter(_entries))
+            if _sketch.estimate(key) <= _sketch.estimate(victim):
+                _stats["rejected"] += 1
+                return
+            _drop(victim)
+        _entries[key] = (valid_until, value)
+        _entries.move_to_end(key)
+        _by_code.setdefault(key[1], set()).add(key)
+        _stats["admitted"] += 1
+
+
+def put_negative(key: Tuple, status: int, message: str, expires_at: Optional[float] = None) -> None:
+    put(key, ("error", status, message), _state.negative_ttl, expires_at)
+
+
+def put_redirect(key: Tuple, url: str, expires_at: Optional[float]) -> None:
+    put(key, ("redirect", url), _state.redirect_ttl, expires_at)
+
+
+def response_for(value: object):
+    """Rebuild the response for a cached value."""
+    if value[0] == "redirect":
+        return redirect(value[1])
+    return error(value[2], status=value[1])
+
+
+def _drop(key: Tuple) -> None:
+    _entries.pop(key, None)
+    keys = _by_code.get(key[1])
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _by_code[key[1]]
+
+
+def invalidate(access_code: str) -> None:
+    """Forget everything cached for a code (session created, changed or deleted)."""
+    with _lock:
+        keys = _by_code.pop(access_code, None)
+        if not keys:
+            return
+        for key in keys:
+            _entries.pop(key, None)
+        _stats["invalidated"] += len(keys)
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        _by_code.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return {"enabled": _state.enabled, "entries": len(_entries), "capacity": _state.capacity, **_stats}
+
+
+def init_app(app) -> None:
+    global _sketch
+    cfg = app.config
+    _state.enabled = bool(cfg.get("HOT_CACHE_ENABLED", True))
+    _state.capacity = max(1, int(cfg.get("HOT_CACHE_MAX_ENTRIES", 4096)))
+    _state.negative_ttl = float(cfg.get("HOT_CACHE_NEGATIVE_TTL", 10))
+    _state.redirect_ttl = float(cfg.get("HOT_CACHE_REDIRECT_TTL", 60))
+    with _lock:
+        _sketch = FrequencySketch(_state.capacity)
+    clear()
@@ -0,0 +1,338 @@
+"""
+Filename: metastore.py
+Purpose: Sharded on-disk layout for session metadata (UPLOAD_FOLDER/meta). Sessions are bucketed
+by access code prefix into sessions/<prefix>.json, the owner index by owner code prefix into
+owners/<prefix>.json, and manifest.json keeps per-shard counts and expiry bounds. Opening the
+store reads the manifest only; a shard is parsed on first access to a code in it, and a write
+rewrites just the shards that changed. Shards written after the last manifest are named in a
+small journal, so a crash costs re-reading those shards, never a stale manifest.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from . import metrics
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+MANIFEST_VERSION = 1
+_UNSAFE = re.compile(r"[^A-Z0-9]")
+
+
+def shard_key(code: str, prefix_len: int) -> str:
+    """Shard holding code: its first prefix_len characters, upper-cased and filename safe."""
+    return _UNSAFE.sub("_", str(code)[:prefix_len].upper()).ljust(prefix_len, "_")
+
+
+def _session_stats(items: Dict[str, dict]) -> dict:
+    expiries = []
+    files = 0
+    for sess in items.values():
+        if not isinstance(sess, dict):
+            continue
+        files += len(sess.get("files") or [])
+        try:
+            if sess.get("expires_at") is not None:
+                expiries.append(float(sess["expires_at"]))
+        except (TypeError, ValueError):
+            pass
+    return {
+        "count": len(items),
+        "files": files,
+        "min_expires": min(expiries) if expiries else None,
+        "max_expires": max(expiries) if expiries else None,
+    }
+
+
+def _owner_stats(items: Dict[str, str]) -> dict:
+    return {"count": len(items)}
+
+
+class ShardedMap:
+    """One keyspace (sessions or owners) split into lazily loaded JSON shards."""
+
+    def __init__(self, root: str, name: str, prefix_len: int, stats_fn: Callable[[dict], dict]):
+        self.root = os.path.join(root, name)
+        self.name = name
+        self.prefix_len = prefix_len
+        self._stats_fn = stats_fn
+        self._lock = threading.RLock()
+        # Every non-empty shard, as of its last write; loaded or not
+        self.stats: Dict[str, dict] = {}
+        self._shards: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+        self._next_expiry: Optional[float] = None
+        self._next_expiry_valid = False
+
+    def key(self, code: str) -> str:
+        return shard_key(code, self.prefix_len)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def _load(self, key: str) -> dict:
+        shard = self._shards.get(key)
+        if shard is not None:
+            return shard
+        shard = {}
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    shard = json.load(f)
+            except Exception as e:
+                log.warning("metadata.shard_unreadable", path=path, error=str(e))
+                shard = {}
+            metrics.METADATA_SHARD_LOADS.inc(kind=self.name)
+        self._shards[key] = shard
+        return shard
+
+    def get(self, code: str):
+        with self._lock:
+            return self._load(self.key(code)).get(code)
+
+    def __contains__(self, code: str) -> bool:
+        with self._lock:
+            return code in self._load(self.key(code))
+
+    def set(self, code: str, value) -> None:
+        key = self.key(code)
+        with self._lock:
+            self._load(key)[code] = value
+            self._dirty.add(key)
+
+    def pop(self, code: str):
+        key = self.key(code)
+        with self._lock:
+            value = self._load(key).pop(code, None)
+            if value is not None:
+                self._dirty.add(key)
+            return value
+
+    def touch(self, code: str) -> None:
+        """Mark code's shard for rewrite after its value was changed in place."""
+        with self._lock:
+            self._dirty.add(self.key(code))
+
+    def shard_items(self, key: str) -> List[Tuple[str, object]]:
+        with self._lock:
+            return list(self._load(key).items())
+
+    def codes(self) -> Iterator[str]:
+        """Every code in the map; loads every shard."""
+        for code, _value in self.items():
+            yield code
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        """Every (code, value) in the map, shard by shard; loads every shard."""
+        with self._lock:
+            keys = sorted(set(self.stats) | set(self._shards))
+        for key in keys:
+            yield from self.shard_items(key)
+
+    def scan_items(self) -> Iterator[Tuple[str, object]]:
+        """Every (code, value) in the map without loading shards into memory: each shard is
+        read fresh from disk, except one with unwritten changes, whose copy in memory is newer."""
+        with self._lock:
+            keys = sorted(set(self.stats) | set(self._shards) | self.keys_on_disk())
+        for key in keys:
+            with self._lock:
+                if key in self._dirty:
+                    items = list(self._shards.get(key, {}).items())
+                else:
+                    items = None
+            if items is None:
+                try:
+                    with open(self._path(key), "r", encoding="utf-8") as f:
+                        items = list(json.load(f).items())
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    log.warning("metadata.shard_unreadable", path=self._path(key), error=str(e))
+                    continue
+            yield from items
+
+    def refresh(self, key: str) -> None:
+        """Recompute a shard's stats from disk (it was written after the manifest)."""
+        with self._lock:
+            self._shards.pop(key, None)
+            shard = self._load(key)
+            if shard:
+                self.stats[key] = self._stats_fn(shard)
+            else:
+                self.stats.pop(key, None)
+            self._next_expiry_valid = False
+
+    def restat(self, key: str) -> None:
+        """Recompute a loaded shard's stats (a value was changed in place without touch)."""
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard:
+                self.stats[key] = self._stats_fn(shard)
+                self._next_expiry_valid = False
+
+    def keys_on_disk(self) -> Set[str]:
+        if not os.path.isdir(self.root):
+            return set()
+        return {name[:-5] for name in os.listdir(self.root) if name.endswith(".json")}
+
+    def total(self, field: str = "count") -> int:
+        with self._lock:
+            return sum(int(s.get(field) or 0) for s in self.stats.values())
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest expires_at across all shards, without loading any."""
+        with self._lock:
+            if not self._next_expiry_valid:
+                bounds = [s["min_expires"] for s in self.stats.values() if s.get("min_expires") is not None]
+                self._next_expiry = min(bounds) if bounds else None
+                self._next_expiry_valid = True
+            return self._next_expiry
+
+    def due_shards(self, now: float) -> List[str]:
+        """Shards holding at least one session expired by now."""
+        with self._lock:
+            return sorted(k for k, s in self.stats.items() if s.get("min_expires") is not None and s["min_expires"] <= now)
+
+    def flush(self, journal: Callable[[str, List[str]], None]) -> int:
+        """Rewrite dirty shards (empty ones are removed). Callers serialize flushes."""
+        with self._lock:
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+            payloads = []
+            for key in dirty:
+                shard = self._shards.get(key) or {}
+                if shard:
+                    self.stats[key] = self._stats_fn(shard)
+                    payloads.append((key, json.dumps(shard)))
+                else:
+                    self.stats.pop(key, None)
+                    payloads.append((key, None))
+            if dirty:
+                self._next_expiry_valid = False
+        if not payloads:
+            return 0
+        journal(self.name, dirty)
+        os.makedirs(self.root, exist_ok=True)
+        written = 0
+        for key, payload in payloads:
+            path = self._path(key)
+            if payload is None:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+            written += len(payload)
+        return written
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"shards": len(self.stats), "loaded": len(self._shards), "dirty": len(self._dirty)}
+
+
+class MetaStore:
+    def __init__(self, root: str, prefix_len: int = 2):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.journal_path = os.path.join(root, "journal")
+        self.filter_path = os.path.join(root, "codes.filter")
+        self.prefix_len = max(1, int(prefix_len))
+        self.sessions = ShardedMap(root, "sessions", self.prefix_len, _session_stats)
+        self.owners = ShardedMap(root, "owners", self.prefix_len, _owner_stats)
+        self.had_manifest = False
+
+    def _maps(self) -> Tuple[ShardedMap, ShardedMap]:
+        return self.sessions, self.owners
+
+    def open(self) -> List[Tuple[ShardedMap, str]]:
+        """Read the manifest and re-read any shard it doesn't cover.
+
+        Returns those (map, shard key) pairs: shards named in the journal or present on
+        disk but missing from the manifest. Nothing else is parsed.
+        """
+        manifest: dict = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                log.warning("metadata.manifest_unreadable", error=str(e))
+                manifest = {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            manifest = {}
+        self.had_manifest = bool(manifest)
+        if manifest.get("prefix_len"):
+            # The layout is fixed when the store is created
+            self.prefix_len = int(manifest["prefix_len"])
+        stale: Set[Tuple[str, str]] = set(self._read_journal())
+        for m in self._maps():
+            m.prefix_len = self.prefix_len
+            m.stats = dict(manifest.get(m.name) or {})
+            stale |= {(m.name, key) for key in m.keys_on_disk() - set(m.stats)}
+        maps = {m.name: m for m in self._maps()}
+        refreshed = []
+        for name, key in sorted(stale):
+            if name in maps:
+                maps[name].refresh(key)
+                refreshed.append((maps[name], key))
+        return refreshed
+
+    def _read_journal(self) -> List[Tuple[str, str]]:
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                lines = f.read().split()
+        except FileNotFoundError:
+            return []
+        return [tuple(line.split("/", 1)) for line in lines if "/" in line]
+
+    def _journal(self, name: str, keys: List[str]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{name}/{key}\n" for key in keys))
+
+    def flush(self) -> int:
+        """Write dirty shards; the manifest is left to write_manifest."""
+        return sum(m.flush(self._journal) for m in self._maps())
+
+    def write_manifest(self, filter_snapshot: Optional[bytes] = None, drop_filter: bool = False) -> int:
+        """Write the filter snapshot (if given) and the manifest, then clear the journal.
+
+        Call after flush(), under the same lock, so the manifest covers every shard on disk.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        written = 0
+        if filter_snapshot is not None:
+            tmp = self.filter_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(filter_snapshot)
+            os.replace(tmp, self.filter_path)
+            written += len(filter_snapshot)
+        elif drop_filter and os.path.exists(self.filter_path):
+            os.remove(self.filter_path)
+        manifest = {"version": MANIFEST_VERSION, "prefix_len": self.prefix_len}
+        for m in self._maps():
+            with m._lock:
+                manifest[m.name] = dict(m.stats)
+        payload = json.dumps(manifest)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp, self.manifest_path)
+        written += len(payload)
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self.had_manifest = True
+        return written
+
+    def info(self) -> dict:
+        return {"prefix_len": self.prefix_len, **{m.name: m.info() for m in self._maps()}}
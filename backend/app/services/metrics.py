@@ -0,0 +1,257 @@
+"""
+Filename: metrics.py
+Purpose: Low-overhead in-process metrics (counters, gauges, histograms) rendered in the
+Prometheus text exposition format by GET /metrics. Metric objects are module-level so any
+service can record without threading state through calls.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Iterable[str], values: Iterable, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Settable gauge; set_function() makes it computed at scrape time instead."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._fn: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        self._fn = fn
+
+    def _samples(self) -> List[str]:
+        if self._fn is not None:
+            try:
+                return [f"{self.name} {_fmt_value(self._fn())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[idx] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = ("le", _fmt_value(bound) if bound != float("inf") else "+Inf")
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(row[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    out: List[str] = []
+    for metric in _registry:
+        out.extend(metric.render())
+    return "\n".join(out) + "\n"
+
+
+# --- Metric definitions -------------------------------------------------------
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by blueprint/endpoint (until the response is returned).",
+    ("blueprint", "endpoint", "method", "status"),
+)
+EXPIRY_SWEEP_SECONDS = Histogram(
+    "expiry_sweep_duration_seconds",
+    "Time spent in delete_expired_files.",
+)
+METADATA_PERSIST_SECONDS = Histogram(
+    "metadata_persist_duration_seconds",
+    "Time spent writing session metadata to disk.",
+)
+METADATA_PERSIST_BYTES = Counter(
+    "metadata_persist_bytes_total",
+    "Bytes of session metadata written to disk.",
+)
+METADATA_SHARD_LOADS = Counter(
+    "metadata_shard_loads_total",
+    "Metadata shards parsed from disk (first access after start), by kind.",
+    ("kind",),
+)
+CLOUD_CALL_SECONDS = Histogram(
+    "cloudinary_call_duration_seconds",
+    "Cloudinary API latency by operation.",
+    ("operation",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+LIVE_SESSIONS = Gauge("live_sessions", "Sessions currently held in the metadata store.")
+LIVE_FILES = Gauge("live_files", "File records across all live sessions.")
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total",
+    "Bytes accepted by /upload (use rate() for bytes per second).",
+)
+UPLOAD_JOBS_PENDING = Gauge("upload_jobs_pending", "Async uploads queued or transferring.")
+EVENT_SUBSCRIBERS = Gauge("event_subscribers", "Open owner dashboard event streams.")
+HOT_CACHE_LOOKUPS = Counter(
+    "hot_cache_lookups_total",
+    "Front cache lookups for hot share links by result (hit/miss).",
+    ("result",),
+)
+CODE_FILTER_REJECTS = Counter(
+    "code_filter_rejects_total",
+    "Lookups of non-existent codes answered by the code filter without a store lookup.",
+    ("kind",),
+)
+RESPONSE_COMPRESSED_BYTES = Counter(
+    "response_compressed_bytes_total",
+    "Bytes through response compression by encoding; stage=in (original) or out (encoded).",
+    ("encoding", "stage"),
+)
+ORPHANS_DELETED = Counter(
+    "orphan_assets_deleted_total",
+    "Stored assets no live session referenced, deleted by orphan reconciliation.",
+)
+ORPHAN_BYTES_RECLAIMED = Counter(
+    "orphan_bytes_reclaimed_total",
+    "Bytes of storage freed by orphan reconciliation.",
+)
+RATE_LIMITED = Counter(
+    "rate_limited_total",
+    "Requests rejected by admission control (429 rate limit / 503 concurrency cap).",
+    ("endpoint", "reason"),
+)
+
+
+def init_app(app) -> None:
+    """Time every request; cheap enough to leave on (one perf_counter pair + observe)."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                blueprint=request.blueprint or "",
+                endpoint=request.endpoint or "unmatched",
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
@@ -0,0 +1,136 @@
+"""
+Filename: pathindex.py
+Purpose: Prefix tree over the relative paths of a session's files (directory uploads), so one
+directory level lists in time proportional to its children and a subtree resolves to file
+ids without scanning the session. Trees are built on first use, kept for the most recently
+browsed sessions, and extended in place as files are appended.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from werkzeug.utils import secure_filename
+
+_MAX_SESSIONS = 256
+
+
+def normalize_path(name: Optional[str]) -> str:
+    """Relative path with safe segments ("a/b/c.txt"); "" when nothing usable is left."""
+    parts = []
+    for seg in str(name or "").replace("\\", "/").split("/"):
+        if seg in ("", ".", ".."):
+            continue
+        safe = secure_filename(seg)
+        if safe:
+            parts.append(safe)
+    return "/".join(parts)
+
+
+def file_path(f: dict) -> str:
+    """A file record's path; records from before paths were kept use the filename."""
+    return f.get("path") or f.get("filename") or f.get("file_id") or ""
+
+
+class DirNode:
+    __slots__ = ("dirs", "files", "file_count", "total_bytes", "_sorted")
+
+    def __init__(self):
+        self.dirs: Dict[str, "DirNode"] = {}
+        # (name, index into the session's files list), in upload order
+        self.files: List[Tuple[str, int]] = []
+        # Aggregates over the whole subtree
+        self.file_count = 0
+        self.total_bytes = 0
+        self._sorted: Optional[List[tuple]] = None
+
+    def entries(self) -> List[tuple]:
+        """("dir", name, node) then ("file", name, index), each sorted by name; cached."""
+        if self._sorted is None:
+            dirs = [("dir", name, node) for name, node in sorted(self.dirs.items())]
+            files = [("file", name, idx) for name, idx in sorted(self.files)]
+            self._sorted = dirs + files
+        return self._sorted
+
+    def file_indexes(self) -> Iterator[int]:
+        """Every file in the subtree (depth first)."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for _name, idx in node.files:
+                yield idx
+            stack.extend(node.dirs.values())
+
+
+class PathIndex:
+    def __init__(self):
+        self.root = DirNode()
+        self.indexed = 0
+        self._lock = threading.Lock()
+
+    def extend(self, files: List[dict]) -> None:
+        """Insert files[indexed:] (a session's file list only ever grows)."""
+        with self._lock:
+            for idx in range(self.indexed, len(files)):
+                f = files[idx]
+                parts = (normalize_path(file_path(f)) or str(f.get("file_id") or idx)).split("/")
+                size = int(f.get("size") or 0)
+                node = self.root
+                for part in parts[:-1]:
+                    node.file_count += 1
+                    node.total_bytes += size
+                    child = node.dirs.get(part)
+                    if child is None:
+                        child = node.dirs[part] = DirNode()
+                        node._sorted = None
+                    node = child
+                node.file_count += 1
+                node.total_bytes += size
+                node.files.append((parts[-1], idx))
+                node._sorted = None
+            self.indexed = len(files)
+
+    def find(self, path: str) -> Tuple[Optional[DirNode], Optional[int]]:
+        """(directory node, None) or (None, file index) for a normalized path; (None, None) if absent."""
+        if not path:
+            return self.root, None
+        parts = path.split("/")
+        node = self.root
+        for part in parts[:-1]:
+            node = node.dirs.get(part)
+            if node is None:
+                return None, None
+        last = parts[-1]
+        if last in node.dirs:
+            return node.dirs[last], None
+        for name, idx in node.files:
+            if name == last:
+                return None, idx
+        return None, None
+
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[str, PathIndex]" = OrderedDict()
+
+
+def index_for(access_code: str, session: dict) -> PathIndex:
+    """The session's tree, built or brought up to date with its file list."""
+    files = session.get("files") or []
+    with _lock:
+        index = _indexes.get(access_code)
+        if index is not None and index.indexed > len(files):
+            # The code was reused by a new session
+            index = None
+        if index is None:
+            index = _indexes[access_code] = PathIndex()
+            while len(_indexes) > _MAX_SESSIONS:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(access_code)
+    if index.indexed != len(files):
+        index.extend(files)
+    return index
+
+
+def forget(access_code: str) -> None:
+    with _lock:
+        _indexes.pop(access_code, None)
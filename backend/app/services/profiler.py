@@ -0,0 +1,232 @@
+"""
+Filename: profiler.py
+Purpose: Opt-in request profiling. When enabled, a fraction of requests (or requests carrying
+PROFILE_HEADER) are profiled either by a statistical stack sampler, which accumulates
+flamegraph-compatible collapsed stacks per endpoint, or by cProfile (pstats per endpoint), which
+profiles one request at a time.
+When disabled the request hooks cost a single attribute check, and cProfile/pstats are
+only imported once a request is profiled with them.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Optional
+from flask import g, request
+from ..utils.log import get_logger
+
+if TYPE_CHECKING:
+    import pstats
+
+log = get_logger(__name__)
+
+MODES = ("sampler", "cprofile")
+
+
+class _State:
+    enabled = False
+    mode = "sampler"
+    sample_rate = 0.0
+    interval = 0.005
+    header: Optional[str] = None
+    header_token: Optional[str] = None
+    output_dir: Optional[str] = None
+
+
+_state = _State()
+_lock = threading.Lock()
+# thread id -> endpoint, for requests currently being sampled
+_active: Dict[int, str] = {}
+_wake = threading.Event()
+_sampler_thread: Optional[threading.Thread] = None
+# endpoint -> collapsed stack -> sample count
+_stacks: Dict[str, Counter] = {}
+# endpoint -> merged cProfile stats
+_pstats: Dict[str, "pstats.Stats"] = {}
+_profiled_requests = 0
+# cProfile profiles one thread at a time per process (3.12+ refuses a second active profiler),
+# so at most one request is profiled with it; others arriving meanwhile aren't profiled
+_cprofile_lock = threading.Lock()
+_last_flush = 0.0
+_FLUSH_EVERY_SECONDS = 10.0
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+def _sampler_loop() -> None:
+    while True:
+        if not _active:
+            _wake.wait()
+            _wake.clear()
+            continue
+        time.sleep(_state.interval)
+        frames = sys._current_frames()
+        with _lock:
+            for tid, endpoint in list(_active.items()):
+                frame = frames.get(tid)
+                if frame is not None:
+                    _stacks.setdefault(endpoint, Counter())[_collapse(frame)] += 1
+
+
+def _ensure_sampler() -> None:
+    global _sampler_thread
+    if _sampler_thread is None or not _sampler_thread.is_alive():
+        _sampler_thread = threading.Thread(target=_sampler_loop, name="profiler-sampler", daemon=True)
+        _sampler_thread.start()
+
+
+def configure(
+    *,
+    enabled: Optional[bool] = None,
+    mode: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    interval: Optional[float] = None,
+) -> dict:
+    if mode is not None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        _state.mode = mode
+    if sample_rate is not None:
+        _state.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+    if interval is not None:
+        _state.interval = max(0.001, float(interval))
+    if enabled is not None:
+        _state.enabled = bool(enabled)
+    if _state.enabled and _state.mode == "sampler":
+        _ensure_sampler()
+    return status()
+
+
+def status() -> dict:
+    with _lock:
+        endpoints = sorted(set(_stacks) | set(_pstats))
+    return {
+        "enabled": _state.enabled,
+        "mode": _state.mode,
+        "sample_rate": _state.sample_rate,
+        "interval": _state.interval,
+        "header": _state.header,
+        "profiled_requests": _profiled_requests,
+        "endpoints": endpoints,
+        "output_dir": _state.output_dir,
+    }
+
+
+def _should_profile() -> bool:
+    if _state.header:
+        value = request.headers.get(_state.header)
+        if value is not None and (not _state.header_token or value == _state.header_token):
+            return True
+    return _state.sample_rate > 0 and random.random() < _state.sample_rate
+
+
+def _before_request() -> None:
+    if not _state.enabled:
+        return
+    if not _should_profile():
+        return
+    endpoint = request.endpoint or "unmatched"
+    if _state.mode == "cprofile":
+        import cProfile
+
+        if not _cprofile_lock.acquire(blocking=False):
+            return
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) holds the hook
+            _cprofile_lock.release()
+            return
+        g._profiler = (endpoint, prof)
+    else:
+        g._profiler = (endpoint, None)
+        with _lock:
+            _active[threading.get_ident()] = endpoint
+        _wake.set()
+
+
+def _teardown_request(_exc=None) -> None:
+    global _profiled_requests
+    entry = g.pop("_profiler", None)
+    if entry is None:
+        return
+    endpoint, prof = entry
+    if prof is not None:
+        prof.disable()
+        _cprofile_lock.release()
+    with _lock:
+        if prof is not None:
+            if endpoint in _pstats:
+                _pstats[endpoint].add(prof)
+            else:
+                import pstats
+
+                _pstats[endpoint] = pstats.Stats(prof)
+        else:
+            _active.pop(threading.get_ident(), None)
+        _profiled_requests += 1
+    if time.time() - _last_flush >= _FLUSH_EVERY_SECONDS:
+        flush()
+
+
+def flush() -> list:
+    """Write <endpoint>.folded (collapsed stacks) and <endpoint>.pstats files; returns paths."""
+    global _last_flush
+    _last_flush = time.time()
+    out_dir = _state.output_dir
+    if not out_dir:
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    with _lock:
+        stacks = {ep: dict(c) for ep, c in _stacks.items()}
+        for endpoint, stats in _pstats.items():
+            path = os.path.join(out_dir, f"{endpoint}.pstats")
+            stats.dump_stats(path)
+            written.append(path)
+    for endpoint, counts in stacks.items():
+        path = os.path.join(out_dir, f"{endpoint}.folded")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for stack, count in sorted(counts.items()):
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, path)
+        written.append(path)
+    log.info("profiler.flush", files=len(written), output_dir=out_dir)
+    return written
+
+
+def reset() -> None:
+    global _profiled_requests
+    with _lock:
+        _stacks.clear()
+        _pstats.clear()
+        _profiled_requests = 0
+
+
+def init_app(app) -> None:
+    """Install the request hooks; profiling itself stays off unless PROFILE_ENABLED."""
+    cfg = app.config
+    _state.header = cfg.get("PROFILE_HEADER") or None
+    _state.header_token = cfg.get("PROFILE_HEADER_TOKEN") or None
+    _state.output_dir = cfg.get("PROFILE_OUTPUT_DIR") or os.path.join(cfg["UPLOAD_FOLDER"], "profiles")
+    configure(
+        enabled=bool(cfg.get("PROFILE_ENABLED")),
+        mode=cfg.get("PROFILE_MODE", "sampler"),
+        sample_rate=cfg.get("PROFILE_SAMPLE_RATE", 0.0),
+        interval=cfg.get("PROFILE_INTERVAL", 0.005),
+    )
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,326 @@
+"""
+Filename: ratelimit.py
+Purpose: Admission control. Token buckets per client IP and per access code (RATE_LIMITS)
+answer 429 + Retry-After, and a cap on concurrent requests per endpoint (CONCURRENCY_LIMITS,
+e.g. in-flight uploads) answers 503 + Retry-After before the request body is read.
+Code misses (guessed codes) drain a per-IP scan budget that throttles brute-force scanners.
+Buckets live in a memory-bounded LRU, or in a shared SQLite file so limits hold across workers.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from flask import g, request
+from werkzeug.wsgi import ClosingIterator
+from . import metrics
+from ..utils.log import get_logger
+from ..utils.responses import error
+
+if TYPE_CHECKING:
+    import sqlite3
+
+log = get_logger(__name__)
+
+# Rule: (key, limit, period_seconds). key is "ip" or "code"; a bucket holds `limit`
+# tokens and refills at limit/period per second, so `limit` is also the burst size.
+Rule = Tuple[str, float, float]
+
+
+class MemoryBuckets:
+    """Token buckets in an LRU dict; the least recently used keys are evicted past max_keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max(1, int(max_keys))
+        self._lock = threading.Lock()
+        # key -> [tokens, updated_at]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> float:
+        """Consume one token; returns 0 if allowed, else seconds until a token is available."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [capacity, now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+    def peek(self, key: str, capacity: float, rate: float, now: float) -> float:
+        """Seconds until a token is available, without consuming one."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return 0.0
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / rate
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class SqliteBuckets:
+    """Token buckets in a SQLite file shared by every worker process on the host."""
+
+    _PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, max_keys: int = 100_000):
+        self.path = path
+        self.max_keys = max(1, int(max_keys))
+        self._local = threading.local()
+        self._ops = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _conn(self) -> "sqlite3.Connection":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Imported here: only this store needs it, and it's slow to import
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._ops += 1
+        if self._ops % self._PRUNE_EVERY == 0:
+            self._prune()
+        return wait
+
+    def peek(self, key: str, capacity: float, rate: float, now: float) -> float:
+        row = self._conn().execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return 0.0
+        tokens = min(capacity, row[0] + (now - row[1]) * rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / rate
+
+    def _prune(self) -> None:
+        """Drop the oldest rows beyond max_keys (a full bucket carries no state worth keeping)."""
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM buckets WHERE key IN (SELECT key FROM buckets ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+            (self.max_keys,),
+        )
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class _State:
+    enabled = False
+    trust_proxy = False
+    # Proxies in front of the app that each append to X-Forwarded-For
+    proxy_hops = 1
+    rules: Dict[str, List[Rule]] = {}
+    buckets = None
+    # endpoint -> (semaphore, limit)
+    slots: Dict[str, Tuple[threading.BoundedSemaphore, int]] = {}
+    in_flight: Dict[str, int] = {}
+    retry_after_busy = 5
+    # Scan guard: each code miss costs a token from a per-IP bucket; when it's empty
+    # the IP is refused on lookup endpoints until the bucket refills
+    scan_enabled = False
+    scan_limit = 30.0
+    scan_period = 600.0
+    scan_endpoints: Tuple[str, ...] = ()
+
+
+_state = _State()
+_inflight_lock = threading.Lock()
+
+
+def client_ip() -> str:
+    """The client address: with a trusted proxy, the X-Forwarded-For entry the outermost of
+    proxy_hops proxies appended (entries left of it are whatever the client sent)."""
+    if _state.trust_proxy:
+        hops = [h.strip() for h in request.headers.get("X-Forwarded-For", "").split(",") if h.strip()]
+        if len(hops) >= _state.proxy_hops:
+            return hops[-_state.proxy_hops]
+    return request.remote_addr or "unknown"
+
+
+def _access_code() -> Optional[str]:
+    args = request.view_args or {}
+    code = args.get("access_code") or args.get("code")
+    if not code and request.method == "POST":
+        # Small JSON bodies only (e.g. /download/batch); upload rules key on "ip"
+        data = request.get_json(force=True, silent=True) or {}
+        code = data.get("access_code") if isinstance(data, dict) else None
+    return str(code).strip().upper() if code else None
+
+
+def _reject(message: str, status: int, retry_after: float, endpoint: str, reason: str):
+    metrics.RATE_LIMITED.inc(endpoint=endpoint, reason=reason)
+    seconds = max(1, int(math.ceil(retry_after)))
+    log.info("ratelimit.reject", endpoint=endpoint, reason=reason, ip=client_ip(), retry_after=seconds)
+    resp, status = error(message, status=status)
+    resp.headers["Retry-After"] = str(seconds)
+    return resp, status
+
+
+def _check_rates(endpoint: str, rules: List[Rule]):
+    now = time.time()
+    for key_kind, limit, period in rules:
+        subject = client_ip() if key_kind == "ip" else _access_code()
+        if not subject:
+            continue
+        try:
+            wait = _state.buckets.take(f"{endpoint}|{key_kind}:{limit}/{period}|{subject}", float(limit), limit / period, now)
+        except Exception as e:
+            # Fail open: a broken shared store must not take the service down
+            log.warning("ratelimit.store_error", error=str(e))
+            return None
+        if wait > 0:
+            return _reject("Too many requests", 429, wait, endpoint, key_kind)
+    return None
+
+
+def record_miss() -> None:
+    """Count a lookup of a code that does not exist against the client's scan budget."""
+    if not _state.scan_enabled:
+        return
+    try:
+        _state.buckets.take(f"scan|{client_ip()}", _state.scan_limit, _state.scan_limit / _state.scan_period, time.time())
+    except Exception as e:
+        log.warning("ratelimit.store_error", error=str(e))
+
+
+def reject_unknown(kind: str):
+    """404 for a code the code filter rules out, charged to the caller's scan budget."""
+    metrics.CODE_FILTER_REJECTS.inc(kind=kind)
+    record_miss()
+    return error("Not found", status=404)
+
+
+def _check_scan(endpoint: str):
+    try:
+        wait = _state.buckets.peek(
+            f"scan|{client_ip()}", _state.scan_limit, _state.scan_limit / _state.scan_period, time.time()
+        )
+    except Exception as e:
+        log.warning("ratelimit.store_error", error=str(e))
+        return None
+    if wait > 0:
+        return _reject("Too many failed lookups", 429, wait, endpoint, "scan")
+    return None
+
+
+def _before_request():
+    endpoint = request.endpoint or ""
+    if _state.scan_enabled and endpoint in _state.scan_endpoints:
+        rejected = _check_scan(endpoint)
+        if rejected is not None:
+            return rejected
+    if not _state.enabled:
+        return None
+    rules = _state.rules.get(endpoint)
+    if rules:
+        rejected = _check_rates(endpoint, rules)
+        if rejected is not None:
+            return rejected
+    slot = _state.slots.get(endpoint)
+    if slot is not None:
+        if not slot[0].acquire(blocking=False):
+            return _reject("Server busy, try again shortly", 503, _state.retry_after_busy, endpoint, "concurrency")
+        g._admission_slot = endpoint
+        with _inflight_lock:
+            _state.in_flight[endpoint] = _state.in_flight.get(endpoint, 0) + 1
+    return None
+
+
+def _release(endpoint: str) -> None:
+    _state.slots[endpoint][0].release()
+    with _inflight_lock:
+        _state.in_flight[endpoint] -= 1
+
+
+def _after_request(response):
+    # Streamed bodies (batch ZIPs) keep the slot until the server closes the body.
+    # Wrap the iterable itself: direct_passthrough responses skip call_on_close hooks.
+    if response.is_streamed:
+        endpoint = g.pop("_admission_slot", None)
+        if endpoint is not None:
+            response.response = ClosingIterator(response.response, lambda: _release(endpoint))
+    return response
+
+
+def _teardown_request(_exc=None) -> None:
+    endpoint = g.pop("_admission_slot", None)
+    if endpoint is not None:
+        _release(endpoint)
+
+
+def stats() -> dict:
+    with _inflight_lock:
+        in_flight = dict(_state.in_flight)
+    return {
+        "enabled": _state.enabled,
+        "scan_guard": _state.scan_enabled,
+        "backend": type(_state.buckets).__name__ if _state.buckets is not None else None,
+        "buckets": _state.buckets.size() if _state.buckets is not None else 0,
+        "in_flight": in_flight,
+        "concurrency_limits": {ep: limit for ep, (_sem, limit) in _state.slots.items()},
+    }
+
+
+def init_app(app) -> None:
+    cfg = app.config
+    _state.enabled = bool(cfg.get("RATE_LIMIT_ENABLED", True))
+    _state.trust_proxy = bool(cfg.get("RATE_LIMIT_TRUST_PROXY", False))
+    _state.proxy_hops = max(1, int(cfg.get("RATE_LIMIT_PROXY_HOPS", 1)))
+    _state.rules = {ep: [tuple(r) for r in rules] for ep, rules in (cfg.get("RATE_LIMITS") or {}).items()}
+    _state.retry_after_busy = int(cfg.get("CONCURRENCY_RETRY_AFTER", 5))
+    _state.slots = {
+        ep: (threading.BoundedSemaphore(int(limit)), int(limit))
+        for ep, limit in (cfg.get("CONCURRENCY_LIMITS") or {}).items()
+    }
+    _state.in_flight = {}
+    _state.scan_enabled = bool(cfg.get("SCAN_GUARD_ENABLED", True))
+    _state.scan_limit = float(cfg.get("SCAN_GUARD_MISS_LIMIT", 30))
+    _state.scan_period = float(cfg.get("SCAN_GUARD_PERIOD", 600))
+    _state.scan_endpoints = tuple(cfg.get("SCAN_GUARD_ENDPOINTS") or ())
+    max_keys = int(cfg.get("RATE_LIMIT_MAX_KEYS", 100_000))
+    if cfg.get("RATE_LIMIT_STORAGE", "memory") == "sqlite":
+        path = cfg.get("RATE_LIMIT_SQLITE_PATH") or os.path.join(cfg["UPLOAD_FOLDER"], "ratelimit.sqlite3")
+        _state.buckets = SqliteBuckets(path, max_keys=max_keys)
+    else:
+        _state.buckets = MemoryBuckets(max_keys=max_keys)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,210 @@
+"""
+Filename: reconcile.py
+Purpose: Orphan reconciliation between the metadata store and the storage folder. Assets can
+outlive every session that pointed at them: a bulk delete whose error was swallowed, an upload
+that failed between storing and recording, a zip that was stored but never used, a direct
+upload that was never committed. A background thread lists the folder one page per
+ORPHAN_RECONCILE_INTERVAL seconds, resuming from a cursor kept in UPLOAD_FOLDER/reconcile.json,
+and bulk-deletes assets older than ORPHAN_MIN_AGE that no live session references. Listing and
+bulk deletes are Admin API calls, which share an hourly quota with expiry deletes, hence the
+slow pace: at most two calls per page. Liveness comes from storage's public_id index, which is
+rebuilt from the shards on disk at the start of each pass and kept current in between. That
+index only sees this process's writes, so with more than one worker (WEB_CONCURRENCY) nothing
+is deleted: pages are only counted, as in a dry run.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+from flask import current_app
+from . import metrics, storage
+from .backends import get_backend
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+_STATE_FILE = "reconcile.json"
+# Orphan ids returned per report (debug route); the totals count all of them
+_REPORT_IDS = 20
+
+
+class _State:
+    enabled = False
+    dry_run = False
+    interval = 60.0
+    page_size = 100
+    pass_interval = 6 * 60 * 60.0
+    min_age = 60 * 60.0
+    state_path = ""
+    # Server worker processes; another worker's new sessions are invisible to this one's index
+    workers = 1
+    # Process the thread runs in; a forked worker starts its own on its first request
+    pid: Optional[int] = None
+
+
+_state = _State()
+_start_lock = threading.Lock()
+# One page at a time, whether from the thread or the debug route
+_run_lock = threading.Lock()
+
+
+def _new_pass(now: float) -> dict:
+    return {"started_at": now, "pages": 0, "scanned": 0, "orphans": 0, "deleted": 0, "bytes_reclaimed": 0}
+
+
+def _load() -> dict:
+    try:
+        with open(_state.state_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("cursor", None)
+    data.setdefault("pass", None)
+    data.setdefault("last_pass", None)
+    data.setdefault("totals", {"passes": 0, "deleted": 0, "bytes_reclaimed": 0})
+    return data
+
+
+def _save(data: dict) -> None:
+    tmp = f"{_state.state_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, _state.state_path)
+
+
+def step(dry_run: Optional[bool] = None) -> dict:
+    """Reconcile the next page of the folder listing and move the cursor past it.
+
+    Returns the page's report: assets scanned, orphans found and deleted, bytes reclaimed, and
+    whether the page ended a pass. dry_run only counts; a caller can ask for it, but can't turn
+    off ORPHAN_RECONCILE_DRY_RUN, nor the dry run forced by more than one worker.
+    Needs an app context; raises NotImplementedError when the backend can't list its assets.
+    """
+    dry_run = _state.dry_run or _state.workers > 1 or bool(dry_run)
+    with _run_lock:
+        data = _load()
+        now = time.time()
+        current = data["pass"]
+        if current is None:
+            current = _new_pass(now)
+            # Drops ids the index kept for sessions removed while it was being built
+            storage.rebuild_live_index()
+        backend = get_backend()
+        assets, next_cursor = backend.list_assets(data["cursor"], _state.page_size)
+
+        old = [a for a in assets if a["created_at"] <= now - _state.min_age]
+        orphans: List[dict] = []
+        if old:
+            live = storage.referenced_public_ids(a["public_id"] for a in old)
+            orphans = [a for a in old if a["public_id"] not in live]
+
+        deleted = reclaimed = 0
+        if orphans and not dry_run:
+            deleted = backend.delete_many([(a["public_id"], a["resource_type"]) for a in orphans])
+            if deleted == len(orphans):
+                reclaimed = sum(a["bytes"] for a in orphans)
+            else:
+                # Which ones failed isn't known; they are found again next pass
+                log.warning("orphans.delete.partial", orphans=len(orphans), deleted=deleted)
+            metrics.ORPHANS_DELETED.inc(deleted)
+            metrics.ORPHAN_BYTES_RECLAIMED.inc(reclaimed)
+
+        page = {"scanned": len(assets), "orphans": len(orphans), "deleted": deleted, "bytes_reclaimed": reclaimed}
+        current["pages"] += 1
+        for key, value in page.items():
+            current[key] += value
+        data["totals"]["deleted"] += deleted
+        data["totals"]["bytes_reclaimed"] += reclaimed
+        data["cursor"] = next_cursor
+        if next_cursor is None:
+            current["finished_at"] = now
+            data["last_pass"] = current
+            data["pass"] = None
+            data["totals"]["passes"] += 1
+        else:
+            data["pass"] = current
+        _save(data)
+
+    if orphans:
+        log.info("orphans.page", dry_run=dry_run, **page)
+    if next_cursor is None:
+        log.info("orphans.pass", dry_run=dry_run, **current)
+    return {
+        **page,
+        "dry_run": dry_run,
+        "pass_complete": next_cursor is None,
+        "orphan_ids": [a["public_id"] for a in orphans[:_REPORT_IDS]],
+    }
+
+
+def _due(now: float) -> bool:
+    """A pass is in progress, or the last one started ORPHAN_PASS_INTERVAL ago."""
+    data = _load()
+    if data["pass"] is not None or data["last_pass"] is None:
+        return True
+    return now >= data["last_pass"]["started_at"] + _state.pass_interval
+
+
+def _loop(app) -> None:
+    while True:
+        # Sleep first: a fresh worker serves its first requests without the extra calls
+        time.sleep(_state.interval)
+        try:
+            if not _due(time.time()):
+                continue
+            with app.app_context():
+                step()
+        except NotImplementedError:
+            log.warning("orphans.unsupported", backend=app.config.get("STORAGE_BACKEND"))
+            return
+        except Exception as e:
+            # Quota exhausted, network: the cursor didn't move, the page is retried
+            log.warning("orphans.step.failed", error=str(e))
+
+
+def _start_once() -> None:
+    """before_request: start this process's reconciliation thread. Not started in create_app,
+    where a preloading server's master would run it instead of the worker."""
+    if _state.pid == os.getpid():
+        return
+    with _start_lock:
+        if _state.pid == os.getpid():
+            return
+        _state.pid = os.getpid()
+        app = current_app._get_current_object()
+        threading.Thread(target=_loop, args=(app,), name="orphan-reconcile", daemon=True).start()
+
+
+def status() -> dict:
+    data = _load()
+    return {
+        "enabled": _state.enabled,
+        "running": _state.pid == os.getpid(),
+        "dry_run": _state.dry_run or _state.workers > 1,
+        "workers": _state.workers,
+        "interval": _state.interval,
+        "page_size": _state.page_size,
+        "pass_interval": _state.pass_interval,
+        "min_age": _state.min_age,
+        **data,
+    }
+
+
+def init_app(app) -> None:
+    cfg = app.config
+    _state.enabled = bool(cfg.get("ORPHAN_RECONCILE_ENABLED", False))
+    _state.dry_run = bool(cfg.get("ORPHAN_RECONCILE_DRY_RUN", False))
+    _state.interval = float(cfg.get("ORPHAN_RECONCILE_INTERVAL", 60))
+    _state.page_size = max(1, int(cfg.get("ORPHAN_RECONCILE_PAGE_SIZE", 100)))
+    _state.pass_interval = float(cfg.get("ORPHAN_PASS_INTERVAL", 6 * 60 * 60))
+    # A direct upload's asset may be committed any time before its token expires
+    _state.min_age = max(float(cfg.get("ORPHAN_MIN_AGE", 60 * 60)), float(cfg.get("DIRECT_UPLOAD_TTL", 15 * 60)))
+    _state.state_path = os.path.join(cfg["UPLOAD_FOLDER"], _STATE_FILE)
+    _state.workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+    _state.pid = None
+    if _state.enabled and _state.workers > 1 and not _state.dry_run:
+        log.warning("orphans.dry_run_forced", workers=_state.workers)
+    if _state.enabled:
+        app.before_request(_start_once)
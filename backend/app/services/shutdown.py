@@ -0,0 +1,37 @@
+"""
+Filename: shutdown.py
+Purpose: Graceful stop of a worker. begin() runs as soon as the stop is requested (SIGTERM):
+open event streams end, so they don't hold the server's graceful timeout, and async uploads
+are refused. drain() runs once the server has stopped serving requests: it waits for async
+uploads still transferring, writes debounced counters and the metadata manifest, and flushes
+the log queue.
+"""
+
+import time
+from typing import Optional
+from . import events, storage, upload_jobs
+from ..utils.log import get_logger, shutdown_logging
+
+log = get_logger(__name__)
+
+
+def begin() -> None:
+    upload_jobs.stop_accepting()
+    closed = events.close_all()
+    log.info("app.shutdown.begin", event_streams=closed)
+
+
+def drain(app, timeout: Optional[float] = None) -> dict:
+    """Finish in-flight work within timeout seconds (SHUTDOWN_DRAIN_TIMEOUT by default)."""
+    if timeout is None:
+        timeout = float(app.config.get("SHUTDOWN_DRAIN_TIMEOUT", 10))
+    start = time.monotonic()
+    begin()
+    unfinished = upload_jobs.drain(timeout)
+    if unfinished:
+        log.warning("app.shutdown.uploads_lost", jobs=unfinished)
+    storage.flush_pending()
+    summary = {"unfinished_uploads": unfinished, "seconds": round(time.monotonic() - start, 3)}
+    log.info("app.shutdown.drained", **summary)
+    shutdown_logging()
+    return summary
@@ -1,23 +1,51 @@
 """
 Filename: storage.py
-Purpose: Provide local filesystem storage utilities: save files and a stub for delete.
+Purpose: Session metadata store plus file save/delete helpers that delegate to the configured storage backend.
+Metadata is kept in the sharded layout of metastore.py; shards load on first access.
 """
 
 import os
 import json
+import atexit
 import time
 import shutil
+import threading
 import zipfile
-from typing import Dict, Optional, Iterable, Tuple
+from typing import Dict, List, Optional, Iterable, Tuple
 from flask import current_app
-import cloudinary  # type: ignore
-import cloudinary.uploader  # type: ignore
 from werkzeug.utils import secure_filename
-from .cloudinary_storage import force_delete_cloud_asset
+from . import disk_cache, events, hotcache, metrics, pathindex
+from .codefilter import CountingBloomFilter
+from .metastore import MetaStore, ShardedMap
+from .backends import get_backend
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
 
 _metadata_loaded = False
-_metadata: Dict[str, dict] = {}
+_load_lock = threading.Lock()
+_store: Optional[MetaStore] = None
+# Pre-shard single-file layout, migrated once on first load
 _metadata_path: Optional[str] = None
+# Counting Bloom filter of live codes ("a:<access>", "o:<owner>"); None when disabled
+_code_filter: Optional[CountingBloomFilter] = None
+# Set when the filter changed since its last snapshot
+_code_filter_changed = False
+# Guards every counter update, snapshot and swap of _code_filter
+_filter_lock = threading.Lock()
+# Codes added while a rebuild scans the store, replayed into the new filter; None when idle
+_filter_journal: Optional[List[str]] = None
+# Reference count per storage public_id of every live file (orphan reconciliation); built
+# on first use, then kept current by add_file_to_session and _remove_session
+_live_ids: Optional[Dict[str, int]] = None
+_live_lock = threading.Lock()
+# public_ids added while the index is being built, replayed into it; None when idle
+_live_journal: Optional[List[str]] = None
+# Serializes shard/manifest writes: concurrent requests otherwise race on the same .tmp files
+_persist_lock = threading.Lock()
+# Pending debounced checkpoint (manifest, download counters), see _persist_soon
+_persist_timer: Optional[threading.Timer] = None
+_timer_lock = threading.Lock()
 
 
 def _get_upload_folder() -> str:
@@ -36,33 +64,218 @@ def _get_metadata_path() -> str:
 
 
 def _ensure_loaded() -> None:
-    global _metadata_loaded, _metadata
+    """Open the store: reads the manifest and filter snapshot, not the sessions."""
+    global _metadata_loaded, _store
     if _metadata_loaded:
         return
-    path = _get_metadata_path()
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                _metadata = json.load(f)
-        except Exception:
-            _metadata = {}
-    else:
-        _metadata = {}
-    # Ensure container keys exist
-    if "_owner_index" not in _metadata:
-        _metadata["_owner_index"] = {}
-    # Sessions map access_code -> session dict
-    if "_sessions" not in _metadata:
-        _metadata["_sessions"] = {}
-    _metadata_loaded = True
+    with _load_lock:
+        if _metadata_loaded:
+            return
+        store = MetaStore(
+            os.path.join(_get_upload_folder(), "meta"),
+            int(current_app.config.get("METADATA_SHARD_PREFIX_LEN", 2)),
+        )
+        stale = store.open()
+        _store = store
+        legacy = _get_metadata_path()
+        if not store.had_manifest and not stale and os.path.exists(legacy):
+            _migrate_legacy(legacy)
+        else:
+            _load_code_filter(stale)
+        _metadata_loaded = True
+
+
+def _migrate_legacy(path: str) -> None:
+    """Split the old single-file metadata.json into shards (first start after upgrade)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        log.warning("metadata.legacy_unreadable", path=path, error=str(e))
+        _rebuild_code_filter()
+        return
+    sessions = data.get("_sessions") or {}
+    for code, sess in sessions.items():
+        _store.sessions.set(code, sess)
+    for owner_code, code in (data.get("_owner_index") or {}).items():
+        _store.owners.set(owner_code, code)
+    _rebuild_code_filter()
+    _checkpoint()
+    os.replace(path, path + ".migrated")
+    log.info("metadata.migrated", sessions=len(sessions), shards=len(_store.sessions.stats))
+
+
+def _load_code_filter(stale: List[Tuple[ShardedMap, str]]) -> None:
+    global _code_filter
+    if not current_app.config.get("CODE_FILTER_ENABLED", True):
+        with _filter_lock:
+            _code_filter = None
+        return
+    try:
+        with open(_store.filter_path, "rb") as f:
+            loaded = CountingBloomFilter.from_bytes(f.read())
+    except (OSError, ValueError):
+        # No usable snapshot: one full pass over the shards
+        _rebuild_code_filter()
+        return
+    # Shards written after the snapshot may hold codes it lacks; re-adding is harmless
+    for m, key in stale:
+        prefix = "a" if m is _store.sessions else "o"
+        for code, _value in m.shard_items(key):
+            loaded.add(f"{prefix}:{code}")
+    with _filter_lock:
+        _code_filter = loaded
+
+
+def _rebuild_code_filter(capacity: Optional[int] = None) -> None:
+    """Build the filter from every code in the store (loads every shard)."""
+    global _code_filter, _filter_journal
+    cfg = current_app.config
+    with _filter_lock:
+        if not cfg.get("CODE_FILTER_ENABLED", True):
+            _code_filter = None
+            return
+        if _filter_journal is not None:
+            # A rebuild is already scanning
+            return
+        _filter_journal = []
+    _scan_and_swap_filter(
+        capacity or int(cfg.get("CODE_FILTER_CAPACITY", 100_000)),
+        float(cfg.get("CODE_FILTER_FP_RATE", 0.01)),
+    )
+
+
+def _scan_and_swap_filter(capacity: int, fp_rate: float) -> None:
+    """Scan the store without holding _filter_lock, then swap the new filter in under it.
+
+    The caller opens _filter_journal first. Adds made during the scan are journaled and
+    replayed into the new filter so they aren't lost. Removes are not replayed: a code
+    missed by the scan was never counted, and a spurious decrement could turn a live code
+    into a false "no". A removed code that the scan still saw only costs a false "maybe".
+    """
+    global _code_filter, _code_filter_changed, _filter_journal
+    try:
+        keys = [f"a:{code}" for code in _store.sessions.codes()]
+        keys += [f"o:{owner}" for owner in _store.owners.codes()]
+        rebuilt = CountingBloomFilter.build(keys, capacity, fp_rate)
+        with _filter_lock:
+            for key in _filter_journal:
+                rebuilt.add(key)
+            _code_filter = rebuilt
+            _code_filter_changed = True
+    finally:
+        with _filter_lock:
+            _filter_journal = None
+
+
+def _rebuild_filter_in_background(capacity: int, fp_rate: float) -> None:
+    try:
+        _scan_and_swap_filter(capacity, fp_rate)
+    except Exception as e:
+        log.warning("code_filter.rebuild_failed", error=str(e))
+
+
+def _filter_add(key: str) -> None:
+    global _code_filter_changed, _filter_journal
+    with _filter_lock:
+        if _code_filter is None:
+            return
+        _code_filter.add(key)
+        _code_filter_changed = True
+        if _filter_journal is not None:
+            _filter_journal.append(key)
+            return
+        if not _code_filter.full:
+            return
+        # Past capacity the false-positive rate climbs; rebuild at double the size, off the
+        # request thread since the scan reads every shard
+        _filter_journal = []
+        capacity, fp_rate = _code_filter.capacity * 2, _code_filter.fp_rate
+    threading.Thread(
+        target=_rebuild_filter_in_background, args=(capacity, fp_rate), name="code-filter-rebuild", daemon=True
+    ).start()
+
+
+def _filter_remove(key: str) -> None:
+    global _code_filter_changed
+    with _filter_lock:
+        if _code_filter is not None:
+            _code_filter.remove(key)
+            _code_filter_changed = True
+
+
+def access_code_may_exist(code: str) -> bool:
+    """False means the code is definitely not live; True means look it up."""
+    _ensure_loaded()
+    bf = _code_filter
+    return bf is None or f"a:{code}" in bf
+
+
+def owner_code_may_exist(owner_code: str) -> bool:
+    _ensure_loaded()
+    bf = _code_filter
+    return bf is None or f"o:{owner_code}" in bf
 
 
 def _persist() -> None:
-    path = _get_metadata_path()
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(_metadata, f)
-    os.replace(tmp, path)
+    """Write the shards changed since the last write; the manifest follows via _persist_soon."""
+    with _persist_lock, metrics.METADATA_PERSIST_SECONDS.time():
+        written = _store.flush()
+    metrics.METADATA_PERSIST_BYTES.inc(written)
+    _persist_soon()
+
+
+def _checkpoint() -> None:
+    """Write dirty shards, then the code filter snapshot (if it changed) and the manifest."""
+    global _code_filter_changed
+    with _persist_lock, metrics.METADATA_PERSIST_SECONDS.time():
+        written = _store.flush()
+        snapshot = None
+        with _filter_lock:
+            disabled = _code_filter is None
+            if not disabled and _code_filter_changed:
+                _code_filter_changed = False
+                snapshot = _code_filter.to_bytes()
+        written += _store.write_manifest(snapshot, drop_filter=disabled)
+    metrics.METADATA_PERSIST_BYTES.inc(written)
+
+
+def _persist_soon() -> None:
+    """Schedule one checkpoint within METADATA_PERSIST_DELAY; calls in between coalesce.
+
+    Used for high-frequency, low-value updates (download counters, the manifest) so a
+    hot link or an upload burst doesn't rewrite them on every request.
+    """
+    global _persist_timer
+    delay = float(current_app.config.get("METADATA_PERSIST_DELAY", 1.0))
+    if delay <= 0:
+        _checkpoint()
+        return
+    with _timer_lock:
+        if _persist_timer is not None:
+            return
+        _persist_timer = threading.Timer(delay, _flush_pending)
+        _persist_timer.daemon = True
+        _persist_timer.start()
+
+
+def _flush_pending() -> None:
+    global _persist_timer
+    with _timer_lock:
+        _persist_timer = None
+    try:
+        _checkpoint()
+    except Exception as e:
+        log.warning("metadata.deferred_persist_failed", error=str(e))
+
+
+def flush_pending() -> None:
+    """Write any debounced update now (shutdown)."""
+    with _timer_lock:
+        timer = _persist_timer
+    if timer is not None:
+        timer.cancel()
+        _flush_pending()
 
 
 def save_file(file_obj) -> Dict[str, str]:
@@ -73,39 +286,37 @@ def save_file(file_obj) -> Dict[str, str]:
     if not original:
         raise ValueError("Invalid filename")
 
-    # Upload to Cloudinary (chunked, supports large videos)
     try:
-        result = cloudinary.uploader.upload(
-            file_obj,
-            resource_type="auto",
-            folder="temp-share",
-            chunk_size=6000000,
-        )
+        saved = get_backend().put_stream(file_obj, original)
     except Exception as e:
-        print(f"[CLOUDINARY][UPLOAD ERROR] single file: {e}")
+        log.error("storage.upload.failed", filename=original, error=str(e))
         raise
-    file_url = result.get("secure_url")
-    public_id = result.get("public_id")
-    res_type = result.get("resource_type")
-    print(f"[CLOUDINARY] uploaded: {public_id}")
-    return {"url": file_url, "public_id": public_id, "resource_type": res_type, "original": original}
+    log.debug("storage.uploaded", public_id=saved.get("public_id"))
+    return {**saved, "original": original}
 
 
 def create_session(access_code: str, owner_code: str, expires_at: float, uploaded_at: float, upload_id: str) -> None:
     """Create a new upload session keyed by access_code and owner_code."""
     _ensure_loaded()
-    _metadata.setdefault("_sessions", {})[access_code] = {
+    _store.sessions.set(access_code, {
         "upload_id": upload_id,
         "access_code": access_code,
         "owner_code": owner_code,
         "uploaded_at": uploaded_at,
         "expires_at": expires_at,
         "files": [],
+        # Listing totals, kept current by add_file_to_session
+        "file_count": 0,
+        "total_bytes": 0,
         "preview_file_id": None,
         "download_count": 0,
-    }
-    _metadata.setdefault("_owner_index", {})[owner_code] = access_code
+    })
+    _store.owners.set(owner_code, access_code)
+    _filter_add(f"a:{access_code}")
+    _filter_add(f"o:{owner_code}")
     _persist()
+    # A recycled code may still have a cached 404
+    hotcache.invalidate(access_code)
 
 
 def add_file_to_session(
@@ -118,9 +329,14 @@ def add_file_to_session(
     cloudinary_public_id: Optional[str],
     resource_type: Optional[str],
     file_url: Optional[str],
+    path: Optional[str] = None,
+    previews: Optional[Dict[str, str]] = None,
 ) -> None:
+    """Append a file record. path is its relative path within a directory upload
+    (normalized); it defaults to the filename. previews maps size names to the URLs
+    of the backend's preview derivatives."""
     _ensure_loaded()
-    session = _metadata.get("_sessions", {}).get(access_code)
+    session = _store.sessions.get(access_code)
     if not session:
         raise KeyError("Session not found")
     record = {
@@ -131,87 +347,248 @@ def add_file_to_session(
         "cloudinary_public_id": cloudinary_public_id,
         "resource_type": resource_type,
         "file_url": file_url,
+        "path": pathindex.normalize_path(path) or original_name,
+        "previews": dict(previews or {}),
         "download_count": 0,
     }
+    count, total = session_totals(session)
     session["files"].append(record)
+    session["file_count"] = count + 1
+    session["total_bytes"] = total + int(size_bytes)
     # Initialize preview to the first file added
     if not session.get("preview_file_id"):
         session["preview_file_id"] = file_id
+    _store.sessions.touch(access_code)
     _persist()
+    _live_add(cloudinary_public_id)
+    hotcache.invalidate(access_code)
+    events.publish(access_code, "file_added", {
+        "file_id": file_id,
+        "filename": original_name,
+        "size": int(size_bytes),
+        "mime_type": mime_type,
+        "path": session["files"][-1]["path"],
+        "download_count": 0,
+    })
+
+
+def session_totals(sess: dict) -> Tuple[int, int]:
+    """(file count, total bytes) of a session; older records without totals are summed."""
+    files = sess.get("files") or []
+    if "total_bytes" in sess and sess.get("file_count") == len(files):
+        return len(files), int(sess["total_bytes"])
+    return len(files), sum(int(f.get("size") or 0) for f in files)
 
 
 def get_session(access_code: str) -> Optional[dict]:
     _ensure_loaded()
-    return _metadata.get("_sessions", {}).get(access_code)
+    return _store.sessions.get(access_code)
+
+
+def set_session_expiry(access_code: str, expires_at: float) -> bool:
+    """Move a session's expiry (debug/bench); False if there is no such session."""
+    _ensure_loaded()
+    sess = _store.sessions.get(access_code)
+    if not sess:
+        return False
+    sess["expires_at"] = expires_at
+    _store.sessions.touch(access_code)
+    _persist()
+    hotcache.invalidate(access_code)
+    return True
 
 
 def delete_session(access_code: str) -> int:
     """Delete a session and all its files from Cloudinary. Returns number of files deleted."""
     _ensure_loaded()
-    sessions = _metadata.get("_sessions", {})
-    session = sessions.get(access_code)
-    if not session:
+    deleted = _remove_session(access_code)
+    if deleted is None:
         return 0
+    _persist()
+    return deleted
+
+
+def _remove_session(access_code: str) -> Optional[int]:
+    """delete_session without the write; None if the session doesn't exist.
+
+    The pop is the claim: when two sweeps race on one session, only the thread whose pop
+    returned it deletes the assets, updates the filter and publishes.
+    """
+    session = _store.sessions.pop(access_code)
+    if not session:
+        return None
     files = session.get("files", []) or []
-    deleted = 0
-    for f in files:
-        public_id = f.get("cloudinary_public_id")
-        res_type = f.get("resource_type")
-        if public_id:
-            try:
-                force_delete_cloud_asset(public_id, res_type)
-            except Exception:
-                pass
-        deleted += 1
+    assets = [(f.get("cloudinary_public_id"), f.get("resource_type")) for f in files if f.get("cloudinary_public_id")]
+    _live_remove(public_id for public_id, _rt in assets)
+    if assets:
+        try:
+            get_backend().delete_many(assets)
+        except Exception:
+            pass
+    deleted = len(files)
     # remove owner mapping
     try:
         oc = session.get("owner_code")
-        if oc and oc in _metadata.get("_owner_index", {}):
-            del _metadata["_owner_index"][oc]
+        if oc and _store.owners.pop(oc) is not None:
+            _filter_remove(f"o:{oc}")
     except Exception:
         pass
-    del sessions[access_code]
-    _persist()
+    _filter_remove(f"a:{access_code}")
+    hotcache.invalidate(access_code)
+    pathindex.forget(access_code)
+    disk_cache.purge_session(access_code)
+    events.publish(access_code, "deleted", {"access_code": access_code})
     return deleted
 
 
 def list_access_codes() -> set:
+    """Every live access code; loads every shard, so keep it off request paths."""
+    _ensure_loaded()
+    return set(_store.sessions.codes())
+
+
+def _live_add(public_id: Optional[str]) -> None:
+    if not public_id:
+        return
+    with _live_lock:
+        if _live_journal is not None:
+            _live_journal.append(public_id)
+        if _live_ids is not None:
+            _live_ids[public_id] = _live_ids.get(public_id, 0) + 1
+
+
+def _live_remove(public_ids: Iterable[str]) -> None:
+    with _live_lock:
+        if _live_ids is None:
+            return
+        for public_id in public_ids:
+            left = _live_ids.get(public_id, 0) - 1
+            if left > 0:
+                _live_ids[public_id] = left
+            else:
+                _live_ids.pop(public_id, None)
+
+
+def rebuild_live_index() -> None:
+    """Rebuild the public_id index from the session shards on disk; off request paths.
+
+    Nothing is locked during the scan. public_ids added meanwhile are journaled and counted
+    again; removes are not replayed, so an id may stay listed until the next rebuild, which
+    only spares an orphan for a while. Another rebuild already scanning makes this a no-op.
+    """
+    global _live_ids, _live_journal
+    _ensure_loaded()
+    with _live_lock:
+        if _live_journal is not None:
+            return
+        _live_journal = []
+    try:
+        ids: Dict[str, int] = {}
+        for _code, sess in _store.sessions.scan_items():
+            if not isinstance(sess, dict):
+                continue
+            for f in sess.get("files") or []:
+                public_id = f.get("cloudinary_public_id")
+                if public_id:
+                    ids[public_id] = ids.get(public_id, 0) + 1
+        with _live_lock:
+            for public_id in _live_journal:
+                ids[public_id] = ids.get(public_id, 0) + 1
+            _live_ids = ids
+    finally:
+        with _live_lock:
+            _live_journal = None
+
+
+def referenced_public_ids(public_ids: Iterable[str]) -> set:
+    """The given storage public_ids that a live file references (orphan reconciliation).
+    Builds the index on first use, which reads every session shard."""
+    if _live_ids is None:
+        rebuild_live_index()
+    with _live_lock:
+        live = _live_ids or {}
+        return {public_id for public_id in public_ids if public_id in live}
+
+
+def access_code_exists(code: str) -> bool:
+    """Collision check: the code filter answers most misses, else one shard lookup."""
+    if not access_code_may_exist(code):
+        return False
+    return code in _store.sessions
+
+
+def owner_code_exists(owner_code: str) -> bool:
+    if not owner_code_may_exist(owner_code):
+        return False
+    return owner_code in _store.owners
+
+
+def session_count() -> int:
+    _ensure_loaded()
+    return _store.sessions.total("count")
+
+
+def file_count() -> int:
+    _ensure_loaded()
+    return _store.sessions.total("files")
+
+
+def metadata_stats() -> dict:
     _ensure_loaded()
-    return set((_metadata.get("_sessions", {}) or {}).keys())
+    return _store.info()
 
 
 def delete_expired_files(is_expired_func) -> int:
+    with metrics.EXPIRY_SWEEP_SECONDS.time():
+        return _delete_expired_files(is_expired_func)
+
+
+def _delete_expired_files(is_expired_func) -> int:
     _ensure_loaded()
-    print("[EXPIRY] scanning sessions...")
-    sessions = _metadata.get("_sessions", {})
+    now = time.time()
+    # Nothing due anywhere: the common case costs one comparison
+    next_expiry = _store.sessions.next_expiry()
+    if next_expiry is None or next_expiry > now:
+        return 0
+    due = _store.sessions.due_shards(now)
+    log.debug("expiry.scan", shards=len(due))
     expired_codes: list[str] = []
-    for code, sess in list(sessions.items()):
-        if not isinstance(sess, dict):
-            continue
-        expires_at = sess.get("expires_at")
-        if expires_at is None:
-            continue
-        if is_expired_func(expires_at):
-            expired_codes.append(code)
+    for key in due:
+        found = len(expired_codes)
+        for code, sess in _store.sessions.shard_items(key):
+            if not isinstance(sess, dict):
+                continue
+            expires_at = sess.get("expires_at")
+            if expires_at is None:
+                continue
+            if is_expired_func(expires_at):
+                expired_codes.append(code)
+        if len(expired_codes) == found:
+            # Bounds went stale; don't rescan this shard on every request
+            _store.sessions.restat(key)
 
     removed = 0
     for code in expired_codes:
-        removed += delete_session(code)
+        removed += _remove_session(code) or 0
+    if expired_codes:
+        _persist()
     return removed
 
 
 def set_owner_mapping(owner_code: str, code: str) -> None:
     _ensure_loaded()
-    _metadata.setdefault("_owner_index", {})[owner_code] = code
+    if owner_code not in _store.owners:
+        _filter_add(f"o:{owner_code}")
+    _store.owners.set(owner_code, code)
     _persist()
 
 
 def get_session_by_owner(owner_code: str) -> Optional[Tuple[str, dict]]:
     _ensure_loaded()
-    code = _metadata.get("_owner_index", {}).get(owner_code)
+    code = _store.owners.get(owner_code)
     if not code:
         return None
-    sess = _metadata.get("_sessions", {}).get(code)
+    sess = _store.sessions.get(code)
     if not sess:
         return None
     return code, sess
@@ -219,23 +596,31 @@ def get_session_by_owner(owner_code: str) -> Optional[Tuple[str, dict]]:
 
 def remove_owner_mapping(owner_code: str) -> None:
     _ensure_loaded()
-    if owner_code in _metadata.get("_owner_index", {}):
-        del _metadata["_owner_index"][owner_code]
+    if _store.owners.pop(owner_code) is not None:
+        _filter_remove(f"o:{owner_code}")
         _persist()
 
 
 def increment_download_count(access_code: str, file_id: Optional[str] = None) -> int:
     _ensure_loaded()
-    sess = _metadata.get("_sessions", {}).get(access_code)
+    sess = _store.sessions.get(access_code)
     if not sess:
         return 0
+    file_count_now = None
     if file_id:
         for f in sess.get("files", []) or []:
             if f.get("file_id") == file_id:
                 f["download_count"] = int(f.get("download_count", 0)) + 1
+                file_count_now = f["download_count"]
                 break
     sess["download_count"] = int(sess.get("download_count", 0)) + 1
-    _persist()
+    _store.sessions.touch(access_code)
+    _persist_soon()
+    events.publish(access_code, "download_count", {
+        "download_count": sess["download_count"],
+        "file_id": file_id,
+        "file_download_count": file_count_now,
+    })
     return int(sess.get("download_count", 0))
 
 
@@ -298,34 +683,60 @@ def save_directory_zip(files: Iterable, original_folder: Optional[str] = None) -
             zf.writestr(rel, data)
             stream.seek(stream_pos)
 
-    # Upload zip to Cloudinary then remove local zip
+    # Upload zip to the storage backend then remove local zip
     try:
-        result = cloudinary.uploader.upload(
+        saved = get_backend().put_stream(
             zip_path,
+            zip_name,
             resource_type="raw",
-            folder="temp-share",
-            chunk_size=6000000,
-            use_filename=True,
-            unique_filename=False,
             public_id=base_name,  # ensure no .zip in public_id
         )
     except Exception as e:
-        print(f"[CLOUDINARY][UPLOAD ERROR] zip: {e}")
+        log.error("storage.upload.failed", filename=zip_name, error=str(e))
         raise
     try:
         os.remove(zip_path)
     except Exception:
         pass
-    file_url = result.get("secure_url")
-    public_id = result.get("public_id")
-    res_type = result.get("resource_type")
-    print(f"[CLOUDINARY] uploaded: {public_id}")
-    return {"url": file_url, "public_id": public_id, "resource_type": res_type, "original": zip_name}
+    log.debug("storage.uploaded", public_id=saved.get("public_id"))
+    return {**saved, "original": zip_name}
 
 
 def delete_cloud_asset(public_id: Optional[str], resource_type: Optional[str] = None) -> bool:
-    """Delete a Cloudinary asset by public ID, raising if it fails."""
+    """Delete a stored asset by public ID through the storage backend, raising if it fails."""
     if not public_id:
         raise RuntimeError("Cloudinary public_id is missing")
-    force_delete_cloud_asset(public_id, resource_type)
+    get_backend().delete(public_id, resource_type)
     return True
+
+
+# Live counts are computed when /metrics is scraped, not on every mutation
+metrics.LIVE_SESSIONS.set_function(session_count)
+metrics.LIVE_FILES.set_function(file_count)
+
+# Don't lose debounced counter updates on a clean exit
+atexit.register(flush_pending)
+
+
+def _after_fork_in_child() -> None:
+    """A forked worker re-opens the store on first use. Shards loaded by the parent are a
+    snapshot that goes stale once workers write, and would be written back over newer data;
+    the parent's debounce timer thread and lock owners don't exist in the child."""
+    global _metadata_loaded, _store, _code_filter, _code_filter_changed, _filter_lock, _filter_journal
+    global _persist_timer, _load_lock, _persist_lock, _timer_lock, _live_ids, _live_lock, _live_journal
+    _metadata_loaded = False
+    _store = None
+    _code_filter = None
+    _code_filter_changed = False
+    _filter_lock = threading.Lock()
+    _filter_journal = None
+    _live_ids = None
+    _live_lock = threading.Lock()
+    _live_journal = None
+    _persist_timer = None
+    _load_lock = threading.Lock()
+    _persist_lock = threading.Lock()
+    _timer_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,324 @@
+"""
+Filename: upload_jobs.py
+Purpose: Asynchronous upload finalize (POST /upload?async=1). The request only spools the
+received files to disk and returns 202; a bounded worker pool then transfers them to the
+storage backend, counting bytes as they are read, and commits the session once every file
+is stored. GET /upload/<upload_id>/status reports per-file progress (poll or event stream).
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+from werkzeug.datastructures import FileStorage
+from . import metrics, storage
+from .backends import get_backend
+from .codegen import random_token
+from ..utils.log import get_logger
+
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
+log = get_logger(__name__)
+
+TERMINAL_STATES = ("done", "failed")
+
+
+class QueueFull(Exception):
+    """Too many jobs waiting; the caller should retry later."""
+
+
+class _ProgressReader:
+    """File wrapper that reports bytes as the backend reads them."""
+
+    def __init__(self, fileobj, on_read):
+        self._f = fileobj
+        self._on_read = on_read
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        if data:
+            self._on_read(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+class Job:
+    def __init__(self, upload_id: str, access_code: str, owner_code: str, expires_at: float, uploaded_at: float):
+        self.upload_id = upload_id
+        self.access_code = access_code
+        self.owner_code = owner_code
+        self.expires_at = expires_at
+        self.uploaded_at = uploaded_at
+        self.state = "queued"
+        self.error: Optional[str] = None
+        self.files: List[dict] = []
+        self.result: List[dict] = []
+        self.finished_at: Optional[float] = None
+        self.spool_dir = ""
+        # Bumped on every change so event streams only send news
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def touch(self) -> None:
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        with self.changed:
+            if self.version == version and self.state not in TERMINAL_STATES:
+                self.changed.wait(timeout)
+            return self.version
+
+    def status(self) -> dict:
+        files = [
+            {
+                "index": f["index"],
+                "filename": f["filename"],
+                "size": f["size"],
+                "bytes_sent": f["bytes_sent"],
+                "state": f["state"],
+            }
+            for f in self.files
+        ]
+        out = {
+            "upload_id": self.upload_id,
+            "state": self.state,
+            "bytes_total": sum(f["size"] for f in files),
+            "bytes_sent": sum(f["bytes_sent"] for f in files),
+            "files": files,
+        }
+        if self.state == "done":
+            out["result"] = self.result
+        if self.error:
+            out["error"] = self.error
+        return out
+
+
+class _State:
+    pool: Optional["ThreadPoolExecutor"] = None
+    workers = 4
+    # Cleared when the worker starts shutting down
+    accepting = True
+    max_pending = 64
+    retention = 60 * 60.0
+    spool_root = ""
+
+
+_state = _State()
+_lock = threading.Lock()
+_jobs: Dict[str, Job] = {}
+# Codes handed out in a 202 but not committed yet; code allocation must skip them
+_reserved_codes: set = set()
+_reserved_owner_codes: set = set()
+
+
+def code_reserved(code: str) -> bool:
+    return code in _reserved_codes
+
+
+def owner_code_reserved(owner_code: str) -> bool:
+    return owner_code in _reserved_owner_codes
+
+
+def pending_count() -> int:
+    with _lock:
+        return sum(1 for j in _jobs.values() if j.state not in TERMINAL_STATES)
+
+
+def get_job(upload_id: str) -> Optional[Job]:
+    with _lock:
+        return _jobs.get(upload_id)
+
+
+def _prune(now: float) -> None:
+    for upload_id, job in list(_jobs.items()):
+        if job.finished_at is not None and now - job.finished_at > _state.retention:
+            del _jobs[upload_id]
+
+
+def submit(
+    app,
+    files: List[FileStorage],
+    *,
+    upload_id: str,
+    access_code: str,
+    owner_code: str,
+    expires_at: float,
+    uploaded_at: float,
+) -> Job:
+    """Spool the request's files and queue the transfer; raises QueueFull when saturated."""
+    job = Job(upload_id, access_code, owner_code, expires_at, uploaded_at)
+    with _lock:
+        _prune(time.time())
+        if not _state.accepting:
+            raise QueueFull()
+        if sum(1 for j in _jobs.values() if j.state not in TERMINAL_STATES) >= _state.max_pending:
+            raise QueueFull()
+        _jobs[upload_id] = job
+        _reserved_codes.add(access_code)
+        _reserved_owner_codes.add(owner_code)
+
+    job.spool_dir = os.path.join(_state.spool_root, upload_id)
+    try:
+        os.makedirs(job.spool_dir, exist_ok=True)
+        for idx, f in enumerate(files):
+            path = os.path.join(job.spool_dir, str(idx))
+            f.save(path)
+            job.files.append({
+                "index": idx,
+                "file_id": f"f{idx+1}_{random_token(4)}",
+                "filename": f.filename,
+                # Relative path within a directory upload ("path" is the spool file)
+                "rel_path": f.filename,
+                "mime_type": getattr(f, "mimetype", "") or "",
+                "size": os.path.getsize(path),
+                "bytes_sent": 0,
+                "state": "queued",
+                "path": path,
+            })
+        _pool().submit(_run, app, job)
+    except Exception:
+        _finish(job, "failed", "Failed to spool upload")
+        raise
+    log.info("upload.job.queued", upload_id=upload_id, files=len(job.files))
+    return job
+
+
+def _finish(job: Job, state: str, error: Optional[str] = None) -> None:
+    job.state = state
+    job.error = error
+    job.finished_at = time.time()
+    with _lock:
+        _reserved_codes.discard(job.access_code)
+        _reserved_owner_codes.discard(job.owner_code)
+    shutil.rmtree(job.spool_dir, ignore_errors=True)
+    job.touch()
+
+
+def _run(app, job: Job) -> None:
+    with app.app_context():
+        job.state = "uploading"
+        job.touch()
+        stored = []
+        try:
+            for rec in job.files:
+                rec["state"] = "uploading"
+                job.touch()
+
+                def _progress(n, rec=rec):
+                    rec["bytes_sent"] += n
+                    job.touch()
+
+                with open(rec["path"], "rb") as fh:
+                    fs = FileStorage(
+                        stream=_ProgressReader(fh, _progress),
+                        filename=rec["filename"],
+                        content_type=rec["mime_type"],
+                    )
+                    saved = storage.save_file(fs)
+                stored.append((rec, saved))
+                rec["bytes_sent"] = rec["size"]
+                rec["state"] = "done"
+                metrics.UPLOAD_BYTES.inc(rec["size"])
+                job.touch()
+
+            storage.create_session(
+                access_code=job.access_code,
+                owner_code=job.owner_code,
+                expires_at=job.expires_at,
+                uploaded_at=job.uploaded_at,
+                upload_id=job.upload_id,
+            )
+            for rec, saved in stored:
+                file_id = rec["file_id"]
+                storage.add_file_to_session(
+                    access_code=job.access_code,
+                    file_id=file_id,
+                    original_name=saved["original"],
+                    size_bytes=rec["size"],
+                    mime_type=rec["mime_type"],
+                    cloudinary_public_id=saved.get("public_id"),
+                    resource_type=saved.get("resource_type"),
+                    file_url=saved.get("url"),
+                    path=rec["rel_path"],
+                    previews=saved.get("previews"),
+                )
+                job.result.append({
+                    "file_id": file_id,
+                    "filename": saved["original"],
+                    "size": rec["size"],
+                    "mime_type": rec["mime_type"],
+                })
+        except Exception as e:
+            log.exception("upload.job.failed", upload_id=job.upload_id)
+            for rec in job.files:
+                if rec["state"] != "done":
+                    rec["state"] = "failed"
+            # Nothing was committed; don't leave orphaned assets behind
+            assets = [(s.get("public_id"), s.get("resource_type")) for _rec, s in stored if s.get("public_id")]
+            if assets:
+                try:
+                    get_backend().delete_many(assets)
+                except Exception:
+                    pass
+            _finish(job, "failed", str(e) if isinstance(e, ValueError) else "Failed to save file")
+            return
+        log.info("upload.job.done", upload_id=job.upload_id, access_code=job.access_code, files=len(stored))
+        _finish(job, "done")
+
+
+def stop_accepting() -> None:
+    """Refuse new jobs (503 + Retry-After) from now on; queued and running ones continue."""
+    _state.accepting = False
+
+
+def drain(timeout: float) -> int:
+    """Wait up to timeout seconds for unfinished jobs; returns how many are still unfinished.
+
+    Those are lost: their spool files are removed at the next start.
+    """
+    stop_accepting()
+    deadline = time.monotonic() + max(0.0, timeout)
+    while True:
+        with _lock:
+            active = [j for j in _jobs.values() if j.state not in TERMINAL_STATES]
+        remaining = deadline - time.monotonic()
+        if not active or remaining <= 0:
+            break
+        active[0].wait_for_change(active[0].version, min(0.5, remaining))
+    if _state.pool is not None:
+        _state.pool.shutdown(wait=False)
+    return len(active)
+
+
+def _pool() -> "ThreadPoolExecutor":
+    """The transfer pool, started by the first async upload."""
+    if _state.pool is None:
+        with _lock:
+            if _state.pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                _state.pool = ThreadPoolExecutor(max_workers=_state.workers, thread_name_prefix="upload-job")
+    return _state.pool
+
+
+def init_app(app) -> None:
+    cfg = app.config
+    _state.workers = max(1, int(cfg.get("UPLOAD_JOB_WORKERS", 4)))
+    _state.accepting = True
+    _state.max_pending = int(cfg.get("UPLOAD_JOB_MAX_PENDING", 64))
+    _state.retention = float(cfg.get("UPLOAD_JOB_RETENTION", 60 * 60))
+    _state.spool_root = os.path.join(cfg["UPLOAD_FOLDER"], "spool")
+    # Spooled files of jobs lost to a restart can never complete
+    if os.path.isdir(_state.spool_root):
+        for name in os.listdir(_state.spool_root):
+            if name not in _jobs:
+                shutil.rmtree(os.path.join(_state.spool_root, name), ignore_errors=True)
+
+
+metrics.UPLOAD_JOBS_PENDING.set_function(pending_count)
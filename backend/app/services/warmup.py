@@ -0,0 +1,35 @@
+"""
+Filename: warmup.py
+Purpose: Work a worker does once before it takes traffic (WARMUP_ON_START, or a server hook
+calling warm_up): open the metadata store and code filter, run the expiry sweep, and create
+the storage backend, which imports and configures the cloud SDK. Skipped, each of these is
+paid by the first request after a cold start instead.
+"""
+
+import time
+from . import storage
+from .backends import get_backend
+from .expiry import is_expired
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+
+def warm_up(app) -> dict:
+    """Run the warm-up steps; returns each step's duration in ms. Failures are logged, not raised."""
+    timings = {}
+    steps = (
+        ("metadata", storage.metadata_stats),
+        ("expiry_sweep", lambda: storage.delete_expired_files(is_expired)),
+        ("backend", get_backend),
+    )
+    with app.app_context():
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                log.warning("app.warmup.failed", step=name, error=str(e))
+            timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    log.info("app.warmup", **timings)
+    return timings
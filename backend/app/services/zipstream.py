@@ -0,0 +1,158 @@
+"""
+Filename: zipstream.py
+Purpose: Build a ZIP archive on the fly from stored assets and yield it chunk by chunk.
+Assets are fetched concurrently with a bounded prefetch window and written STORED
+(no recompression), so memory stays bounded regardless of how many files are selected.
+"""
+
+import queue
+import threading
+import time
+import zipfile
+from collections import deque
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+from ..utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Sentinel placed on a file's chunk queue once its body is fully read
+_DONE = object()
+
+
+class ZipEntry(NamedTuple):
+    name: str
+    # Returns an iterator over the asset's bytes (e.g. a bound backend.iter_bytes)
+    source: Callable[[], Iterator[bytes]]
+    size: Optional[int] = None
+    modified_at: Optional[float] = None
+
+
+class _ChunkSink:
+    """Write-only file object collecting zip output until the generator drains it."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data) -> int:
+        self._buf += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+def _put(q: queue.Queue, item, cancel: threading.Event) -> bool:
+    """Blocking put that gives up once the consumer has gone away."""
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _fetch(source: Callable[[], Iterator[bytes]], q: queue.Queue, cancel: threading.Event) -> None:
+    try:
+        for chunk in source():
+            if cancel.is_set() or not _put(q, chunk, cancel):
+                return
+        _put(q, _DONE, cancel)
+    except Exception as e:
+        _put(q, e, cancel)
+
+
+def unique_names(names: Iterable[str]) -> list[str]:
+    """Disambiguate duplicate archive member names: a.png, a (1).png, a (2).png."""
+    seen: set[str] = set()
+    out = []
+    for name in names:
+        candidate = name or "file"
+        if candidate in seen:
+            stem, dot, ext = candidate.rpartition(".")
+            if not dot or not stem:
+                stem, ext = candidate, ""
+            n = 1
+            while True:
+                candidate = f"{stem} ({n}).{ext}" if ext else f"{stem} ({n})"
+                if candidate not in seen:
+                    break
+                n += 1
+        seen.add(candidate)
+        out.append(candidate)
+    return out
+
+
+def stream_zip(
+    entries: Iterable[ZipEntry],
+    *,
+    prefetch: int = 4,
+    queue_chunks: int = 8,
+) -> Iterator[bytes]:
+    """Yield a ZIP archive of the given entries.
+
+    At most `prefetch` assets are in flight at once and each buffers at most
+    `queue_chunks` chunks, so peak memory is ~prefetch * queue_chunks * source chunk size.
+    Assets that fail before sending any bytes are skipped (like allow_missing);
+    a failure mid-body aborts the stream since the member can't be completed.
+    """
+    prefetch = max(1, int(prefetch))
+    sink = _ChunkSink()
+    cancel = threading.Event()
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="zipstream")
+    pending: deque = deque()
+    remaining = iter(entries)
+
+    def _submit_next() -> None:
+        entry = next(remaining, None)
+        if entry is None:
+            return
+        q: queue.Queue = queue.Queue(maxsize=max(1, int(queue_chunks)))
+        pool.submit(_fetch, entry.source, q, cancel)
+        pending.append((entry, q))
+
+    try:
+        for _ in range(prefetch):
+            _submit_next()
+
+        zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        while pending:
+            entry, q = pending.popleft()
+            item = q.get()
+            if isinstance(item, BaseException):
+                log.warning("batch.stream.skipped", name=entry.name, error=str(item))
+                _submit_next()
+                continue
+
+            zinfo = zipfile.ZipInfo(entry.name, date_time=time.localtime(entry.modified_at or time.time())[:6])
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.file_size = int(entry.size or 0)
+            with zf.open(zinfo, mode="w", force_zip64=entry.size is None) as dest:
+                while item is not _DONE:
+                    if isinstance(item, BaseException):
+                        raise item
+                    dest.write(item)
+                    out = sink.drain()
+                    if out:
+                        yield out
+                    item = q.get()
+            # Start the next fetch only once a slot frees up
+            _submit_next()
+            out = sink.drain()
+            if out:
+                yield out
+
+        zf.close()
+        out = sink.drain()
+        if out:
+            yield out
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,160 @@
+"""
+Filename: log.py
+Purpose: Structured, non-blocking logging. Call sites emit named events with fields;
+records are enqueued (QueueHandler) and formatted/written by a background QueueListener,
+so request threads never block on stdout. High-frequency events can be sampled.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+ROOT_LOGGER = "tempshare"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+_init_lock = threading.Lock()
+# event name -> fraction of occurrences kept (missing = keep all)
+_sample_rates: Dict[str, float] = {}
+_dropped = 0
+
+
+class _EnqueueOnlyHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers all formatting to the listener thread and never blocks."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # In-process queue: the record can cross threads as-is, no pre-formatting
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        fields = " ".join(f"{k}={v}" for k, v in (getattr(record, "fields", None) or {}).items())
+        line = f"{ts} {record.levelname} {record.name} {record.getMessage()} {fields}".rstrip()
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+class EventLogger:
+    """Thin wrapper emitting `event` names with keyword fields: log.info("owner.lookup", code=...)."""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, exc_info=None, **fields) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+        if rate is not None:
+            fields["sample_rate"] = rate
+        self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields) -> None:
+        self._log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields) -> None:
+        self._log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self._log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields) -> None:
+        self._log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields) -> None:
+        self._log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> EventLogger:
+    """Logger for a module; pass __name__ (e.g. "app.services.storage")."""
+    short = name.split(".", 1)[1] if name.startswith("app.") else name
+    return EventLogger(logging.getLogger(f"{ROOT_LOGGER}.{short}"))
+
+
+def init_logging(app) -> None:
+    """Attach the queue handler and start the listener thread (once per process)."""
+    global _listener, _handler
+    cfg = app.config
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(getattr(logging, str(cfg.get("LOG_LEVEL", "INFO")).upper(), logging.INFO))
+    _sample_rates.clear()
+    _sample_rates.update(cfg.get("LOG_SAMPLE_RATES") or {})
+
+    with _init_lock:
+        if _listener is not None:
+            return
+        log_queue: queue.Queue = queue.Queue(maxsize=int(cfg.get("LOG_QUEUE_SIZE", 10000)))
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if cfg.get("LOG_JSON", True) else TextFormatter())
+        _handler = _EnqueueOnlyHandler(log_queue)
+        root.addHandler(_handler)
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    with _init_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        if _handler is not None:
+            logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+            logging.getLogger(ROOT_LOGGER).propagate = True
+            _handler = None
+
+
+def _after_fork_in_child() -> None:
+    """The listener thread doesn't survive fork(): a preforked worker gets its own queue and thread."""
+    global _listener, _init_lock
+    _init_lock = threading.Lock()
+    if _listener is None or _handler is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=_handler.queue.maxsize)
+    _handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=False)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def dropped_count() -> int:
+    """Records dropped because the queue was full."""
+    return _dropped
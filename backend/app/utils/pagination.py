@@ -0,0 +1,82 @@
+"""
+Filename: pagination.py
+Purpose: Cursor pagination and field selection for session file listings (?limit=&cursor=&fields=).
+A session's file list is append-only, so the cursor is an offset; it is opaque to clients.
+"""
+
+import base64
+from typing import List, Optional, Sequence, Tuple
+
+FILE_FIELDS = ("file_id", "filename", "path", "size", "mime_type", "download_count")
+_DEFAULTS = {"download_count": 0}
+
+
+def _field(f: dict, name: str):
+    if name == "path":
+        # Records from before paths were kept
+        return f.get("path") or f.get("filename")
+    return f.get(name, _DEFAULTS.get(name))
+
+
+class PageError(ValueError):
+    """Bad pagination arguments; the message is safe to return to the client."""
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        kind, _, value = raw.partition(":")
+        offset = int(value)
+    except (ValueError, UnicodeDecodeError):
+        raise PageError("Invalid cursor")
+    if kind != "o" or offset < 0:
+        raise PageError("Invalid cursor")
+    return offset
+
+
+class Page:
+    """One requested page: where to start, how many, which fields of each file."""
+
+    def __init__(self, offset: int = 0, limit: Optional[int] = None, fields: Sequence[str] = FILE_FIELDS):
+        self.offset = offset
+        self.limit = limit
+        self.fields = tuple(fields)
+
+    @classmethod
+    def from_args(cls, args, *, default_limit: Optional[int] = None, max_limit: int = 1000) -> "Page":
+        """Parse limit/cursor/fields from request args. Without a limit the page is
+        default_limit files (None = everything from the cursor on)."""
+        limit = default_limit
+        raw_limit = args.get("limit")
+        if raw_limit not in (None, ""):
+            try:
+                limit = int(raw_limit)
+            except ValueError:
+                raise PageError("Invalid limit")
+            if limit < 1:
+                raise PageError("Invalid limit")
+        if limit is not None:
+            limit = min(limit, max_limit)
+        cursor = args.get("cursor")
+        offset = decode_cursor(cursor) if cursor else 0
+        fields = FILE_FIELDS
+        raw_fields = args.get("fields")
+        if raw_fields:
+            wanted = [f.strip() for f in raw_fields.split(",") if f.strip()]
+            unknown = [f for f in wanted if f not in FILE_FIELDS]
+            if unknown:
+                raise PageError(f"Unknown fields: {', '.join(unknown)}")
+            # file_id is the key clients page and download by; always included
+            fields = tuple(f for f in FILE_FIELDS if f == "file_id" or f in wanted)
+        return cls(offset, limit, fields)
+
+    def apply(self, files: List[dict]) -> Tuple[List[dict], Optional[str]]:
+        """The page's projected file records and the cursor of the next page (None at the end)."""
+        end = len(files) if self.limit is None else min(len(files), self.offset + self.limit)
+        items = [{name: _field(f, name) for name in self.fields} for f in files[self.offset:end]]
+        next_cursor = encode_cursor(end) if end < len(files) else None
+        return items, next_cursor
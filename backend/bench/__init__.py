@@ -0,0 +1,5 @@
+"""
+Filename: __init__.py
+Purpose: Benchmark / load-test harness: a local Cloudinary stand-in and scenario runner
+that drive the real app (create_app). Run from backend/: python -m bench.run --help
+"""
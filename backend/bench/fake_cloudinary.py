@@ -0,0 +1,380 @@
+"""
+Filename: fake_cloudinary.py
+Purpose: Local HTTP stand-in for the Cloudinary APIs the app uses (upload, destroy,
+delete_resources, generate_archive, resource details and listing) plus asset delivery, with configurable
+latency. Uploads must carry a valid request signature, as with Cloudinary. Point the SDK at
+it with FakeCloudinary.configure_sdk().
+"""
+
+import email.parser
+import email.policy
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import random
+import re
+import secrets
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+API_SECRET = "bench-secret"
+API_KEY = "bench-key"
+CLOUD_NAME = "bench"
+
+
+def response_signature(public_id: str, version: int, secret: str = API_SECRET) -> str:
+    """Signature Cloudinary attaches to upload responses (public_id + version + secret)."""
+    return hashlib.sha1(f"public_id={public_id}&version={version}{secret}".encode()).hexdigest()
+
+
+# Upload parameters Cloudinary leaves out of the request signature
+_UNSIGNED = ("file", "cloud_name", "resource_type", "api_key", "signature")
+# Signed upload requests are accepted for this long after their timestamp
+_SIGNATURE_MAX_AGE = 60 * 60
+
+
+def request_signature(params: Dict[str, str], secret: str = API_SECRET) -> str:
+    """Signature of upload parameters: sha1 over sorted "key=value" pairs plus the secret."""
+    to_sign = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if k not in _UNSIGNED and v not in (None, ""))
+    return hashlib.sha1(f"{to_sign}{secret}".encode()).hexdigest()
+
+
+# A delivery URL path segment like "c_limit,w_320,h_320"
+_TRANSFORMATION = re.compile(r"^[a-z]{1,3}_[^,/]+(,[a-z]{1,3}_[^,/]+)*$")
+
+_MAGIC = (
+    (b"\x89PNG", "image", ".png"),
+    (b"\xff\xd8\xff", "image", ".jpg"),
+    (b"GIF8", "image", ".gif"),
+)
+
+
+def _detect(filename: str, data: bytes) -> Tuple[str, str]:
+    """(resource_type, extension) the way Cloudinary does it: content first, then the filename."""
+    for magic, rtype, ext in _MAGIC:
+        if data.startswith(magic):
+            return rtype, ext
+    if data[4:8] == b"ftyp":
+        return "video", ".mp4"
+    ext = os.path.splitext(filename)[1]
+    mime = mimetypes.guess_type(filename)[0] or ""
+    if mime.startswith("image/"):
+        return "image", ext
+    if mime.startswith("video/") or mime.startswith("audio/"):
+        return "video", ext
+    return "raw", ext
+
+
+class FakeCloudinary:
+    """In-memory asset store behind a threaded HTTP server."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, keep_bytes: bool = True):
+        self.latency = latency
+        self.jitter = jitter
+        self.keep_bytes = keep_bytes
+        self.lock = threading.Lock()
+        # (resource_type, public_id) -> {"bytes": int, "data": bytes|None, "ext": str, "created_at": float}
+        self.assets: Dict[Tuple[str, str], dict] = {}
+        self.calls: Dict[str, int] = {}
+        # While set, bulk deletes answer 420 like an exhausted Admin API hourly quota
+        self.admin_rate_limited = False
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeCloudinary":
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-cloudinary", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def configure_sdk(self) -> None:
+        import cloudinary  # type: ignore
+
+        host, port = self.server.server_address[:2]
+        # API calls go to upload_prefix; SDK-built delivery URLs to the cname (no cloud segment)
+        cloudinary.config(
+            cloud_name=CLOUD_NAME,
+            api_key=API_KEY,
+            api_secret=API_SECRET,
+            upload_prefix=self.url,
+            secure=False,
+            cname=f"{host}:{port}",
+            private_cdn=True,
+        )
+        os.environ["CLOUDINARY_CLOUD_NAME"] = CLOUD_NAME
+
+    def _count(self, op: str) -> None:
+        with self.lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+
+    def _delay(self) -> None:
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_args):
+                pass
+
+            def _send_json(self, payload: dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_bytes(self, data: bytes, content_type: str, status: int = 200, extra=None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Accept-Ranges", "bytes")
+                for k, v in (extra or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def _read_params(self) -> Tuple[Dict[str, list], Dict[str, bytes]]:
+                """Query string + form/multipart/JSON body as {name: [values]}, plus uploaded files."""
+                parsed = urlparse(self.path)
+                params = {k: v for k, v in parse_qs(parsed.query).items()}
+                files: Dict[str, bytes] = {}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                ctype = self.headers.get("Content-Type", "")
+                if ctype.startswith("multipart/form-data"):
+                    msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                        f"Content-Type: {ctype}\r\n\r\n".encode() + body
+                    )
+                    for part in msg.iter_parts():
+                        name = part.get_param("name", header="content-disposition")
+                        filename = part.get_filename()
+                        payload = part.get_payload(decode=True) or b""
+                        if filename is not None:
+                            files[filename or "file"] = payload
+                        else:
+                            params.setdefault(name, []).append(payload.decode())
+                elif ctype.startswith("application/json") and body:
+                    for k, v in json.loads(body).items():
+                        params[k] = v if isinstance(v, list) else [v]
+                elif body:
+                    for k, v in parse_qs(body.decode()).items():
+                        params.setdefault(k, []).extend(v)
+                return params, files
+
+            def do_POST(self):
+                fake._delay()
+                parts = urlparse(self.path).path.strip("/").split("/")
+                # /v1_1/<cloud>/<resource_type>/<action>
+                if len(parts) == 4 and parts[0] == "v1_1":
+                    _v, _cloud, rtype, action = parts
+                    params, files = self._read_params()
+                    if action == "upload":
+                        return self._upload(rtype, params, files)
+                    if action == "destroy":
+                        return self._destroy(rtype, params)
+                    if action == "generate_archive":
+                        fake._count("generate_archive")
+                        return self._send_json({"secure_url": f"{fake.url}/archives/{secrets.token_hex(8)}.zip"})
+                self._send_json({"error": {"message": "unknown endpoint"}}, status=404)
+
+            def do_DELETE(self):
+                fake._delay()
+                parts = urlparse(self.path).path.strip("/").split("/")
+                # /v1_1/<cloud>/resources/<resource_type>/upload
+                if len(parts) == 5 and parts[2] == "resources":
+                    params, _files = self._read_params()
+                    if fake.admin_rate_limited:
+                        fake._count("delete_resources_limited")
+                        return self._send_json({"error": {"message": "Rate Limit Exceeded"}}, status=420)
+                    ids = params.get("public_ids[]") or params.get("public_ids") or []
+                    deleted = {}
+                    with fake.lock:
+                        for pid in ids:
+                            deleted[pid] = "deleted" if fake.assets.pop((parts[3], pid), None) else "not_found"
+                    fake._count("delete_resources")
+                    return self._send_json({"deleted": deleted, "partial": False})
+                self._send_json({"error": {"message": "unknown endpoint"}}, status=404)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip("/").split("/")
+                if len(parts) == 4 and parts[0] == "v1_1" and parts[3] == "generate_archive":
+                    fake._delay()
+                    fake._count("generate_archive")
+                    return self._archive(parse_qs(parsed.query))
+                # Admin API listing: /v1_1/<cloud>/resources/<resource_type>/upload?prefix=&next_cursor=
+                if len(parts) == 5 and parts[0] == "v1_1" and parts[2] == "resources" and parts[4] == "upload":
+                    fake._delay()
+                    fake._count("resources")
+                    return self._list(parts[3], parse_qs(parsed.query))
+                # Admin API: /v1_1/<cloud>/resources/<resource_type>/upload/<public_id>
+                if len(parts) >= 6 and parts[0] == "v1_1" and parts[2] == "resources" and parts[4] == "upload":
+                    fake._delay()
+                    fake._count("resource")
+                    return self._resource(parts[3], "/".join(parts[5:]))
+                # Delivery: /<resource_type>/upload/[flags/][v123/]<public_id>[.ext]
+                if len(parts) >= 3 and parts[1] == "upload":
+                    return self._deliver(parts[0], parts[2:])
+                self._send_json({"error": {"message": "not found"}}, status=404)
+
+            do_HEAD = do_GET
+
+            def _upload(self, rtype: str, params: Dict[str, list], files: Dict[str, bytes]) -> None:
+                fake._count("upload")
+                flat = {k: v[0] for k, v in params.items() if v}
+                if flat.get("api_key") != API_KEY:
+                    return self._send_json({"error": {"message": "Unknown API key"}}, status=401)
+                if flat.get("signature") != request_signature(flat):
+                    return self._send_json({"error": {"message": "Invalid Signature"}}, status=401)
+                if abs(time.time() - int(flat.get("timestamp") or 0)) > _SIGNATURE_MAX_AGE:
+                    return self._send_json({"error": {"message": "Stale request"}}, status=400)
+                filename, data = next(iter(files.items()), ("file", b""))
+                folder = (params.get("folder") or [""])[0]
+                given = (params.get("public_id") or [None])[0]
+                stem = os.path.splitext(filename)[0]
+                detected, ext = _detect(filename, data)
+                rt = detected if rtype == "auto" else rtype
+                token = given or secrets.token_hex(10)
+                public_id = f"{folder}/{token}" if folder else token
+                if rt == "raw" and not given:
+                    public_id, ext = f"{public_id}{ext}", ""
+                elif rt == "raw":
+                    ext = ""
+                version = int(time.time())
+                with fake.lock:
+                    fake.assets[(rt, public_id)] = {
+                        "bytes": len(data),
+                        "data": data if fake.keep_bytes else None,
+                        "ext": ext,
+                        "created_at": time.time(),
+                    }
+                response = {
+                    "public_id": public_id,
+                    "version": version,
+                    "signature": response_signature(public_id, version),
+                    "resource_type": rt,
+                    "type": "upload",
+                    "bytes": len(data),
+                    "format": ext.lstrip("."),
+                    "secure_url": f"{fake.url}/{rt}/upload/v{version}/{public_id}{ext}",
+                    "url": f"{fake.url}/{rt}/upload/v{version}/{public_id}{ext}",
+                    "original_filename": stem,
+                }
+                if flat.get("eager"):
+                    # Derivatives are "rendered" from the original at delivery, see _deliver
+                    response["eager"] = [
+                        {"transformation": item, "secure_url": f"{fake.url}/{rt}/upload/{item}/v{version}/{public_id}"}
+                        for item in flat["eager"].split("|")
+                    ]
+                self._send_json(response)
+
+            def _resource(self, rtype: str, public_id: str) -> None:
+                with fake.lock:
+                    asset = fake.assets.get((rtype, public_id))
+                if asset is None:
+                    return self._send_json({"error": {"message": f"Resource not found - {public_id}"}}, status=404)
+                self._send_json({
+                    "public_id": public_id,
+                    "resource_type": rtype,
+                    "type": "upload",
+                    "bytes": asset["bytes"],
+                    "format": asset["ext"].lstrip("."),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(asset["created_at"])),
+                })
+
+            def _list(self, rtype: str, query: Dict[str, list]) -> None:
+                # Ordered by public_id; the cursor is the last public_id of the previous page
+                prefix = (query.get("prefix") or [""])[0]
+                after = (query.get("next_cursor") or [""])[0]
+                limit = int((query.get("max_results") or ["10"])[0])
+                with fake.lock:
+                    matching = sorted(
+                        (pid, asset) for (rt, pid), asset in fake.assets.items()
+                        if rt == rtype and pid.startswith(prefix) and pid > after
+                    )
+                page = matching[:limit]
+                payload = {"resources": [
+                    {
+                        "public_id": pid,
+                        "resource_type": rtype,
+                        "type": "upload",
+                        "bytes": asset["bytes"],
+                        "format": asset["ext"].lstrip("."),
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(asset["created_at"])),
+                    }
+                    for pid, asset in page
+                ]}
+                if len(matching) > limit:
+                    payload["next_cursor"] = page[-1][0]
+                self._send_json(payload)
+
+            def _destroy(self, rtype: str, params: Dict[str, list]) -> None:
+                fake._count("destroy")
+                public_id = (params.get("public_id") or [""])[0]
+                with fake.lock:
+                    found = fake.assets.pop((rtype, public_id), None)
+                self._send_json({"result": "ok" if found else "not found"})
+
+            def _archive(self, query: Dict[str, list]) -> None:
+                buf = io.BytesIO()
+                with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+                    for fq in query.get("fully_qualified_public_ids[]", []):
+                        rt, _type, pid = fq.split("/", 2)
+                        with fake.lock:
+                            asset = fake.assets.get((rt, pid))
+                        if asset is not None:
+                            zf.writestr(os.path.basename(pid) + asset["ext"], asset["data"] or b"")
+                self._send_bytes(buf.getvalue(), "application/zip")
+
+            def _deliver(self, rtype: str, rest: list) -> None:
+                # Flags and transformations are ignored: every derivative is the original
+                rest = [p for p in rest if not p.startswith("fl_")]
+                if rest and _TRANSFORMATION.match(rest[0]):
+                    fake._count("derivative")
+                while rest and _TRANSFORMATION.match(rest[0]):
+                    rest = rest[1:]
+                if rest and rest[0][:1] == "v" and rest[0][1:].isdigit():
+                    rest = rest[1:]
+                path = "/".join(rest)
+                with fake.lock:
+                    asset = fake.assets.get((rtype, path))
+                    if asset is None:
+                        stem, _ext = os.path.splitext(path)
+                        asset = fake.assets.get((rtype, stem))
+                if asset is None:
+                    return self._send_json({"error": {"message": "not found"}}, status=404)
+                data = asset["data"] if asset["data"] is not None else b"\0" * asset["bytes"]
+                rng = self.headers.get("Range")
+                if rng and rng.startswith("bytes="):
+                    start_s, _, end_s = rng[6:].partition("-")
+                    start = int(start_s or 0)
+                    end = int(end_s) if end_s else len(data) - 1
+                    chunk = data[start:end + 1]
+                    return self._send_bytes(
+                        chunk, "application/octet-stream", status=206,
+                        extra={"Content-Range": f"bytes {start}-{start + len(chunk) - 1}/{len(data)}"},
+                    )
+                self._send_bytes(data, "application/octet-stream")
+
+        return Handler
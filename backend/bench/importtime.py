@@ -0,0 +1,132 @@
+"""
+Filename: importtime.py
+Purpose: Cold-start gate. Imports the app and runs create_app (warm-up off) in a fresh
+interpreter under `python -X importtime`, reports the total import time and the slowest
+imports, and fails when a module that should load lazily shows up at startup or when the
+total regresses against a saved baseline.
+
+Usage (from backend/):
+    python -m bench.importtime
+    python -m bench.importtime --save-baseline bench/baselines/importtime.json
+    python -m bench.importtime --baseline bench/baselines/importtime.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import List, Tuple
+
+# Loaded on first use, never by create_app
+LAZY_MODULES = (
+    "cloudinary",
+    "sqlite3",
+    "cProfile",
+    "pstats",
+    "concurrent.futures",
+    "urllib.request",
+)
+
+_SNIPPET = """
+from app import create_app
+from app.config import DevelopmentConfig
+
+class Config(DevelopmentConfig):
+    UPLOAD_FOLDER = {folder!r}
+    WARMUP_ON_START = False
+
+create_app(Config)
+"""
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, depth) for each line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # the header line
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((stripped, int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def measure(workdir: str) -> List[Tuple[str, int, int, int]]:
+    code = _SNIPPET.format(folder=workdir)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=_BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"create_app failed:\n{proc.stderr[-2000:]}")
+    return parse(proc.stderr)
+
+
+def summarize(rows: List[Tuple[str, int, int, int]], top: int) -> dict:
+    # Top-level rows carry the cumulative time of everything beneath them; interpreter
+    # startup (site, encodings) is not ours to gate
+    roots = [r for r in rows if r[3] == 0 and (r[0] == "app" or r[0].startswith("app."))]
+    total_us = sum(r[2] for r in roots)
+    app_us = sum(r[1] for r in rows if r[0] == "app" or r[0].startswith("app."))
+    slowest = sorted(roots, key=lambda r: r[2], reverse=True)[:top]
+    loaded = {r[0] for r in rows}
+    return {
+        "total_ms": round(total_us / 1000, 2),
+        "app_self_ms": round(app_us / 1000, 2),
+        "modules": len(rows),
+        "slowest": [{"module": name, "cumulative_ms": round(cum / 1000, 2)} for name, _s, cum, _d in slowest],
+        "eager_lazy_modules": sorted(m for m in LAZY_MODULES if m in loaded),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters; the fastest run is reported")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--baseline", help="JSON from --save-baseline to compare total_ms against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    parser.add_argument("--save-baseline")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="importtime-")
+    runs = [summarize(measure(workdir), args.top) for _ in range(max(1, args.runs))]
+    best = min(runs, key=lambda r: r["total_ms"])
+
+    print(f"import + create_app: {best['total_ms']} ms ({best['modules']} modules, app code {best['app_self_ms']} ms self)")
+    print(f"{'module':<40} {'cumulative ms':>14}")
+    for row in best["slowest"]:
+        print(f"{row['module']:<40} {row['cumulative_ms']:>14}")
+
+    failed = False
+    if best["eager_lazy_modules"]:
+        print(f"FAIL: imported at startup but should load lazily: {', '.join(best['eager_lazy_modules'])}")
+        failed = True
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        limit = baseline["total_ms"] * (1 + args.tolerance)
+        if best["total_ms"] > limit:
+            print(f"FAIL: {best['total_ms']} ms exceeds baseline {baseline['total_ms']} ms +{args.tolerance:.0%}")
+            failed = True
+        else:
+            print(f"ok: within {args.tolerance:.0%} of baseline {baseline['total_ms']} ms")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(best, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,479 @@
+"""
+Filename: run.py
+Purpose: Drive the real app (create_app) against the fake Cloudinary with realistic request
+mixes, report throughput and p50/p95/p99 per endpoint, and compare with a saved baseline.
+
+Usage (from backend/):
+    python -m bench.run                                   # all scenarios
+    python -m bench.run --scenarios download_storm --latency 0.02
+    python -m bench.run --save-baseline bench/baselines/local.json
+    python -m bench.run --baseline bench/baselines/local.json --tolerance 0.25
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .fake_cloudinary import FakeCloudinary
+
+# Sent to the /__debug__ routes, which the bench app (DEBUG off) otherwise hides
+_DEBUG_TOKEN = "bench-debug-token"
+SCENARIOS = ("upload_mix", "direct_upload", "download_storm", "owner_poll", "batch_stream", "mass_expiry")
+
+
+# --- Recording ----------------------------------------------------------------
+
+class Recorder:
+    """Per-endpoint latency samples and error counts for one scenario."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, wall: float) -> Dict[str, dict]:
+        out = {}
+        for endpoint, values in sorted(self.samples.items()):
+            values = sorted(values)
+            out[endpoint] = {
+                "count": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(values) / wall, 2) if wall > 0 else 0.0,
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            }
+        return out
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+# --- HTTP client --------------------------------------------------------------
+
+class Client:
+    """Minimal keep-alive client (one connection per thread); never follows redirects."""
+
+    def __init__(self, host: str, port: int, recorder: Recorder):
+        self.host = host
+        self.port = port
+        self.recorder = recorder
+        self._local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return conn
+
+    def request(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[dict] = None,
+        expect: Tuple[int, ...] = (),
+    ) -> Tuple[int, bytes]:
+        start = time.perf_counter()
+        status, data = 0, b""
+        for attempt in range(2):
+            conn = self._conn()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                data = resp.read()
+                status = resp.status
+                break
+            except (http.client.HTTPException, OSError):
+                # Stale keep-alive connection: reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    status = 0
+        ok = status in expect or 200 <= status < 400
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return status, data
+
+    def json(self, endpoint: str, method: str, path: str, **kwargs) -> Tuple[int, dict]:
+        status, data = self.request(endpoint, method, path, **kwargs)
+        try:
+            return status, json.loads(data or b"{}")
+        except ValueError:
+            return status, {}
+
+
+def _multipart(
+    files: List[Tuple[str, bytes, str]], field: str = "files", fields: Optional[dict] = None
+) -> Tuple[bytes, dict]:
+    boundary = uuid.uuid4().hex
+    parts = [
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode()
+        for name, value in (fields or {}).items()
+    ]
+    for filename, data, mimetype in files:
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {mimetype}\r\n\r\n".encode() + data + b"\r\n"
+        )
+    body = b"".join(parts) + f"--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}", "Content-Length": str(len(body))}
+
+
+# (name, mimetype, max size, leading magic bytes so the stand-in detects the type like Cloudinary)
+_KINDS = (
+    ("photo.png", "image/png", 200 * 1024, b"\x89PNG\r\n\x1a\n"),
+    ("notes.txt", "text/plain", 8 * 1024, b""),
+    ("report.pdf", "application/pdf", 600 * 1024, b"%PDF-1.4\n"),
+    ("clip.mp4", "video/mp4", 2 * 1024 * 1024, b"\x00\x00\x00\x18ftypmp42"),
+)
+
+
+def _random_files(rng: random.Random, count: int, prefix: str = "") -> List[Tuple[str, bytes, str]]:
+    out = []
+    for i in range(count):
+        name, mime, size, magic = rng.choice(_KINDS)
+        stem, ext = os.path.splitext(name)
+        out.append((f"{prefix}{stem}_{i}{ext}", magic + os.urandom(rng.randint(size // 4, size)), mime))
+    return out
+
+
+def _upload(client: Client, files: List[Tuple[str, bytes, str]]) -> Optional[dict]:
+    body, headers = _multipart(files)
+    status, payload = client.json("POST /upload", "POST", "/upload", body=body, headers=headers)
+    if status != 201:
+        return None
+    return payload.get("data") or payload
+
+
+# --- Scenarios ----------------------------------------------------------------
+
+def _run_pool(concurrency: int, total: int, task: Callable[[int], None]) -> None:
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        list(pool.map(task, range(total)))
+
+
+def upload_mix(client: Client, ctx: dict, args) -> None:
+    """Single files, multi-file selections and directory uploads."""
+    rng = random.Random(args.seed)
+
+    def task(i: int) -> None:
+        roll = rng.random()
+        if roll < 0.5:
+            files = _random_files(rng, 1)
+        elif roll < 0.85:
+            files = _random_files(rng, rng.randint(2, 6))
+        else:
+            files = _random_files(rng, rng.randint(5, 15), prefix=f"album_{i}/")
+        session = _upload(client, files)
+        if session:
+            ctx["sessions"].append(session)
+
+    _run_pool(args.concurrency, args.uploads, task)
+
+
+def direct_upload(client: Client, ctx: dict, args) -> None:
+    """Same mix as upload_mix via /upload/sign + /upload/commit: bytes go straight to the stand-in."""
+    rng = random.Random(args.seed)
+    local = threading.local()
+
+    def provider() -> http.client.HTTPConnection:
+        if getattr(local, "conn", None) is None:
+            host, port = ctx["fake"].server.server_address[:2]
+            local.conn = http.client.HTTPConnection(host, port, timeout=60)
+        return local.conn
+
+    def task(i: int) -> None:
+        roll = rng.random()
+        if roll < 0.5:
+            files = _random_files(rng, 1)
+        elif roll < 0.85:
+            files = _random_files(rng, rng.randint(2, 6))
+        else:
+            files = _random_files(rng, rng.randint(5, 15), prefix=f"album_{i}/")
+        declared = [{"filename": name, "size": len(data), "mime_type": mime} for name, data, mime in files]
+        body = json.dumps({"files": declared}).encode()
+        status, payload = client.json(
+            "POST /upload/sign", "POST", "/upload/sign", body=body, headers={"Content-Type": "application/json"}
+        )
+        if status != 200:
+            return
+        signed = payload["data"]
+        results = []
+        for entry, (name, data, mime) in zip(signed["files"], files):
+            mp_body, headers = _multipart([(os.path.basename(name), data, mime)], field="file", fields=entry["fields"])
+            start = time.perf_counter()
+            conn = provider()
+            conn.request("POST", entry["upload_url"], body=mp_body, headers=headers)
+            resp = conn.getresponse()
+            result = json.loads(resp.read() or b"{}")
+            client.recorder.record("POST <provider>/upload (direct)", time.perf_counter() - start, resp.status == 200)
+            results.append({"index": entry["index"], **result})
+        body = json.dumps({"token": signed["token"], "files": results}).encode()
+        status, payload = client.json(
+            "POST /upload/commit", "POST", "/upload/commit", body=body, headers={"Content-Type": "application/json"}
+        )
+        if status == 201:
+            ctx["sessions"].append(payload.get("data") or payload)
+
+    _run_pool(args.concurrency, args.uploads, task)
+
+
+def _ensure_sessions(client: Client, ctx: dict, args, minimum: int) -> None:
+    rng = random.Random(args.seed + 1)
+    while len(ctx["sessions"]) < minimum:
+        session = _upload(client, _random_files(rng, rng.randint(1, 3)))
+        if session is None:
+            raise RuntimeError("upload failed while seeding sessions")
+        ctx["sessions"].append(session)
+
+
+def download_storm(client: Client, ctx: dict, args) -> None:
+    """Hot-link storm: most hits go to a handful of shared links (Zipf-like)."""
+    _ensure_sessions(client, ctx, args, 10)
+    rng = random.Random(args.seed + 2)
+    hot = ctx["sessions"][: max(1, len(ctx["sessions"]) // 10)]
+    pool = ctx["sessions"]
+
+    def task(_i: int) -> None:
+        session = rng.choice(hot) if rng.random() < 0.8 else rng.choice(pool)
+        code = session["access_code"]
+        roll = rng.random()
+        if roll < 0.2:
+            client.request("GET /access/<code>", "GET", f"/access/{code}")
+        elif roll < 0.9:
+            f = rng.choice(session["files"])
+            client.request("GET /download/<code>/<file_id>", "GET", f"/download/{code}/{f['file_id']}")
+        else:
+            previewable = [f for f in session["files"] if not f["mime_type"].startswith("text/")]
+            if previewable:
+                f = rng.choice(previewable)
+                client.request("GET /preview/<code>/<file_id>", "GET", f"/preview/{code}/{f['file_id']}")
+
+    _run_pool(args.concurrency, args.requests, task)
+
+
+def owner_poll(client: Client, ctx: dict, args) -> None:
+    """Owners refreshing their dashboard; a slice of lookups use unknown codes."""
+    _ensure_sessions(client, ctx, args, 10)
+    rng = random.Random(args.seed + 3)
+    owners = [s["owner_code"] for s in ctx["sessions"]]
+
+    def task(_i: int) -> None:
+        code = rng.choice(owners) if rng.random() < 0.9 else secrets.token_hex(6).upper()
+        status, _data = client.request("GET /owner/<owner_code>", "GET", f"/owner/{code}", expect=(404,))
+        if status == 404 and code in owners:
+            client.recorder.record("GET /owner/<owner_code> (lost)", 0.0, False)
+
+    _run_pool(args.concurrency, args.requests, task)
+
+
+def batch_stream(client: Client, ctx: dict, args) -> None:
+    """Whole sessions as streamed batch ZIPs (mode=stream); the app fetches every asset from the
+    stand-in over HTTP. A ZIP that doesn't open or misses members counts as an error."""
+    _ensure_sessions(client, ctx, args, 10)
+    rng = random.Random(args.seed + 4)
+    sessions = [s for s in ctx["sessions"] if len(s["files"]) > 1] or ctx["sessions"]
+
+    def task(_i: int) -> None:
+        session = rng.choice(sessions)
+        body = json.dumps({
+            "access_code": session["access_code"],
+            "file_ids": [f["file_id"] for f in session["files"]],
+            "mode": "stream",
+        }).encode()
+        status, data = client.request(
+            "POST /download/batch (stream)", "POST", "/download/batch",
+            body=body, headers={"Content-Type": "application/json"},
+        )
+        if status != 200:
+            return
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                ok = zf.testzip() is None and len(zf.namelist()) == len(session["files"])
+        except zipfile.BadZipFile:
+            ok = False
+        if not ok:
+            client.recorder.record("POST /download/batch (stream, corrupt)", 0.0, False)
+
+    _run_pool(args.concurrency, max(1, args.requests // 20), task)
+
+
+def mass_expiry(client: Client, ctx: dict, args) -> None:
+    """Expire every live session at once and time the sweep plus the first requests after it."""
+    _ensure_sessions(client, ctx, args, 20)
+    app = ctx["app"]
+    from app.services import storage
+
+    with app.app_context():
+        for code in list(storage.list_access_codes()):
+            storage.set_session_expiry(code, 0)
+    client.json(
+        "POST /__debug__/force-expiry", "POST", "/__debug__/force-expiry", headers={"X-Debug-Token": _DEBUG_TOKEN}
+    )
+    for session in ctx["sessions"][:50]:
+        client.request("GET /access/<code> (expired)", "GET", f"/access/{session['access_code']}", expect=(404, 410))
+    ctx["sessions"].clear()
+
+
+# --- Runner -------------------------------------------------------------------
+
+def _bench_config(upload_folder: str):
+    from app.config import DevelopmentConfig
+
+    class BenchConfig(DevelopmentConfig):
+        DEBUG = False
+        UPLOAD_FOLDER = upload_folder
+        STORAGE_BACKEND = "cloudinary"
+        LOG_LEVEL = "WARNING"
+        # One client IP generates all the load; measure the app, not the limiter
+        RATE_LIMIT_ENABLED = False
+        SCAN_GUARD_ENABLED = False
+        DEBUG_ROUTES_TOKEN = _DEBUG_TOKEN
+
+    return BenchConfig
+
+
+def run(args) -> dict:
+    fake = FakeCloudinary(latency=args.latency, jitter=args.jitter).start()
+    fake.configure_sdk()
+    workdir = tempfile.mkdtemp(prefix="tempshare-bench-")
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *_args, **_kwargs):
+            pass
+
+    app = create_app(_bench_config(workdir))
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+
+    results: Dict[str, dict] = {}
+    ctx = {"app": app, "fake": fake, "sessions": []}
+    try:
+        for name in args.scenarios:
+            recorder = Recorder()
+            client = Client("127.0.0.1", server.server_port, recorder)
+            start = time.perf_counter()
+            globals()[name](client, ctx, args)
+            wall = time.perf_counter() - start
+            results[name] = {"wall_s": round(wall, 3), "endpoints": recorder.summary(wall)}
+    finally:
+        server.shutdown()
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "concurrency": args.concurrency,
+            "uploads": args.uploads,
+            "requests": args.requests,
+            "seed": args.seed,
+            "fake_calls": dict(fake.calls),
+        },
+        "scenarios": results,
+    }
+
+
+def print_report(report: dict) -> None:
+    header = f"{'endpoint':<40} {'count':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    for name, result in report["scenarios"].items():
+        print(f"\n== {name} ({result['wall_s']}s)")
+        print(header)
+        for endpoint, s in result["endpoints"].items():
+            print(
+                f"{endpoint:<40} {s['count']:>7} {s['errors']:>5} {s['rps']:>9} "
+                f"{s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}"
+            )
+    print(f"\nfake cloudinary calls: {report['meta']['fake_calls']}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions: p95 slower or throughput lower than baseline by more than `tolerance`."""
+    problems = []
+    for name, result in report["scenarios"].items():
+        base_endpoints = (baseline.get("scenarios", {}).get(name) or {}).get("endpoints", {})
+        for endpoint, s in result["endpoints"].items():
+            b = base_endpoints.get(endpoint)
+            if not b:
+                continue
+            if b["p95_ms"] > 0 and s["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+                problems.append(f"{name} {endpoint}: p95 {b['p95_ms']}ms -> {s['p95_ms']}ms")
+            if b["rps"] > 0 and s["rps"] < b["rps"] * (1 - tolerance):
+                problems.append(f"{name} {endpoint}: rps {b['rps']} -> {s['rps']}")
+            if s["errors"] > b["errors"]:
+                problems.append(f"{name} {endpoint}: errors {b['errors']} -> {s['errors']}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="TempShare load test against a local Cloudinary stand-in")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.01, help="fake Cloudinary latency per API call (s)")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--uploads", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the full report to this path")
+    parser.add_argument("--save-baseline", help="write the report as a baseline JSON file")
+    parser.add_argument("--baseline", help="compare against this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.tolerance)
+        if problems:
+            print("\nREGRESSIONS:")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print("\nno regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
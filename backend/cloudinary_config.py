@@ -1,12 +0,0 @@
-"""
-Cloudinary configuration for cloud file storage.
-"""
-import cloudinary
-import os
-
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
@@ -0,0 +1,63 @@
+"""
+Filename: gunicorn.conf.py
+Purpose: Production server settings (gunicorn -c gunicorn.conf.py, from backend/).
+
+Sessions, upload jobs, event streams and caches live in the worker process, so the app runs
+as a single worker with a thread pool by default; WEB_CONCURRENCY > 1 is only correct once
+that state is shared. The app is imported and warmed up once in the master (preload_app), so
+a worker, including one that replaces a crashed worker, forks with modules, config and the
+storage SDK already loaded. Stopping (SIGTERM) ends event streams and refuses async uploads
+at once, then waits for open requests and in-flight uploads and writes metadata before the
+worker exits.
+"""
+
+import os
+import signal
+
+_CPUS = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+wsgi_app = "wsgi:app"
+preload_app = True
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Uploads and downloads block on the storage provider, event streams hold a thread each
+threads = int(os.getenv("GUNICORN_THREADS", str(min(64, max(16, 8 * _CPUS)))))
+# Large uploads and zip downloads stream for a while; the worker still heartbeats meanwhile
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = None  # requests are logged by the app (app.utils.log)
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def _app(worker):
+    return worker.app.wsgi()
+
+
+def post_fork(server, worker):
+    # The metadata store and the log listener re-open themselves in the child
+    # (os.register_at_fork); warm up again so the first request pays nothing
+    from app.services.warmup import warm_up
+    warm_up(_app(worker))
+
+
+def post_worker_init(worker):
+    from app.services import shutdown
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_term(signum, frame):
+        shutdown.begin()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_term)
+
+
+def worker_exit(server, worker):
+    from app.services import shutdown
+    shutdown.drain(_app(worker))
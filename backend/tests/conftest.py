@@ -0,0 +1,157 @@
+"""
+Filename: conftest.py
+Purpose: Shared fixtures: the app built against the fake Cloudinary (bench/fake_cloudinary.py) or
+the local backend, and a plain HTTP asset host for file records that point at arbitrary URLs.
+
+All apps in a run share one UPLOAD_FOLDER: the metadata store is process-wide, like in a worker.
+Run from backend/: python -m pytest -q
+"""
+
+import io
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import pytest
+
+from app import create_app
+from app.config import DevelopmentConfig
+from bench.fake_cloudinary import FakeCloudinary
+
+
+@pytest.fixture(scope="session")
+def fake():
+    fake = FakeCloudinary().start()
+    fake.configure_sdk()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(scope="session")
+def upload_folder(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("uploads"))
+
+
+@pytest.fixture
+def make_app(fake, upload_folder):
+    """create_app with test settings; keyword arguments override config attributes."""
+
+    def _make(**overrides):
+        attrs = {
+            "DEBUG": False,
+            "TESTING": True,
+            "UPLOAD_FOLDER": upload_folder,
+            "LOG_LEVEL": "WARNING",
+            "RATE_LIMIT_ENABLED": False,
+            "SCAN_GUARD_ENABLED": False,
+            "WARMUP_ON_START": False,
+        }
+        attrs.update(overrides)
+        return create_app(type("TestConfig", (DevelopmentConfig,), attrs))
+
+    return _make
+
+
+def upload(client, files: List[Tuple[str, bytes]], **query) -> dict:
+    """POST /upload with (name, data) pairs; returns the response's data."""
+    resp = client.post(
+        "/upload",
+        query_string=query,
+        data={"file": [(io.BytesIO(data), name) for name, data in files]},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code in (201, 202), resp.get_json()
+    return resp.get_json()["data"]
+
+
+def make_session(app, files: List[dict]) -> str:
+    """A live session whose file records are given directly ({"filename", "size", and
+    "url" and/or "public_id"}); returns its access code."""
+    from app.services import storage
+
+    code = "T" + secrets.token_hex(3).upper()
+    now = time.time()
+    with app.app_context():
+        storage.create_session(code, "O" + secrets.token_hex(5).upper(), now + 3600, now, f"upl_test_{code}")
+        for i, f in enumerate(files):
+            storage.add_file_to_session(
+                code,
+                file_id=f"f{i + 1}_{code}",
+                original_name=f["filename"],
+                size_bytes=f["size"],
+                mime_type=f.get("mime_type", "application/octet-stream"),
+                cloudinary_public_id=f.get("public_id"),
+                resource_type=f.get("resource_type", "raw"),
+                file_url=f.get("url"),
+                path=f.get("path"),
+            )
+    return code
+
+
+class AssetHost:
+    """Serves registered bodies over HTTP, like a CDN without Range support.
+
+    /a/<name>            the body of <name>
+    /cut/<name>/<n>      announces the full length, sends n bytes, then drops the connection
+    /gen/<size>/<byte>   <size> bytes of value <byte>, written 64 KiB at a time
+    """
+
+    def __init__(self):
+        self.assets: Dict[str, bytes] = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        host, port = self.server.server_address[:2]
+        self.url = f"http://{host}:{port}"
+        threading.Thread(target=self.server.serve_forever, name="asset-host", daemon=True).start()
+
+    def _handler_class(self):
+        host = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_args):
+                pass
+
+            def _head(self, length: int) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(length))
+                self.end_headers()
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[0] == "a" and len(parts) == 2 and parts[1] in host.assets:
+                    data = host.assets[parts[1]]
+                    self._head(len(data))
+                    self.wfile.write(data)
+                elif parts[0] == "cut" and len(parts) == 3 and parts[1] in host.assets:
+                    data = host.assets[parts[1]]
+                    self._head(len(data))
+                    self.wfile.write(data[: int(parts[2])])
+                    self.wfile.flush()
+                    self.close_connection = True
+                elif parts[0] == "gen" and len(parts) == 3:
+                    size, value = int(parts[1]), int(parts[2])
+                    self._head(size)
+                    block = bytes([value]) * (64 * 1024)
+                    sent = 0
+                    while sent < size:
+                        n = min(len(block), size - sent)
+                        self.wfile.write(block[:n])
+                        sent += n
+                else:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+        return Handler
+
+
+@pytest.fixture(scope="session")
+def asset_host():
+    host = AssetHost()
+    yield host
+    host.server.shutdown()
@@ -0,0 +1,130 @@
+"""
+Filename: test_batch_stream.py
+Purpose: POST /download/batch with mode=stream: the server fetches every asset over HTTP and
+streams a STORED zip. Covers member bytes, duplicate names, assets failing before and during
+their body, and bounded memory with many large members.
+"""
+
+import io
+import threading
+import time
+import tracemalloc
+import zipfile
+
+import pytest
+
+from .conftest import make_session, upload
+
+
+def _stream(client, code: str, file_ids=None):
+    """The streamed response, not yet read."""
+    body = {"access_code": code, "mode": "stream"}
+    if file_ids is not None:
+        body["file_ids"] = file_ids
+    return client.post("/download/batch", json=body, buffered=False)
+
+
+def _all_ids(client, code: str):
+    return [f["file_id"] for f in client.get(f"/access/{code}").get_json()["data"]["files"]]
+
+
+def test_zip_holds_each_assets_bytes_under_unique_names(make_app):
+    app = make_app()
+    client = app.test_client()
+    files = [("a.txt", b"first a" * 1000), ("a.txt", b"second a"), ("b.bin", bytes(range(256)) * 40)]
+    code = upload(client, files)["access_code"]
+
+    resp = _stream(client, code, _all_ids(client, code))
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/zip"
+    data = b"".join(resp.response)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["a.txt", "a (1).txt", "b.bin"]
+        assert [zf.read(n) for n in zf.namelist()] == [d for _n, d in files]
+        assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+
+
+def test_directory_entries_keep_their_paths(make_app, asset_host):
+    app = make_app()
+    asset_host.assets.update({"p1": b"one", "p2": b"two"})
+    code = make_session(app, [
+        {"filename": "x.txt", "path": "album/x.txt", "size": 3, "url": f"{asset_host.url}/a/p1"},
+        {"filename": "x.txt", "path": "album/sub/x.txt", "size": 3, "url": f"{asset_host.url}/a/p2"},
+    ])
+    client = app.test_client()
+    data = b"".join(_stream(client, code, _all_ids(client, code)).response)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert {n: zf.read(n) for n in zf.namelist()} == {"album/x.txt": b"one", "album/sub/x.txt": b"two"}
+
+
+def test_asset_missing_before_any_bytes_is_skipped(make_app, asset_host):
+    app = make_app()
+    asset_host.assets["ok"] = b"present"
+    code = make_session(app, [
+        {"filename": "gone.txt", "size": 10, "url": f"{asset_host.url}/a/does-not-exist"},
+        {"filename": "ok.txt", "size": 7, "url": f"{asset_host.url}/a/ok"},
+    ])
+    client = app.test_client()
+    data = b"".join(_stream(client, code, _all_ids(client, code)).response)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["ok.txt"]
+        assert zf.read("ok.txt") == b"present"
+
+
+def _zipstream_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("zipstream") and t.is_alive()]
+
+
+def test_asset_failing_midway_aborts_the_stream(make_app, asset_host):
+    app = make_app()
+    asset_host.assets["big"] = b"z" * (2 * 1024 * 1024)
+    asset_host.assets["after"] = b"after"
+    code = make_session(app, [
+        {"filename": "big.bin", "size": 2 * 1024 * 1024, "url": f"{asset_host.url}/cut/big/100000"},
+        {"filename": "after.txt", "size": 5, "url": f"{asset_host.url}/a/after"},
+    ])
+    client = app.test_client()
+    resp = _stream(client, code, _all_ids(client, code))
+    received = bytearray()
+    # The member can't be completed: the body ends with an error instead of a valid archive
+    with pytest.raises(Exception):
+        for chunk in resp.response:
+            received += chunk
+    resp.close()
+    assert 0 < len(received) < 2 * 1024 * 1024
+    with pytest.raises(zipfile.BadZipFile):
+        zipfile.ZipFile(io.BytesIO(bytes(received)))
+
+    # Prefetch threads give up once the stream is gone
+    deadline = time.monotonic() + 5
+    while _zipstream_threads() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _zipstream_threads()
+
+
+def test_memory_stays_bounded_with_many_large_members(make_app, asset_host):
+    member = 4 * 1024 * 1024
+    count = 24
+    app = make_app(BATCH_STREAM_PREFETCH=4, BATCH_STREAM_QUEUE_CHUNKS=8, BATCH_STREAM_CHUNK_SIZE=256 * 1024)
+    code = make_session(app, [
+        {"filename": f"m{i}.bin", "size": member, "url": f"{asset_host.url}/gen/{member}/{i}"}
+        for i in range(count)
+    ])
+    client = app.test_client()
+
+    tracemalloc.start()
+    try:
+        resp = _stream(client, code, _all_ids(client, code))
+        total = 0
+        for chunk in resp.response:
+            total += len(chunk)
+        resp.close()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert total > member * count
+    # prefetch * queue_chunks * chunk_size is 8 MiB; the archive itself is 96 MiB
+    assert peak < 24 * 1024 * 1024, f"peak {peak / 2**20:.1f} MiB"
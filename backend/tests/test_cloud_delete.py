@@ -0,0 +1,32 @@
+"""
+Filename: test_cloud_delete.py
+Purpose: Session deletes use Admin API bulk deletes; when that quota is exhausted (420) the
+assets are destroyed one by one instead of being left behind.
+"""
+
+from app.services import storage
+
+from .conftest import upload
+
+
+def test_rate_limited_bulk_delete_falls_back_to_destroy(make_app, fake):
+    app = make_app()
+    client = app.test_client()
+    data = upload(client, [("a.txt", b"aaa"), ("b.txt", b"bbb")])
+    with app.app_context():
+        ids = [f["cloudinary_public_id"] for f in storage.get_session(data["access_code"])["files"]]
+    with fake.lock:
+        assert all(("raw", pid) in fake.assets for pid in ids)
+        limited, destroys = fake.calls.get("delete_resources_limited", 0), fake.calls.get("destroy", 0)
+
+    fake.admin_rate_limited = True
+    try:
+        with app.app_context():
+            assert storage.delete_session(data["access_code"]) == 2
+    finally:
+        fake.admin_rate_limited = False
+
+    with fake.lock:
+        assert not any(("raw", pid) in fake.assets for pid in ids)
+        assert fake.calls.get("delete_resources_limited", 0) == limited + 1
+        assert fake.calls.get("destroy", 0) == destroys + 2
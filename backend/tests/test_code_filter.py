@@ -0,0 +1,80 @@
+"""
+Filename: test_code_filter.py
+Purpose: The code filter must never answer "no" for a live code, even while request threads
+add codes concurrently and a capacity rebuild swaps the filter underneath them.
+"""
+
+import threading
+import time
+
+from app.services import storage
+from app.services.codefilter import CountingBloomFilter
+
+
+def test_concurrent_adds_survive_rebuilds(make_app):
+    app = make_app()
+    created = []
+    with app.app_context():
+        storage._ensure_loaded()
+        # A tiny filter so the burst below crosses capacity several times
+        with storage._filter_lock:
+            storage._code_filter = CountingBloomFilter(8)
+
+    def create(worker: int):
+        with app.app_context():
+            now = time.time()
+            for i in range(40):
+                code = f"CF{worker:02d}{i:03d}"
+                storage.create_session(code, f"OCF{worker:02d}{i:03d}", now + 3600, now, f"upl_{code}")
+                created.append(code)
+
+    threads = [threading.Thread(target=create, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    deadline = time.monotonic() + 10
+    while storage._filter_journal is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with app.app_context():
+        assert storage._code_filter.capacity > 8
+        missing = [c for c in created if not storage.access_code_may_exist(c)]
+        missing += [c for c in created if not storage.owner_code_may_exist("O" + c)]
+        assert missing == []
+        for code in created:
+            storage.delete_session(code)
+        storage._rebuild_code_filter()
+
+
+def test_code_added_during_a_rebuild_scan_is_kept(make_app, monkeypatch):
+    app = make_app()
+    scanning, release = threading.Event(), threading.Event()
+    real_build = CountingBloomFilter.build.__func__
+
+    def slow_build(cls, keys, capacity, fp_rate=0.01):
+        keys = list(keys)
+        scanning.set()
+        release.wait(5)
+        return real_build(cls, keys, capacity, fp_rate)
+
+    monkeypatch.setattr(CountingBloomFilter, "build", classmethod(slow_build))
+
+    def rebuild():
+        with app.app_context():
+            storage._rebuild_code_filter()
+
+    with app.app_context():
+        storage._ensure_loaded()
+        rebuilder = threading.Thread(target=rebuild)
+        rebuilder.start()
+        assert scanning.wait(5)
+        now = time.time()
+        # The scan has finished reading the shards; this code is only in the old filter
+        storage.create_session("CFLATE1", "OCFLATE1", now + 3600, now, "upl_CFLATE1")
+        release.set()
+        rebuilder.join(5)
+        assert storage.access_code_may_exist("CFLATE1")
+        assert storage.owner_code_may_exist("OCFLATE1")
+        storage.delete_session("CFLATE1")
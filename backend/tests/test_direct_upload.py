@@ -0,0 +1,123 @@
+"""
+Filename: test_direct_upload.py
+Purpose: POST /upload/sign + /upload/commit against the Cloudinary stand-in: a clean round
+trip, and the commits that must be refused (forged signature, foreign public_id, replay,
+sizes over the limit or not matching the stored asset), plus backends without direct uploads.
+"""
+
+import json
+import urllib.request
+import uuid
+
+import pytest
+
+
+def _sign(client, files):
+    return client.post("/upload/sign", json={"files": [
+        {"filename": name, "size": size, "mime_type": "text/plain"} for name, size in files
+    ]})
+
+
+def _send(entry, name: str, data: bytes) -> dict:
+    """Upload data to the provider with the signed fields, as a browser would."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for key, value in entry["fields"].items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+        f"Content-Type: text/plain\r\n\r\n".encode() + data + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    req = urllib.request.Request(
+        entry["upload_url"],
+        data=b"".join(parts),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return {"index": entry["index"], **json.loads(resp.read())}
+
+
+def _commit(client, token, results):
+    return client.post("/upload/commit", json={"token": token, "files": results})
+
+
+@pytest.fixture
+def direct(make_app):
+    app = make_app()
+    return app, app.test_client()
+
+
+def _signed_upload(client, data: bytes, declared: int = None):
+    signed = _sign(client, [("notes.txt", len(data) if declared is None else declared)]).get_json()["data"]
+    return signed, _send(signed["files"][0], "notes.txt", data)
+
+
+def test_round_trip(direct):
+    _app, client = direct
+    signed, result = _signed_upload(client, b"direct bytes")
+    resp = _commit(client, signed["token"], [result])
+    assert resp.status_code == 201
+    data = resp.get_json()["data"]
+    assert data["files"][0]["size"] == len(b"direct bytes")
+    files = client.get(f"/access/{data['access_code']}").get_json()["data"]["files"]
+    assert files[0]["filename"] == "notes.txt"
+
+
+def test_forged_signature_is_400(direct):
+    _app, client = direct
+    signed, result = _signed_upload(client, b"x" * 10)
+    result["signature"] = "0" * len(result["signature"])
+    resp = _commit(client, signed["token"], [result])
+    assert resp.status_code == 400
+    assert "signature" in resp.get_json()["error"]
+
+
+def test_public_id_outside_the_token_is_400(direct):
+    _app, client = direct
+    signed, _result = _signed_upload(client, b"x" * 10)
+    # A genuine, provider-signed result, but for another token's asset
+    _other, foreign = _signed_upload(client, b"y" * 10)
+    resp = _commit(client, signed["token"], [{**foreign, "index": 0}])
+    assert resp.status_code == 400
+    assert "public_id" in resp.get_json()["error"]
+
+
+def test_replayed_commit_is_409(direct):
+    _app, client = direct
+    signed, result = _signed_upload(client, b"once")
+    assert _commit(client, signed["token"], [result]).status_code == 201
+    assert _commit(client, signed["token"], [result]).status_code == 409
+
+
+def test_size_over_the_limit_is_refused_at_sign(direct):
+    _app, client = direct
+    resp = _sign(client, [("huge.txt", 101 * 1024 * 1024)])
+    assert resp.status_code == 400
+
+
+def test_larger_than_declared_is_400(direct):
+    _app, client = direct
+    signed, result = _signed_upload(client, b"z" * 100, declared=10)
+    resp = _commit(client, signed["token"], [result])
+    assert resp.status_code == 400
+    assert "larger than declared" in resp.get_json()["error"]
+
+
+def test_reported_size_must_match_the_stored_asset(direct):
+    _app, client = direct
+    signed, result = _signed_upload(client, b"z" * 100, declared=10)
+    # The reported size isn't covered by the provider's signature
+    result["bytes"] = 10
+    resp = _commit(client, signed["token"], [result])
+    assert resp.status_code == 400
+    assert "size" in resp.get_json()["error"]
+
+
+def test_local_backend_is_501(make_app, tmp_path):
+    signing = make_app().test_client()
+    signed, result = _signed_upload(signing, b"elsewhere")
+    client = make_app(STORAGE_BACKEND="local", LOCAL_STORAGE_ROOT=str(tmp_path)).test_client()
+    assert _sign(client, [("notes.txt", 4)]).status_code == 501
+    assert _commit(client, signed["token"], [result]).status_code == 501
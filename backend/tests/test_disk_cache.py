@@ -0,0 +1,101 @@
+"""
+Filename: test_disk_cache.py
+Purpose: Disk cache fills racing a session purge (expiry/delete) must not bring the entry back,
+and the hot cache's redirects must not keep downloads away from the disk cache.
+"""
+
+import os
+import threading
+import time
+
+from app.services import disk_cache
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_fill_finishing_after_purge_is_discarded(make_app, monkeypatch):
+    app = make_app(LOCAL_CACHE_ENABLED=True, LOCAL_CACHE_ADMIT_AFTER=1)
+    paused, resume = threading.Event(), threading.Event()
+    real_makedirs = os.makedirs
+
+    def pause_then_makedirs(path, *args, **kwargs):
+        # Hold the fill before it creates the session directory; the purge runs meanwhile
+        if path.endswith(os.path.join("cache", "PURGE1")):
+            paused.set()
+            resume.wait(5)
+        return real_makedirs(path, *args, **kwargs)
+
+    monkeypatch.setattr(disk_cache.os, "makedirs", pause_then_makedirs)
+    with app.test_request_context():
+        before = disk_cache.stats()
+        miss = disk_cache.serve("PURGE1", "f1", source=lambda: iter([b"x" * 4096]), size=4096, download_name="a.bin")
+        assert miss is None
+        assert paused.wait(5)
+
+        disk_cache.purge_session("PURGE1")
+        resume.set()
+        assert _wait_for(lambda: "PURGE1/f1" not in disk_cache._inflight)
+
+        after = disk_cache.stats()
+        assert after["entries"] == before["entries"]
+        assert after["bytes_used"] == before["bytes_used"]
+        assert not os.path.exists(os.path.join(app.config["UPLOAD_FOLDER"], "cache", "PURGE1"))
+        assert disk_cache.serve("PURGE1", "f1", source=None, size=4096, download_name="a.bin") is None
+
+
+def test_fill_without_purge_is_served(make_app):
+    app = make_app(LOCAL_CACHE_ENABLED=True, LOCAL_CACHE_ADMIT_AFTER=1)
+    with app.test_request_context():
+        disk_cache.serve("KEEP01", "f1", source=lambda: iter([b"cached"]), size=6, download_name="a.bin")
+        assert _wait_for(lambda: "KEEP01/f1" not in disk_cache._inflight)
+        resp = disk_cache.serve("KEEP01", "f1", source=None, size=6, download_name="a.bin")
+        assert resp is not None and resp.status_code == 200
+        resp.direct_passthrough = False
+        assert resp.get_data() == b"cached"
+        resp.close()
+        disk_cache.purge_session("KEEP01")
+
+
+def test_hot_download_is_served_from_the_disk_cache(make_app):
+    from .conftest import upload
+
+    app = make_app(LOCAL_CACHE_ENABLED=True, LOCAL_CACHE_ADMIT_AFTER=1, HOT_CACHE_ENABLED=True)
+    client = app.test_client()
+    data = upload(client, [("hot.bin", b"hot bytes" * 100)])
+    code, file_id = data["access_code"], data["files"][0]["file_id"]
+    url = f"/download/{code}/{file_id}"
+
+    first = client.get(url)
+    assert first.status_code == 302
+    assert _wait_for(lambda: f"{code}/{file_id}" in disk_cache._index)
+    with app.app_context():
+        hits = disk_cache.stats()["hits"]
+    statuses = [client.get(url).status_code for _ in range(5)]
+    assert statuses == [200] * 5
+    with app.app_context():
+        assert disk_cache.stats()["hits"] == hits + 5
+    assert client.get(url).data == b"hot bytes" * 100
+    with app.test_request_context():
+        disk_cache.purge_session(code)
+
+
+def test_hot_cache_keeps_redirects_without_the_disk_cache(make_app):
+    from app.services import hotcache
+
+    from .conftest import upload
+
+    app = make_app(LOCAL_CACHE_ENABLED=False, HOT_CACHE_ENABLED=True)
+    client = app.test_client()
+    data = upload(client, [("cdn.bin", b"cdn")])
+    url = f"/download/{data['access_code']}/{data['files'][0]['file_id']}"
+    assert client.get(url).status_code == 302
+    hits = hotcache.stats()["hits"]
+    assert client.get(url).status_code == 302
+    assert hotcache.stats()["hits"] == hits + 1
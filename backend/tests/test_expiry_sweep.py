@@ -0,0 +1,56 @@
+"""
+Filename: test_expiry_sweep.py
+Purpose: The lazy expiry sweep runs once per session request, and not at all for requests the
+code filter or the hot cache answer, or that touch no session.
+"""
+
+import time
+
+import pytest
+
+from app.services import storage
+
+from .conftest import upload
+
+
+@pytest.fixture
+def sweeps(monkeypatch):
+    calls = []
+    real = storage.delete_expired_files
+    monkeypatch.setattr(storage, "delete_expired_files", lambda fn: calls.append(1) or real(fn))
+    return calls
+
+
+def test_one_sweep_per_session_request(make_app, sweeps):
+    app = make_app(HOT_CACHE_ENABLED=True)
+    client = app.test_client()
+    data = upload(client, [("a.txt", b"a")])
+    code, file_id = data["access_code"], data["files"][0]["file_id"]
+    owner = data["owner_code"]
+
+    for url in (f"/access/{code}", f"/download/{code}/{file_id}", f"/owner/{owner}"):
+        sweeps.clear()
+        client.get(url)
+        assert len(sweeps) == 1, url
+
+
+def test_filter_and_hot_cache_answers_skip_the_sweep(make_app, sweeps):
+    app = make_app(HOT_CACHE_ENABLED=True)
+    client = app.test_client()
+    sweeps.clear()
+    assert client.get("/access/ZZZZZZ").status_code == 404
+    assert client.get("/health").status_code == 200
+    assert sweeps == []
+
+    # Once an expired session is swept, repeats are answered by the filter or the hot cache
+    data = upload(client, [("b.txt", b"b")])
+    code = data["access_code"]
+    with app.app_context():
+        storage.set_session_expiry(code, time.time() + 0.2)
+    time.sleep(0.3)
+    first = client.get(f"/download/{code}/{data['files'][0]['file_id']}")
+    assert first.status_code in (404, 410)
+    sweeps.clear()
+    again = client.get(f"/download/{code}/{data['files'][0]['file_id']}")
+    assert again.status_code == first.status_code
+    assert sweeps == []
@@ -0,0 +1,27 @@
+"""
+Filename: test_local_archive.py
+Purpose: POST /download/batch (archive URL flow) on the local backend names zip members after
+the uploaded files, disambiguated like the streamed zip, not after storage tokens.
+"""
+
+import io
+import zipfile
+
+from .conftest import upload
+
+
+def test_archive_members_use_uploaded_names(make_app):
+    app = make_app(STORAGE_BACKEND="local")
+    client = app.test_client()
+    data = upload(client, [("report.txt", b"first"), ("report.txt", b"second"), ("notes.txt", b"third")])
+    resp = client.post("/download/batch", json={
+        "access_code": data["access_code"],
+        "file_ids": [f["file_id"] for f in data["files"]],
+    })
+    assert resp.status_code == 200
+    archive = client.get(resp.get_json()["archive_url"])
+    assert archive.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(archive.data)) as zf:
+        assert sorted(zf.namelist()) == ["notes.txt", "report (1).txt", "report.txt"]
+        assert sorted([zf.read("report.txt"), zf.read("report (1).txt")]) == [b"first", b"second"]
+        assert zf.read("notes.txt") == b"third"
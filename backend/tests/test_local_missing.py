@@ -0,0 +1,42 @@
+"""
+Filename: test_local_missing.py
+Purpose: With the local backend, a record whose file is gone from disk (removed by hand, or by
+orphan reconciliation) answers 404 "File missing" on every serving route, not a 500.
+"""
+
+import os
+
+import pytest
+
+from .conftest import upload
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+@pytest.fixture
+def missing(make_app):
+    app = make_app(STORAGE_BACKEND="local")
+    client = app.test_client()
+    data = upload(client, [("pic.png", PNG)])
+    code, file_id = data["access_code"], data["files"][0]["file_id"]
+    with app.app_context():
+        from app.services import storage
+        from app.services.backends import get_backend
+
+        rec = storage.get_session(code)["files"][0]
+        path = get_backend().local_path(rec["cloudinary_public_id"])
+    assert os.path.isfile(path)
+    os.remove(path)
+    return client, code, file_id
+
+
+@pytest.mark.parametrize("url", [
+    "/download/{code}/{file_id}",
+    "/preview/{code}/{file_id}",
+    "/preview/{code}/{file_id}?inline=1",
+])
+def test_missing_local_file_is_404(missing, url):
+    client, code, file_id = missing
+    resp = client.get(url.format(code=code, file_id=file_id))
+    assert resp.status_code == 404
+    assert resp.get_json()["error"] == "File missing"
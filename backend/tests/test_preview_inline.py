@@ -0,0 +1,187 @@
+"""
+Filename: test_preview_inline.py
+Purpose: GET /preview/<code>/<file_id>?inline=1 streamed through the Cloudinary stand-in:
+Range (206/416), If-Range, conditional GETs (304), the Cache-Control cap, zero-byte files, and
+the disk cache hit path.
+"""
+
+import time
+
+import pytest
+
+from .conftest import make_session, upload
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+SIZE = len(PNG)
+
+
+@pytest.fixture
+def inline(make_app):
+    app = make_app(PREVIEW_MAX_AGE=3600)
+    client = app.test_client()
+    data = upload(client, [("pic.png", PNG)])
+    url = f"/preview/{data['access_code']}/{data['files'][0]['file_id']}?inline=1"
+    return app, client, data["access_code"], url
+
+
+def test_full_body_with_validators(inline):
+    _app, client, _code, url = inline
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert resp.headers["ETag"]
+    assert resp.headers["Last-Modified"]
+    assert resp.cache_control.private
+    assert 0 < resp.cache_control.max_age <= 3600
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=10-99", 10, 99),
+    ("bytes=100-", 100, SIZE - 1),
+    ("bytes=-50", SIZE - 50, SIZE - 1),
+    (f"bytes=5-{SIZE + 1000}", 5, SIZE - 1),
+])
+def test_range_is_206_with_content_range(inline, header, start, end):
+    _app, client, _code, url = inline
+    resp = client.get(url, headers={"Range": header})
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == f"bytes {start}-{end}/{SIZE}"
+    assert resp.headers["Content-Length"] == str(end - start + 1)
+    assert resp.data == PNG[start:end + 1]
+
+
+def test_unsatisfiable_range_is_416(inline):
+    _app, client, _code, url = inline
+    resp = client.get(url, headers={"Range": f"bytes={SIZE + 10}-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+def test_if_range_matching_etag_keeps_the_range(inline):
+    _app, client, _code, url = inline
+    etag = client.get(url).headers["ETag"]
+    resp = client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert resp.status_code == 206
+    assert resp.data == PNG[:10]
+
+
+def test_if_range_stale_validator_sends_everything(inline):
+    _app, client, _code, url = inline
+    resp = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"some-older-version"'})
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    resp = client.get(url, headers={"Range": "bytes=0-9", "If-Range": "Thu, 01 Jan 1970 00:00:00 GMT"})
+    assert resp.status_code == 200
+    assert resp.data == PNG
+
+
+def test_if_none_match_is_304(inline):
+    _app, client, _code, url = inline
+    etag = client.get(url).headers["ETag"]
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert resp.headers["ETag"] == etag
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_modified_since_is_304(inline):
+    _app, client, _code, url = inline
+    last_modified = client.get(url).headers["Last-Modified"]
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    resp = client.get(url, headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"})
+    assert resp.status_code == 200
+
+
+def test_max_age_never_outlives_the_session(inline):
+    app, client, code, url = inline
+    with app.app_context():
+        from app.services import storage
+
+        storage.set_session_expiry(code, time.time() + 100)
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert 90 <= resp.cache_control.max_age <= 100
+
+
+def test_zero_byte_file(make_app, asset_host):
+    app = make_app()
+    asset_host.assets["empty"] = b""
+    code = make_session(app, [{
+        "filename": "empty.png",
+        "size": 0,
+        "mime_type": "image/png",
+        "resource_type": "image",
+        "url": f"{asset_host.url}/a/empty",
+    }])
+    client = app.test_client()
+    url = f"/preview/{code}/f1_{code}?inline=1"
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.data == b""
+    assert resp.headers["Content-Length"] == "0"
+    resp = client.get(url, headers={"Range": "bytes=0-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == "bytes */0"
+
+
+def test_disk_cache_hit_keeps_validators_and_ranges(make_app):
+    app = make_app(LOCAL_CACHE_ENABLED=True, LOCAL_CACHE_ADMIT_AFTER=1)
+    client = app.test_client()
+    data = upload(client, [("cached.png", PNG)])
+    code, file_id = data["access_code"], data["files"][0]["file_id"]
+    url = f"/preview/{code}/{file_id}?inline=1"
+
+    # Miss: streamed, and a background fill starts
+    streamed = client.get(url)
+    assert streamed.status_code == 200
+    from app.services import disk_cache
+
+    deadline = time.monotonic() + 5
+    while f"{code}/{file_id}" not in disk_cache._index and time.monotonic() < deadline:
+        time.sleep(0.01)
+    hits = disk_cache.stats()["hits"]
+
+    hit = client.get(url)
+    assert disk_cache.stats()["hits"] == hits + 1
+    assert hit.status_code == 200
+    assert hit.data == PNG
+    # send_file makes its own ETag; the route's validator must win so clients revalidate alike
+    assert hit.headers["ETag"] == streamed.headers["ETag"]
+    assert hit.cache_control.private and hit.cache_control.max_age == streamed.cache_control.max_age
+
+    ranged = client.get(url, headers={"Range": "bytes=10-19", "If-Range": streamed.headers["ETag"]})
+    assert ranged.status_code == 206
+    assert ranged.headers["Content-Range"] == f"bytes 10-19/{SIZE}"
+    assert ranged.data == PNG[10:20]
+    assert client.get(url, headers={"If-None-Match": streamed.headers["ETag"]}).status_code == 304
+    with app.test_request_context():
+        disk_cache.purge_session(code)
+
+
+def test_multi_range_is_served_whole(inline):
+    _app, client, _code, url = inline
+    resp = client.get(url, headers={"Range": "bytes=0-1,5-6"})
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    assert "Content-Range" not in resp.headers
+
+
+def test_multi_range_on_a_disk_cache_hit_is_served_whole(make_app):
+    from app.services import disk_cache
+
+    app = make_app(LOCAL_CACHE_ENABLED=True, LOCAL_CACHE_ADMIT_AFTER=1)
+    client = app.test_client()
+    data = upload(client, [("multi.png", PNG)])
+    code, file_id = data["access_code"], data["files"][0]["file_id"]
+    url = f"/preview/{code}/{file_id}?inline=1"
+    client.get(url)
+    deadline = time.monotonic() + 5
+    while f"{code}/{file_id}" not in disk_cache._index and time.monotonic() < deadline:
+        time.sleep(0.01)
+    resp = client.get(url, headers={"Range": "bytes=0-1,5-6"})
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    with app.test_request_context():
+        disk_cache.purge_session(code)
@@ -0,0 +1,74 @@
+"""
+Filename: test_profiler.py
+Purpose: cprofile mode profiles one request at a time; a request arriving meanwhile is served
+unprofiled instead of failing, and the profiling switch is a protected debug route.
+"""
+
+import cProfile
+import threading
+
+from flask import g
+
+from app.services import profiler
+
+
+class _OneAtATime(cProfile.Profile):
+    """Behaves like cProfile on Python 3.12+, where a second active profiler is refused."""
+
+    active = None
+
+    def enable(self, *args, **kwargs):
+        if _OneAtATime.active is not None:
+            raise ValueError("Another profiling tool is already active")
+        _OneAtATime.active = self
+        return super().enable(*args, **kwargs)
+
+    def disable(self, *args, **kwargs):
+        # pstats calls disable again when it reads the profile
+        if _OneAtATime.active is self:
+            _OneAtATime.active = None
+        return super().disable(*args, **kwargs)
+
+
+def test_concurrent_cprofile_requests_are_not_both_profiled(make_app, monkeypatch, tmp_path):
+    monkeypatch.setattr(cProfile, "Profile", _OneAtATime)
+    app = make_app(PROFILE_ENABLED=True, PROFILE_MODE="cprofile", PROFILE_SAMPLE_RATE=1.0, PROFILE_OUTPUT_DIR=str(tmp_path))
+    first_in, second_done = threading.Event(), threading.Event()
+    seen = {}
+
+    def first():
+        with app.test_request_context("/health"):
+            profiler._before_request()
+            seen["first"] = g.get("_profiler") is not None
+            first_in.set()
+            second_done.wait(5)
+            profiler._teardown_request()
+
+    def second():
+        first_in.wait(5)
+        with app.test_request_context("/health"):
+            profiler._before_request()
+            seen["second"] = g.get("_profiler") is not None
+            profiler._teardown_request()
+        second_done.set()
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert seen == {"first": True, "second": False}
+    # The lock is free again
+    with app.test_request_context("/health"):
+        profiler._before_request()
+        assert g.get("_profiler") is not None
+        profiler._teardown_request()
+    with app.app_context():
+        profiler.configure(enabled=False)
+
+
+def test_profiling_switch_is_protected(make_app):
+    client = make_app().test_client()
+    resp = client.post("/__debug__/profiling", json={"enabled": True, "sample_rate": 1.0})
+    assert resp.status_code == 404
+    assert profiler.status()["enabled"] is False
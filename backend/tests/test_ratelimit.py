@@ -0,0 +1,45 @@
+"""
+Filename: test_ratelimit.py
+Purpose: Behind a trusted proxy the client address is the X-Forwarded-For entry the proxy
+appended; a spoofed leftmost hop must not reset per-IP limits.
+"""
+
+import pytest
+
+
+def _misses(client, xffs):
+    return [
+        client.get("/access/ZZZZZZ", headers={"X-Forwarded-For": xff}).status_code
+        for xff in xffs
+    ]
+
+
+@pytest.mark.parametrize("hops, suffix, other", [
+    (1, "203.0.113.7", "203.0.113.8"),
+    (2, "203.0.113.7, 10.0.0.2", "203.0.113.8, 10.0.0.2"),
+])
+def test_spoofed_leftmost_hop_is_ignored(make_app, hops, suffix, other):
+    app = make_app(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMIT_TRUST_PROXY=True,
+        RATE_LIMIT_PROXY_HOPS=hops,
+        SCAN_GUARD_ENABLED=True,
+        SCAN_GUARD_MISS_LIMIT=2,
+    )
+    client = app.test_client()
+    statuses = _misses(client, [f"198.51.100.{i}, {suffix}" for i in range(4)])
+    assert statuses == [404, 404, 429, 429]
+    # Another client behind the same proxy has its own bucket
+    assert _misses(client, [f"198.51.100.1, {other}"]) == [404]
+
+
+def test_missing_proxy_hops_fall_back_to_the_peer(make_app):
+    app = make_app(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMIT_TRUST_PROXY=True,
+        RATE_LIMIT_PROXY_HOPS=2,
+        SCAN_GUARD_ENABLED=True,
+        SCAN_GUARD_MISS_LIMIT=2,
+    )
+    client = app.test_client()
+    assert _misses(client, ["198.51.100.1", "198.51.100.2", "198.51.100.3"]) == [404, 404, 429]
@@ -0,0 +1,124 @@
+"""
+Filename: test_reconcile.py
+Purpose: Orphan reconciliation against the Cloudinary stand-in: orphans go, live assets stay,
+the public_id index is kept current instead of rebuilt per page, and more than one worker
+never deletes.
+"""
+
+import os
+import time
+
+import pytest
+
+from app.services import reconcile, storage
+
+from .conftest import upload
+
+
+@pytest.fixture
+def reconciling(make_app, fake, upload_folder, monkeypatch):
+    app = make_app(ORPHAN_MIN_AGE=0, DIRECT_UPLOAD_TTL=0, ORPHAN_RECONCILE_PAGE_SIZE=2)
+    state = os.path.join(upload_folder, "reconcile.json")
+    if os.path.exists(state):
+        os.remove(state)
+    scans = []
+    real_scan = storage.ShardedMap.scan_items
+    monkeypatch.setattr(storage.ShardedMap, "scan_items", lambda self: scans.append(1) or real_scan(self))
+    client = app.test_client()
+    data = upload(client, [("keep.txt", b"live bytes")])
+    with app.app_context():
+        sess = storage.get_session(data["access_code"])
+    live_id = sess["files"][0]["cloudinary_public_id"]
+    folder = live_id.rsplit("/", 1)[0] + "/" if "/" in live_id else ""
+    yield app, client, fake, folder, live_id, scans
+    with app.app_context():
+        storage.delete_session(data["access_code"])
+
+
+def _orphan(fake, public_id: str) -> None:
+    with fake.lock:
+        fake.assets[("raw", public_id)] = {"bytes": 7, "data": None, "ext": "", "created_at": time.time() - 10}
+
+
+def _run_pass(app, **kwargs) -> list:
+    reports = []
+    with app.app_context():
+        while True:
+            reports.append(reconcile.step(**kwargs))
+            if reports[-1]["pass_complete"]:
+                return reports
+
+
+def test_orphans_deleted_live_kept_one_scan_per_pass(reconciling):
+    app, client, fake, folder, live_id, scans = reconciling
+    _orphan(fake, f"{folder}zz_orphan_a")
+    _orphan(fake, f"{folder}zz_orphan_b")
+    reports = _run_pass(app, dry_run=False)
+    assert len(reports) > 1
+    assert scans == [1]
+    with fake.lock:
+        assert ("raw", f"{folder}zz_orphan_a") not in fake.assets
+        assert ("raw", f"{folder}zz_orphan_b") not in fake.assets
+        assert any(pid == live_id for _rt, pid in fake.assets)
+
+    # Added after the index was built: known through add_file_to_session, no rescan
+    added = upload(client, [("later.txt", b"more")])
+    with app.app_context():
+        added_id = storage.get_session(added["access_code"])["files"][0]["cloudinary_public_id"]
+        assert storage.referenced_public_ids([added_id, "nope"]) == {added_id}
+    assert scans == [1]
+    with app.app_context():
+        storage.delete_session(added["access_code"])
+        assert storage.referenced_public_ids([added_id]) == set()
+
+
+def test_more_than_one_worker_only_reports(reconciling, monkeypatch):
+    app, _client, fake, folder, _live_id, _scans = reconciling
+    monkeypatch.setattr(reconcile._state, "workers", 2)
+    _orphan(fake, f"{folder}zz_orphan_w")
+    reports = _run_pass(app, dry_run=False)
+    assert all(r["dry_run"] for r in reports)
+    assert f"{folder}zz_orphan_w" in [pid for r in reports for pid in r["orphan_ids"]]
+    with fake.lock:
+        assert ("raw", f"{folder}zz_orphan_w") in fake.assets
+        del fake.assets[("raw", f"{folder}zz_orphan_w")]
+
+
+@pytest.mark.parametrize("enabled, config_dry_run, status, deleted", [
+    (False, False, 409, None),
+    (True, True, 200, 0),
+    (True, False, 200, 1),
+])
+def test_run_route_respects_enabled_and_dry_run(make_app, fake, upload_folder, enabled, config_dry_run, status, deleted):
+    app = make_app(
+        ORPHAN_MIN_AGE=0,
+        DIRECT_UPLOAD_TTL=0,
+        ORPHAN_RECONCILE_ENABLED=enabled,
+        ORPHAN_RECONCILE_DRY_RUN=config_dry_run,
+        DEBUG_ROUTES_TOKEN="t0ken",
+    )
+    state = os.path.join(upload_folder, "reconcile.json")
+    if os.path.exists(state):
+        os.remove(state)
+    with app.app_context():
+        orphan = f"{storage.get_backend().folder}/zz_route_orphan"
+    _orphan(fake, orphan)
+    client = app.test_client()
+    resp = client.post(
+        "/__debug__/orphans/run", json={"pages": 1000, "dry_run": False}, headers={"X-Debug-Token": "t0ken"}
+    )
+    assert resp.status_code == status
+    if deleted is not None:
+        assert resp.get_json()["data"]["deleted"] == deleted
+    with fake.lock:
+        assert (("raw", orphan) in fake.assets) == (deleted != 1)
+        fake.assets.pop(("raw", orphan), None)
+
+
+def test_debug_routes_need_the_token_when_debug_is_off(make_app):
+    client = make_app().test_client()
+    assert client.post("/__debug__/orphans/run", json={"dry_run": False}).status_code == 404
+    client = make_app(DEBUG_ROUTES_TOKEN="t0ken").test_client()
+    assert client.post("/__debug__/orphans/run", json={}).status_code == 403
+    assert client.get("/__debug__/orphans", headers={"X-Debug-Token": "wrong"}).status_code == 403
+    assert client.get("/__debug__/orphans", headers={"X-Debug-Token": "t0ken"}).status_code == 200
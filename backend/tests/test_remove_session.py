@@ -0,0 +1,48 @@
+"""
+Filename: test_remove_session.py
+Purpose: Two sweeps removing the same session: exactly one deletes the assets and publishes.
+"""
+
+import threading
+
+from app.services import storage
+
+from .conftest import make_session
+
+
+class _Backend:
+    def __init__(self):
+        self.calls = []
+        # Lets two racing removals meet inside delete_many; a lone caller times out
+        self.barrier = threading.Barrier(2, timeout=0.5)
+
+    def delete_many(self, assets):
+        self.calls.append(list(assets))
+        self.barrier.wait()
+
+
+def test_racing_removals_delete_once(make_app, monkeypatch):
+    app = make_app()
+    code = make_session(app, [{"filename": "a.bin", "size": 3, "public_id": "race/a"}])
+    backend = _Backend()
+    published = []
+    monkeypatch.setattr(storage, "get_backend", lambda: backend)
+    monkeypatch.setattr(storage.events, "publish", lambda c, kind, data: published.append((c, kind)))
+
+    results = []
+
+    def remove():
+        with app.app_context():
+            results.append(storage._remove_session(code))
+
+    threads = [threading.Thread(target=remove) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(results, key=str) == [1, None]
+    assert backend.calls == [[("race/a", "raw")]]
+    assert published == [(code, "deleted")]
+    with app.app_context():
+        assert storage.get_session(code) is None
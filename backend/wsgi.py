@@ -0,0 +1,11 @@
+"""
+Filename: wsgi.py
+Purpose: WSGI entry point for production servers (gunicorn wsgi:app, see gunicorn.conf.py).
+Uses ProductionConfig unless APP_ENV names another config.
+"""
+
+import os
+from app import create_app
+from app.config import get_config
+
+app = create_app(get_config(os.getenv("APP_ENV", "production")))